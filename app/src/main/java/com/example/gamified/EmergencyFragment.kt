@@ -265,7 +265,7 @@ class EmergencyFragment : Fragment() {
     private fun uploadAudioFile(audioFile: File) {
         lifecycleScope.launch(Dispatchers.IO) {
             try {
-                val result = apiClient.uploadAudioFile(audioFile)
+                val result = apiClient.uploadAudioFile(audioFile, priority = "emergency")
                 result.fold(
                     onSuccess = { responseText ->
                         withContext(Dispatchers.Main) {
@@ -6,11 +6,13 @@ import retrofit2.Response
 import retrofit2.http.Multipart
 import retrofit2.http.POST
 import retrofit2.http.Part
+import retrofit2.http.Query
 
 interface ApiService {
     @Multipart
     @POST("upload")  // Endpoint for uploading audio
     suspend fun uploadAudioFile(
-        @Part file: MultipartBody.Part
+        @Part file: MultipartBody.Part,
+        @Query("priority") priority: String? = null  // emergency uploads are queued first
     ): Response<ResponseBody>
 }
\ No newline at end of file
@@ -8,7 +8,7 @@ import java.io.IOException
 
 class ApiClient(private val apiService: ApiService) {
 
-    suspend fun uploadAudioFile(audioFile: File): Result<String> {
+    suspend fun uploadAudioFile(audioFile: File, priority: String? = null): Result<String> {
         return try {
             // Validate the file
             if (!audioFile.exists() || !audioFile.canRead()) {
@@ -42,7 +42,7 @@ class ApiClient(private val apiService: ApiService) {
             )
 
             // Make API call
-            val response = apiService.uploadAudioFile(body)
+            val response = apiService.uploadAudioFile(body, priority)
 
             // Handle response
             if (response.isSuccessful) {
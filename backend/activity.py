@@ -0,0 +1,61 @@
+import numpy as np
+import scipy.fft
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class ActivityGate:
+    """
+    Cheap energy pre-filter run on decoded PCM before feature extraction.
+
+    A clip is active when at least ``min_active_ratio`` of its frames have an
+    RMS level above ``threshold_db`` (dBFS).  With ``max_flatness`` set, a
+    clip whose loud frames are all noise-like (spectral flatness close to 1,
+    e.g. fan or wind hum) is treated as inactive too.  Frame energies come from
+    a cumulative sum of squares, so the check is a single pass over the signal.
+    """
+
+    def __init__(self, threshold_db=-55.0, min_active_ratio=0.05, max_flatness=None,
+                 frame_length=2048, hop_length=512):
+        self.threshold_db = threshold_db
+        self.min_active_ratio = min_active_ratio
+        self.max_flatness = max_flatness
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+
+    def frame_rms_db(self, audio):
+        """Per-frame RMS level in dBFS (uncentered frames)."""
+        audio = np.asarray(audio, dtype=np.float32).ravel()
+        if len(audio) < self.frame_length:
+            audio = np.pad(audio, (0, self.frame_length - len(audio)), mode='constant')
+
+        squares = np.concatenate([[0.0], np.cumsum(np.square(audio, dtype=np.float64))])
+        starts = np.arange(0, len(audio) - self.frame_length + 1, self.hop_length)
+        energy = (squares[starts + self.frame_length] - squares[starts]) / self.frame_length
+        return 10.0 * np.log10(np.maximum(energy, 1e-12))
+
+    def spectral_flatness(self, audio, frame_indices):
+        """Mean spectral flatness of the given frames (0 = tonal, 1 = white noise)."""
+        frames = sliding_window_view(np.asarray(audio, dtype=np.float32).ravel(), self.frame_length)
+        frames = frames[frame_indices * self.hop_length] * np.hanning(self.frame_length).astype(np.float32)
+        power = np.abs(scipy.fft.rfft(frames, axis=-1)) ** 2 + 1e-10
+        flatness = np.exp(np.mean(np.log(power), axis=-1)) / np.mean(power, axis=-1)
+        return float(flatness.mean())
+
+    def check(self, audio):
+        """Return (active, stats) for a mono signal."""
+        levels = self.frame_rms_db(audio)
+        loud = np.flatnonzero(levels > self.threshold_db)
+        ratio = len(loud) / len(levels)
+
+        stats = {
+            'peak_db': round(float(levels.max()), 2),
+            'active_ratio': round(ratio, 4)
+        }
+        active = ratio >= self.min_active_ratio
+
+        if active and self.max_flatness is not None and len(audio) >= self.frame_length:
+            flatness = self.spectral_flatness(audio, loud)
+            stats['flatness'] = round(flatness, 4)
+            active = flatness <= self.max_flatness
+
+        return active, stats
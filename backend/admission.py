@@ -0,0 +1,142 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import ADMISSIONS, ADMISSION_WAIT
+
+# Lower value = served first
+PRIORITIES = {'emergency': 0, 'normal': 1, 'background': 2}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; the caller should answer 503 with Retry-After."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'state', 'event')
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.state = 'waiting'
+        self.event = threading.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a priority wait queue for analysis requests.
+
+    At most ``max_active`` requests run at once.  Up to ``max_queue`` more
+    wait for a slot, emergency before normal before background and in
+    arrival order within a priority; a waiter gives up after ``max_wait``
+    seconds.  When the queue is full, an arriving request displaces the
+    newest waiter of a lower priority, or is rejected at once if there is
+    none, so the requests that are admitted keep a bounded latency.
+    Rejections carry a Retry-After estimate from the recent service time.
+    """
+
+    def __init__(self, max_active=8, max_queue=32, max_wait=5.0):
+        if max_active < 1:
+            raise ValueError("max_active must be at least 1")
+
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._service_time = 1.0  # moving average, seconds
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, priority='normal'):
+        """Hold a slot for the duration of the block; raises AdmissionRejected."""
+        if priority not in PRIORITIES:
+            priority = 'normal'
+        start = time.monotonic()
+        self._acquire(priority)
+        ADMISSIONS.inc(priority=priority, outcome='admitted')
+        admitted = time.monotonic()
+        ADMISSION_WAIT.observe(admitted - start, priority=priority)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - admitted)
+
+    def _acquire(self, priority):
+        with self._lock:
+            if self.active < self.max_active and self.waiting == 0:
+                self.active += 1
+                return
+
+            if self.waiting >= self.max_queue:
+                victim = self._lowest_waiter()
+                if victim is None or victim.priority <= PRIORITIES[priority]:
+                    ADMISSIONS.inc(priority=priority, outcome='rejected')
+                    raise AdmissionRejected("Server busy, please retry", self._retry_after())
+                # Shed a less urgent waiter to make room
+                victim.state = 'shed'
+                self.waiting -= 1
+                victim.event.set()
+
+            waiter = _Waiter(PRIORITIES[priority], next(self._seq))
+            heapq.heappush(self._heap, waiter)
+            self.waiting += 1
+
+        waiter.event.wait(self.max_wait)
+
+        with self._lock:
+            if waiter.state == 'admitted':
+                return
+            if waiter.state == 'waiting':
+                # Timed out; the heap entry is skipped when it comes up
+                waiter.state = 'expired'
+                self.waiting -= 1
+                outcome = 'timeout'
+            else:
+                outcome = 'shed'
+            ADMISSIONS.inc(priority=priority, outcome=outcome)
+            raise AdmissionRejected("Server busy, please retry", self._retry_after())
+
+    def _release(self, service_time):
+        with self._lock:
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time
+            while self._heap:
+                waiter = heapq.heappop(self._heap)
+                if waiter.state == 'waiting':
+                    # Hand the slot straight to the next waiter
+                    waiter.state = 'admitted'
+                    self.waiting -= 1
+                    waiter.event.set()
+                    return
+            self.active -= 1
+
+    def _lowest_waiter(self):
+        """The least urgent, most recent waiter still in the queue."""
+        candidates = [w for w in self._heap if w.state == 'waiting']
+        return max(candidates, key=lambda w: (w.priority, w.seq)) if candidates else None
+
+    def _retry_after(self):
+        backlog = (self.waiting + 1) * self._service_time / self.max_active
+        return min(max(int(math.ceil(backlog)), 1), 30)
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_active': self.max_active,
+            'max_queue': self.max_queue,
+            'service_time_seconds': round(self._service_time, 4)
+        }
@@ -1,66 +1,109 @@
 import os
 import numpy as np
 import librosa
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-import joblib
 import soundfile as sf
 import warnings
 import wave
-import io
+import logging
+from registry import ModelRegistry
+from mfcc import BatchMFCC
+from probe import sniff_format
+from wavio import read_wav, resample
+from metrics import STAGE_SECONDS, ERRORS, FALLBACKS, GATE
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 class AudioProcessor:
-    def __init__(self, model_path, scaler_path=None):
-        """Initialize the audio processor with the trained model."""
-        print("🔊 Initializing Audio Processor...")
-        
-        # Check if model exists
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file not found: {model_path}")
-        
-        # Determine model type
-        self.model_type = 'rf' if model_path.endswith('.pkl') else 'cnn'
-        print(f"📊 Detected model type: {self.model_type.upper()}")
-        
-        # Load model
-        if self.model_type == 'cnn':
-            self.model = load_model(model_path, compile=False)
-            self.model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-        else:  # RF
-            self.model = joblib.load(model_path)
+    def __init__(self, model_path, scaler_path=None, max_batch_size=None, max_batch_wait_ms=10.0,
+                 activity_gate=None, featurizer=None, fft_workers=-1, source_path=None,
+                 featurizer_min_clips=8):
+        """
+        Initialize the audio processor with the trained model.
+
+        The model is registered as 'primary' in a ModelRegistry, where more
+        models can be added for A/B routing and shadow scoring. When
+        max_batch_size is greater than 1, predictions from concurrent
+        callers are grouped into a single model call (see MicroBatcher).
+        An ActivityGate short-circuits near-silent clips to SAFE before
+        feature extraction. With a featurizer (concurrency.FeaturizePool),
+        batches of at least featurizer_min_clips clips are featurized in its
+        worker processes; single clips and smaller batches stay in the
+        calling thread, where they cost less than the IPC round-trip. fft_workers caps scipy.fft threads for in-process
+        batch featurization. source_path is the .h5 a .npz model_path was
+        exported from (see LoadedModel).
+        """
+        logger.info("🔊 Initializing Audio Processor...")
         
-        # Load scaler if provided
-        if scaler_path and os.path.exists(scaler_path):
-            self.scaler = joblib.load(scaler_path)
-            print(f"✅ Loaded scaler from: {scaler_path}")
-        else:
-            self.scaler = None
-            print("⚠️  No scaler loaded")
+        self.models = ModelRegistry(max_batch_size=max_batch_size, max_batch_wait_ms=max_batch_wait_ms)
+        self.models.load('primary', model_path, scaler_path, warmup=False, source_path=source_path)
         
         # Audio parameters (MUST MATCH GOOGLE COLAB EXACTLY)
         self.target_sr = 22050  # Sampling rate
         self.duration = 4.0     # Duration in seconds
         self.n_mfcc = 13        # Number of MFCC coefficients
         
-        print("✅ Audio Processor initialized successfully!")
-        print(f"   Target SR: {self.target_sr} Hz")
-        print(f"   Duration: {self.duration} seconds")
-        print(f"   MFCC Coefficients: {self.n_mfcc}")
+        logger.info("✅ Audio Processor initialized: %d Hz, %.1f s, %d MFCC coefficients",
+                    self.target_sr, self.duration, self.n_mfcc)
 
-    def extract_features(self, audio_path):
+        # Vectorized MFCC for batch extraction (filterbank/DCT built once)
+        self.batch_mfcc = BatchMFCC(sr=self.target_sr, n_mfcc=self.n_mfcc, n_fft=2048, hop_length=512,
+                                    workers=fft_workers)
+        self.featurizer = featurizer
+        self.featurizer_min_clips = featurizer_min_clips
+
+        self.activity_gate = activity_gate
+
+    # The primary model, for callers that do not route between models
+    @property
+    def model_type(self):
+        return self.models.primary.model_type
+
+    @property
+    def model(self):
+        return self.models.primary.model
+
+    @property
+    def scaler(self):
+        return self.models.primary.scaler
+
+    @property
+    def batcher(self):
+        return self.models.primary.batcher
+
+    def warmup(self):
+        """Run one dummy extraction and prediction so the first request skips tracing/JIT."""
+        silence = np.zeros(int(self.target_sr * self.duration), dtype=np.float32)
+        features, success = self.extract_features_from_audio(silence, self.target_sr)
+        if success:
+            self.predict_proba(self.preprocess_features(features))
+            self.batch_mfcc.features(silence[np.newaxis])
+        logger.info("🔥 Warm-up inference complete")
+
+    def load_audio(self, audio_path):
         """
-        Extract MFCC features from audio file with robust audio loading
+        Load up to `duration` seconds of an audio file with robust fallbacks.
+        Returns (audio, sr), or (None, None) if every method fails.
         """
         try:
-            print(f"📊 Loading audio: {os.path.basename(audio_path)}")
+            logger.debug("📊 Loading audio: %s", os.path.basename(audio_path))
             
             # Verify file exists
             if not os.path.exists(audio_path):
                 raise FileNotFoundError(f"Audio file not found: {audio_path}")
             
-            file_size = os.path.getsize(audio_path)
-            print(f"📁 File size: {file_size} bytes")
+            logger.debug("📁 File size: %d bytes", os.path.getsize(audio_path))
+            
+            # FAST PATH: WAV/PCM (e.g. convert_to_wav output) is memory-mapped
+            # and converted directly, without librosa
+            with open(audio_path, 'rb') as f:
+                header = f.read(64)
+            if sniff_format(header) == 'wav':
+                with STAGE_SECONDS.time(stage='load'):
+                    decoded = read_wav(audio_path, self.target_sr, self.duration)
+                if decoded is not None:
+                    logger.debug("✅ Loaded WAV fast path: %d samples, %d Hz", len(decoded[0]), decoded[1])
+                    return decoded
             
             # METHOD 1: Try librosa with error handling
             audio = None
@@ -70,88 +113,106 @@ class AudioProcessor:
             for attempt in range(max_retries):
                 try:
                     # Try with librosa first (most flexible)
-                    audio, sr = librosa.load(
-                        audio_path, 
-                        sr=self.target_sr, 
-                        duration=self.duration,
-                        mono=True,
-                        offset=0.0
-                    )
-                    print(f"✅ Successfully loaded with librosa (attempt {attempt + 1})")
-                    print(f"   Samples: {len(audio)}, SR: {sr} Hz")
+                    with STAGE_SECONDS.time(stage='load'):
+                        audio, sr = librosa.load(
+                            audio_path, 
+                            sr=self.target_sr, 
+                            duration=self.duration,
+                            mono=True,
+                            offset=0.0
+                        )
+                    logger.debug("✅ Loaded with librosa (attempt %d): %d samples, %d Hz", attempt + 1, len(audio), sr)
                     break
                 except Exception as e:
                     if attempt == max_retries - 1:
-                        print(f"⚠️  Librosa failed: {e}")
+                        logger.warning("⚠️  Librosa failed: %s", e)
                     else:
-                        print(f"⚠️  Librosa attempt {attempt + 1} failed, retrying...")
+                        logger.debug("⚠️  Librosa attempt %d failed, retrying...", attempt + 1)
                         continue
             
             # METHOD 2: If librosa fails, try raw file reading
             if audio is None:
-                print("🔄 Trying alternative loading methods...")
+                logger.info("🔄 Trying alternative loading methods...")
+                FALLBACKS.inc(step='load', method='alternative')
                 try:
-                    # Read raw bytes and try different methods
                     with open(audio_path, 'rb') as f:
-                        raw_data = f.read()
+                        magic = f.read(4)
                     
                     # Check if it's a WAV file
-                    if raw_data[:4] == b'RIFF':
-                        print("📄 Detected RIFF WAV format")
+                    if magic == b'RIFF':
+                        logger.debug("📄 Detected RIFF WAV format")
                         try:
                             # Try soundfile
-                            audio, sr = sf.read(io.BytesIO(raw_data))
+                            audio, sr = sf.read(audio_path, dtype='float32')
                             if len(audio.shape) > 1:
                                 audio = np.mean(audio, axis=1)  # Convert to mono
                         except:
                             # Try wave module
-                            with wave.open(io.BytesIO(raw_data)) as wav_file:
+                            with wave.open(audio_path) as wav_file:
                                 sr = wav_file.getframerate()
                                 n_frames = wav_file.getnframes()
                                 audio_data = wav_file.readframes(n_frames)
                                 audio = np.frombuffer(audio_data, dtype=np.int16)
                                 audio = audio.astype(np.float32) / 32768.0
                     
-                    print(f"✅ Loaded with alternative method")
-                    print(f"   Samples: {len(audio)}, SR: {sr} Hz")
+                    logger.debug("✅ Loaded with alternative method: %d samples, %d Hz", len(audio), sr)
                     
                 except Exception as alt_error:
-                    print(f"❌ All loading methods failed: {alt_error}")
-                    return None, False
+                    logger.error("❌ All loading methods failed: %s", alt_error)
+                    ERRORS.inc(stage='load')
+                    return None, None
             
+            return audio, sr
+            
+        except Exception as e:
+            logger.exception("❌ Error in load_audio: %s", e)
+            ERRORS.inc(stage='load')
+            return None, None
+
+    def extract_features(self, audio_path):
+        """
+        Extract MFCC features from audio file with robust audio loading
+        """
+        audio, sr = self.load_audio(audio_path)
+        if audio is None:
+            return None, False
+        return self.extract_features_from_audio(audio, sr)
+
+    def extract_features_from_audio(self, audio, sr):
+        """
+        Extract MFCC features from an already decoded mono signal.
+        """
+        try:
             # Resample if needed
             if sr != self.target_sr:
-                print(f"🔄 Resampling from {sr} Hz to {self.target_sr} Hz")
-                audio = librosa.resample(audio, orig_sr=sr, target_sr=self.target_sr)
+                logger.debug("🔄 Resampling from %d Hz to %d Hz", sr, self.target_sr)
+                with STAGE_SECONDS.time(stage='resample'):
+                    audio = resample(audio, sr, self.target_sr)
                 sr = self.target_sr
             
             # Ensure exact length for the specified duration
             target_length = int(self.target_sr * self.duration)
             if len(audio) < target_length:
                 padding = target_length - len(audio)
-                print(f"📏 Padding with {padding} zeros")
+                logger.debug("📏 Padding with %d zeros", padding)
                 audio = np.pad(audio, (0, padding), mode='constant')
             elif len(audio) > target_length:
-                print(f"✂️  Trimming to {target_length} samples")
+                logger.debug("✂️  Trimming to %d samples", target_length)
                 audio = audio[:target_length]
             
-            print(f"📊 Final audio: {len(audio)} samples ({len(audio)/self.target_sr:.2f} seconds)")
-            
             # Extract MFCC features
-            print("🎵 Extracting MFCC features...")
-            mfccs = librosa.feature.mfcc(
-                y=audio, 
-                sr=sr, 
-                n_mfcc=self.n_mfcc,
-                n_fft=2048,
-                hop_length=512
-            )
-            
-            print(f"📊 MFCC shape: {mfccs.shape}")
-            
-            # Aggregate features
-            mfccs_mean = np.mean(mfccs, axis=1)
-            mfccs_std = np.std(mfccs, axis=1)
+            with STAGE_SECONDS.time(stage='mfcc'):
+                mfccs = librosa.feature.mfcc(
+                    y=audio, 
+                    sr=sr, 
+                    n_mfcc=self.n_mfcc,
+                    n_fft=2048,
+                    hop_length=512
+                )
+                
+                # Aggregate features
+                mfccs_mean = np.mean(mfccs, axis=1)
+                mfccs_std = np.std(mfccs, axis=1)
             
             # Handle NaN/Inf values
             mfccs_mean = np.nan_to_num(mfccs_mean, nan=0.0, posinf=0.0, neginf=0.0)
@@ -160,82 +221,212 @@ class AudioProcessor:
             # Combine features
             features = np.hstack([mfccs_mean, mfccs_std])
             
-            print(f"✅ Features extracted: shape={features.shape}")
-            print(f"   Mean range: [{np.min(mfccs_mean):.4f}, {np.max(mfccs_mean):.4f}]")
-            print(f"   Std range: [{np.min(mfccs_std):.4f}, {np.max(mfccs_std):.4f}]")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("✅ Features extracted: shape=%s, mean range [%.4f, %.4f], std range [%.4f, %.4f]",
+                             features.shape, np.min(mfccs_mean), np.max(mfccs_mean),
+                             np.min(mfccs_std), np.max(mfccs_std))
             
             return features, True
             
         except Exception as e:
-            print(f"❌ Error in extract_features: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Error in extract_features_from_audio: %s", e)
+            ERRORS.inc(stage='mfcc')
             return None, False
 
+    def fit_length(self, audio):
+        """Pad or trim a signal to exactly duration seconds at target_sr."""
+        target_length = int(self.target_sr * self.duration)
+        if len(audio) < target_length:
+            return np.pad(audio, (0, target_length - len(audio)), mode='constant')
+        return audio[:target_length]
+
+    def extract_features_batch(self, clips):
+        """
+        Extract features for many clips at once.
+
+        Takes an (N, samples) array of clips at target_sr already padded to
+        the processor duration, or a list of 1-D signals at target_sr which
+        are padded/trimmed here. Returns an (N, 26) feature matrix.
+        """
+        if not isinstance(clips, np.ndarray):
+            clips = np.stack([self.fit_length(np.asarray(c, dtype=np.float32)) for c in clips])
+        
+        if clips.ndim != 2 or clips.shape[1] != int(self.target_sr * self.duration):
+            raise ValueError(f"Expected clips of shape (N, {int(self.target_sr * self.duration)}), got {clips.shape}")
+        
+        if self.featurizer is not None and len(clips) >= self.featurizer_min_clips:
+            return self.featurizer.features(clips)
+        return self.batch_mfcc.features(clips)
+
     def preprocess_features(self, features):
-        """Prepare features for model prediction."""
-        if self.model_type == 'cnn':
-            # Reshape for CNN: (1, 13, 2, 1)
-            features_2d = features.reshape(13, 2)
-            features_reshaped = features_2d.reshape(1, 13, 2, 1)
-            print(f"📊 CNN input shape: {features_reshaped.shape}")
-            return features_reshaped
-        else:  # RF
-            features_reshaped = features.reshape(1, -1)
-            if self.scaler:
-                features_reshaped = self.scaler.transform(features_reshaped)
-            print(f"📊 RF input shape: {features_reshaped.shape}")
-            return features_reshaped
+        """Prepare a (26,) feature vector or an (N, 26) batch for the primary model."""
+        return self.models.primary.preprocess(features)
+
+    def predict_proba(self, model_input):
+        """Run the primary model on a batch of preprocessed inputs."""
+        return self.models.primary.predict_proba(model_input)
+
+    def score_features(self, features):
+        """
+        Score a (26,) vector or an (N, 26) batch with the routed model.
+        Returns (prediction_proba, model, stages); stages lists the cascade
+        stage that decided each row, or is None for a single model. A shadow
+        model, if any, scores the same features in the background.
+        """
+        served, shadow = self.models.route()
+        prediction_proba, stages = served.decide(served.preprocess(features))
+        self.models.record(served, features, prediction_proba, shadow)
+        return prediction_proba, served, stages
+
+    def format_prediction(self, proba, model=None, stage=None):
+        """Turn one row of prediction_proba into a result dict, tagged with the model (and cascade stage) that made it."""
+        prediction = int(np.argmax(proba))
+        
+        # Map to class labels
+        result = {
+            'status': 'success',
+            'is_danger': int(prediction == 0),
+            'prediction': prediction,
+            'confidence': float(np.max(proba)),
+            'danger_probability': float(proba[0]),
+            'safe_probability': float(proba[1]),
+            'class_label': "DANGER 🔴" if prediction == 0 else "SAFE 🟢"
+        }
+        if model is not None:
+            result['model'] = model.name
+            result['model_version'] = model.version
+        if stage is not None:
+            result['stage'] = stage
+        return result
+
+    def predict_features_batch(self, features):
+        """Predict an (N, 26) feature matrix in one model call; returns N result dicts."""
+        if len(features) == 0:
+            return []
+        prediction_proba, model, stages = self.score_features(features)
+        stages = stages or [None] * len(prediction_proba)
+        return [self.format_prediction(row, model, stage) for row, stage in zip(prediction_proba, stages)]
+
+    def predict_full_clip(self, audio, sr, hop_seconds=1.0):
+        """
+        Score every `duration`-long window of a full-length recording.
+
+        All windows are featurized from one MFCC pass and predicted in one
+        model call. The top-level prediction is the most dangerous window's;
+        `timeline` lists each window's danger probability.
+        """
+        gated = self.gate(audio)
+        if gated is not None:
+            gated.update({'mode': 'full', 'duration': round(len(audio) / sr, 3), 'windows': 0, 'peak_time': None,
+                          'mean_danger_probability': 0.0, 'timeline': []})
+            return gated
+        
+        try:
+            if sr != self.target_sr:
+                with STAGE_SECONDS.time(stage='resample'):
+                    audio = resample(np.asarray(audio, dtype=np.float32), sr, self.target_sr)
+            with STAGE_SECONDS.time(stage='mfcc'):
+                starts, features = self.batch_mfcc.window_features(audio, self.duration, hop_seconds)
+            prediction_proba, model, stages = self.score_features(features)
+        except Exception as e:
+            logger.exception("❌ Full-clip analysis error: %s", e)
+            ERRORS.inc(stage='predict')
+            return {
+                'status': 'error',
+                'message': f'Full-clip analysis failed: {str(e)}'
+            }
+        
+        danger = prediction_proba[:, 0]
+        peak = int(np.argmax(danger))
+        result = self.format_prediction(prediction_proba[peak], model, stages[peak] if stages else None)
+        result.update({
+            'mode': 'full',
+            'duration': round(len(audio) / self.target_sr, 3),
+            'windows': len(starts),
+            'peak_time': round(float(starts[peak]), 3),
+            'mean_danger_probability': float(danger.mean()),
+            'timeline': [
+                {
+                    'start': round(float(start), 3),
+                    'end': round(float(start) + self.duration, 3),
+                    'danger_probability': float(p)
+                }
+                for start, p in zip(starts, danger)
+            ]
+        })
+        logger.debug("📊 Full clip: %d windows, peak danger %.4f at %.2f s",
+                     len(starts), danger[peak], starts[peak])
+        return result
+
+    def gate(self, audio):
+        """
+        Run the activity gate on a decoded signal.
+        Returns a SAFE result marked `gated` for inactive audio, otherwise None.
+        """
+        if self.activity_gate is None:
+            return None
+        
+        with STAGE_SECONDS.time(stage='gate'):
+            active, stats = self.activity_gate.check(audio)
+        GATE.inc(outcome='passed' if active else 'gated')
+        if active:
+            return None
+        
+        logger.debug("🔇 Gated inactive audio: %s", stats)
+        result = self.format_prediction(np.array([0.0, 1.0]))
+        result.update({'gated': True, 'activity': stats})
+        return result
 
     def predict_danger(self, audio_path):
         """Make prediction on audio file."""
-        print(f"\n🎯 Analyzing audio: {os.path.basename(audio_path)}")
+        logger.debug("🎯 Analyzing audio: %s", os.path.basename(audio_path))
         
-        # Extract features
-        features, success = self.extract_features(audio_path)
-        if not success or features is None:
+        audio, sr = self.load_audio(audio_path)
+        if audio is None:
             return {
                 'status': 'error',
                 'message': 'Failed to extract features from audio file'
             }
         
-        # Preprocess features
-        model_input = self.preprocess_features(features)
+        return self.predict_danger_from_audio(audio, sr)
+
+    def predict_danger_from_audio(self, audio, sr, feature_sink=None):
+        """
+        Make prediction on an already decoded mono signal.
+        feature_sink(audio, features), if given, receives the extracted
+        feature vector (e.g. to record it in a FeatureStore).
+        """
+        gated = self.gate(audio)
+        if gated is not None:
+            return gated
         
+        features, success = self.extract_features_from_audio(audio, sr)
+        if not success or features is None:
+            return {
+                'status': 'error',
+                'message': 'Failed to extract features from audio'
+            }
+        if feature_sink is not None:
+            feature_sink(audio, features)
+        
+        return self.predict_from_features(features)
+
+    def predict_from_features(self, features):
+        """Make prediction on an extracted 26-dim feature vector."""
         try:
             # Make prediction
-            if self.model_type == 'cnn':
-                prediction_proba = self.model.predict(model_input, verbose=0)
-            else:  # RF
-                prediction_proba = self.model.predict_proba(model_input)
+            prediction_proba, model, stages = self.score_features(features)
+            result = self.format_prediction(prediction_proba[0], model, stages[0] if stages else None)
             
-            # Get prediction results
-            prediction = np.argmax(prediction_proba, axis=1)[0]
-            confidence = float(np.max(prediction_proba))
-            danger_prob = float(prediction_proba[0][0])
-            safe_prob = float(prediction_proba[0][1])
+            logger.debug("📊 Prediction: %s (confidence %.4f, danger %.4f, safe %.4f)",
+                         result['class_label'], result['confidence'],
+                         result['danger_probability'], result['safe_probability'])
             
-            # Map to class labels
-            is_danger = int(prediction == 0)
-            class_label = "DANGER 🔴" if prediction == 0 else "SAFE 🟢"
-            
-            print(f"📊 Prediction: {class_label}")
-            print(f"📊 Confidence: {confidence:.4f}")
-            print(f"📊 Danger Probability: {danger_prob:.4f}")
-            print(f"📊 Safe Probability: {safe_prob:.4f}")
-            
-            return {
-                'status': 'success',
-                'is_danger': is_danger,
-                'prediction': int(prediction),
-                'confidence': confidence,
-                'danger_probability': danger_prob,
-                'safe_probability': safe_prob,
-                'class_label': class_label
-            }
+            return result
             
         except Exception as e:
-            print(f"❌ Prediction error: {str(e)}")
+            logger.error("❌ Prediction error: %s", e)
+            ERRORS.inc(stage='predict')
             return {
                 'status': 'error',
                 'message': f'Prediction failed: {str(e)}'
@@ -299,4 +490,5 @@ def test_processor():
         traceback.print_exc()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(message)s')
     test_processor()
\ No newline at end of file
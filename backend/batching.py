@@ -0,0 +1,108 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collects model inputs from concurrent callers and runs them as one batch.
+
+    A batch is flushed when it holds ``max_batch_size`` rows or when the oldest
+    queued input has waited ``max_wait_ms`` milliseconds, whichever comes first.
+    Every caller gets back only its own rows of the model output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=10.0, name='inference'):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.batches_run = 0
+        self.rows_run = 0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, model_input):
+        """Queue a (n, ...) input array and return a Future for its (n, classes) output."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+
+        model_input = np.asarray(model_input)
+        future = Future()
+        self._queue.put((model_input, future))
+        return future
+
+    def predict(self, model_input, timeout=None):
+        """Blocking wrapper around submit()."""
+        return self.submit(model_input).result(timeout=timeout)
+
+    def close(self, timeout=None):
+        """Stop the worker thread after the queued inputs have been served."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        # Drop callers that gave up before we got to them
+        batch = [(x, f) for x, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            inputs = np.concatenate([x for x, _ in batch], axis=0)
+            outputs = np.asarray(self.predict_fn(inputs))
+        except Exception as e:
+            logger.error(f"❌ Batched prediction failed ({len(batch)} requests): {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.rows_run += len(inputs)
+
+        offsets = np.cumsum([len(x) for x, _ in batch])[:-1]
+        for (_, future), result in zip(batch, np.split(outputs, offsets)):
+            future.set_result(result)
@@ -0,0 +1,400 @@
+"""
+Reproducible latency/throughput benchmarks for the detection backend.
+
+    python benchmark.py                                  # stages + load test, results in benchmark.json
+    python benchmark.py --stages-only --repeat 20
+    python benchmark.py --load-only --concurrency 1 8 32 --requests 200
+    python benchmark.py --url http://host:5000 --load-only
+    python benchmark.py -o new.json --compare benchmark.json
+
+Synthetic clips (seeded tones plus noise bursts) are generated for every
+extension in ALLOWED_EXTENSIONS at each duration and sample rate, then:
+
+- each stage is timed on its own: detect_audio_format, decode_audio,
+  convert_to_wav, extract_features, preprocess_features and predict;
+- /upload is load-tested at each concurrency level, either against an
+  in-process server on a free port or against --url.
+
+Latencies are reported in milliseconds (mean, p50, p95, p99).  The result
+cache is disabled for the in-process server so repeated clips are analyzed
+every time; the model and other settings follow the usual environment
+variables.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Extension -> how to write it: ('soundfile', format, subtype) or ('ffmpeg', args)
+CLIP_WRITERS = {
+    'wav': ('soundfile', 'WAV', 'PCM_16'),
+    'flac': ('soundfile', 'FLAC', 'PCM_16'),
+    'ogg': ('soundfile', 'OGG', 'VORBIS'),
+    'mp3': ('ffmpeg', ['-c:a', 'libmp3lame', '-f', 'mp3']),
+    'm4a': ('ffmpeg', ['-c:a', 'aac', '-f', 'ipod']),
+    'mp4': ('ffmpeg', ['-c:a', 'aac', '-f', 'mp4']),
+    'aac': ('ffmpeg', ['-c:a', 'aac', '-f', 'adts']),
+    '3gp': ('ffmpeg', ['-c:a', 'libopencore_amrnb', '-ar', '8000', '-b:a', '12.2k', '-f', '3gp']),
+    '3gpp': ('ffmpeg', ['-c:a', 'aac', '-f', '3gp']),
+    'amr': ('ffmpeg', ['-c:a', 'libopencore_amrnb', '-ar', '8000', '-b:a', '12.2k', '-f', 'amr']),
+}
+
+STAGES = ['detect_audio_format', 'decode_audio', 'convert_to_wav', 'extract_features', 'preprocess_features',
+          'predict']
+
+
+def synthesize(duration, sample_rate, seed):
+    """Deterministic test signal: a few tones with noise bursts, as float32 in [-1, 1]."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    audio = np.zeros_like(t)
+    for freq in rng.uniform(200, min(3000, sample_rate / 2 - 100), size=3):
+        audio += 0.2 * np.sin(2 * np.pi * freq * t)
+
+    burst = int(0.2 * sample_rate)
+    for start in rng.integers(0, max(len(t) - burst, 1), size=max(int(duration), 1)):
+        audio[start:start + burst] += rng.normal(0, 0.3, size=len(audio[start:start + burst]))
+
+    return np.clip(audio, -1, 1).astype(np.float32)
+
+
+def write_clip(path, ext, audio, sample_rate, ffmpeg_path):
+    """Write audio to path in the container/codec used for ext; returns False if it cannot be produced."""
+    writer = CLIP_WRITERS[ext]
+    if writer[0] == 'soundfile':
+        sf.write(path, audio, sample_rate, format=writer[1], subtype=writer[2])
+        return True
+
+    if ffmpeg_path is None:
+        return False
+    pcm = (audio * 32767).astype('<i2').tobytes()
+    cmd = [ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-f', 's16le', '-ar', str(sample_rate), '-ac', '1',
+           '-i', 'pipe:0'] + writer[1] + ['-y', path]
+    result = subprocess.run(cmd, input=pcm, capture_output=True, timeout=60)
+    return result.returncode == 0 and os.path.getsize(path) > 0
+
+
+def generate_clips(directory, extensions, durations, sample_rates, seed, ffmpeg_path):
+    clips = []
+    for ext in extensions:
+        if ext not in CLIP_WRITERS:
+            print(f"⚠️  No synthetic writer for .{ext}, skipping")
+            continue
+        for duration in durations:
+            for sample_rate in sample_rates:
+                audio = synthesize(duration, sample_rate, seed)
+                path = os.path.join(directory, f"clip_{duration}s_{sample_rate}hz.{ext}")
+                if not write_clip(path, ext, audio, sample_rate, ffmpeg_path):
+                    print(f"⚠️  Could not write .{ext} clip ({duration}s, {sample_rate} Hz), skipping")
+                    continue
+                clips.append({
+                    'format': ext,
+                    'duration': duration,
+                    'sample_rate': sample_rate,
+                    'bytes': os.path.getsize(path),
+                    'path': path
+                })
+    return clips
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds."""
+    if not seconds:
+        return {'n': 0}
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        'n': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'min_ms': round(float(ms.min()), 3),
+        'max_ms': round(float(ms.max()), 3)
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (and reaped children), or None if unavailable."""
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {'self': round(own / 2 ** 20, 1), 'children': round(children / 2 ** 20, 1)}
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return time.perf_counter() - start, value
+
+
+def bench_stages(app_module, clips, repeat, warmup):
+    """Time each processing stage in isolation for every clip."""
+    processor = app_module.processor
+    rows = []
+
+    for clip in clips:
+        path = clip['path']
+        with open(path, 'rb') as f:
+            data = f.read()
+        timings = {stage: [] for stage in STAGES}
+        errors = {}
+
+        for i in range(warmup + repeat):
+            sample = {}
+            converted = os.path.join(os.path.dirname(path), f"converted_{uuid.uuid4().hex}.wav")
+            try:
+                sample['detect_audio_format'], _ = _timed(app_module.detect_audio_format, path)
+
+                try:
+                    sample['decode_audio'], _ = _timed(
+                        app_module.decode_audio, data, processor.target_sr, processor.duration)
+                except Exception as e:
+                    errors['decode_audio'] = str(e)
+
+                elapsed, ok = _timed(app_module.convert_to_wav, path, converted)
+                if not ok:
+                    errors['convert_to_wav'] = 'conversion failed'
+                    continue
+                sample['convert_to_wav'] = elapsed
+
+                elapsed, (features, ok) = _timed(processor.extract_features, converted)
+                if not ok:
+                    errors['extract_features'] = 'feature extraction failed'
+                    continue
+                sample['extract_features'] = elapsed
+
+                sample['preprocess_features'], model_input = _timed(processor.preprocess_features, features)
+                sample['predict'], _ = _timed(processor.predict_proba, model_input)
+            finally:
+                if os.path.exists(converted):
+                    os.remove(converted)
+                if i >= warmup:
+                    for stage, elapsed in sample.items():
+                        timings[stage].append(elapsed)
+
+        for stage in STAGES:
+            row = {'stage': stage, 'format': clip['format'], 'duration': clip['duration'],
+                   'sample_rate': clip['sample_rate'], **summarize(timings[stage])}
+            if stage in errors:
+                row['error'] = errors[stage]
+            rows.append(row)
+
+        p50 = {stage: summarize(timings[stage]).get('p50_ms') for stage in STAGES}
+        print(f"   .{clip['format']:<5} {clip['duration']:>4}s {clip['sample_rate']:>6} Hz  "
+              + "  ".join(f"{stage}={p50[stage]}" for stage in STAGES))
+
+    return rows
+
+
+def _multipart(filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def _post(url, payload):
+    body, content_type = payload
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type}, method='POST')
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return time.perf_counter() - start, status
+
+
+def bench_load(base_url, clips, concurrency_levels, total_requests):
+    """Fire total_requests uploads at each concurrency level, cycling through the clips."""
+    payloads = []
+    for clip in clips:
+        with open(clip['path'], 'rb') as f:
+            payloads.append(_multipart(os.path.basename(clip['path']), f.read()))
+
+    url = base_url.rstrip('/') + '/upload'
+    rows = []
+    for concurrency in concurrency_levels:
+        work = [payloads[i % len(payloads)] for i in range(total_requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda payload: _post(url, payload), work))
+        wall = time.perf_counter() - start
+
+        statuses = {}
+        for _, status in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        ok = [elapsed for elapsed, status in results if status == 200]
+
+        row = {
+            'concurrency': concurrency,
+            'requests': total_requests,
+            'wall_seconds': round(wall, 3),
+            'rps': round(len(ok) / wall, 2) if wall else 0.0,
+            'statuses': statuses,
+            'peak_rss_mb': peak_rss_mb(),
+            **summarize(ok)
+        }
+        rows.append(row)
+        print(f"   c={concurrency:<4} {row['rps']:>8} req/s  p50={row.get('p50_ms')} p95={row.get('p95_ms')} "
+              f"p99={row.get('p99_ms')} ms  statuses={statuses}")
+    return rows
+
+
+def start_local_server(app):
+    """Serve the Flask app on a free localhost port in a background thread."""
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(baseline_path, results, threshold):
+    """Print p50 changes against a previous results file; returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def index(rows, keys):
+        return {tuple(row.get(k) for k in keys): row for row in rows}
+
+    regressions = 0
+    for section, keys, metric in (('stages', ('stage', 'format', 'duration', 'sample_rate'), 'p50_ms'),
+                                  ('load', ('concurrency',), 'p50_ms')):
+        old = index(baseline.get(section, []), keys)
+        for key, row in index(results.get(section, []), keys).items():
+            before, after = old.get(key, {}).get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            if ratio > 1 + threshold:
+                regressions += 1
+                print(f"❌ {section} {key}: {metric} {before} -> {after} ({ratio:.2f}x)")
+            elif ratio < 1 - threshold:
+                print(f"✅ {section} {key}: {metric} {before} -> {after} ({ratio:.2f}x)")
+    print(f"📊 {regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the audio detection backend")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="Results file (JSON)")
+    parser.add_argument('--formats', nargs='+', help="Extensions to test (default: ALLOWED_EXTENSIONS)")
+    parser.add_argument('--durations', nargs='+', type=float, default=[1.0, 4.0, 10.0], help="Clip lengths in seconds")
+    parser.add_argument('--sample-rates', nargs='+', type=int, default=[8000, 16000, 44100])
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic clips")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per clip and stage")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs per clip before timing")
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=100, help="Uploads per concurrency level")
+    parser.add_argument('--load-duration', type=float, default=4.0,
+                        help="Only clips of this duration are used for the load test")
+    parser.add_argument('--url', help="Load-test a running server instead of an in-process one")
+    parser.add_argument('--stages-only', action='store_true')
+    parser.add_argument('--load-only', action='store_true')
+    parser.add_argument('--compare', help="Previous results file to compare p50 latencies against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative p50 change reported by --compare")
+    args = parser.parse_args()
+
+    # Analyze every request; otherwise repeated clips are served from the cache
+    os.environ.setdefault('RESULT_CACHE_SIZE', '0')
+    need_app = not args.load_only or not args.url
+    app_module = None
+    if need_app:
+        import main as app_module
+        if app_module.processor is None:
+            print("❌ Audio processor failed to load")
+            sys.exit(1)
+
+    if args.formats:
+        extensions = args.formats
+    elif app_module is not None:
+        extensions = sorted(app_module.ALLOWED_EXTENSIONS)
+    else:
+        extensions = sorted(CLIP_WRITERS)
+
+    from transcoder import find_ffmpeg
+    ffmpeg_path = find_ffmpeg()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'ffmpeg': ffmpeg_path,
+            'model_runtime': app_module.processor.models.primary.runtime if app_module else None,
+            'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}
+        },
+        'clips': [],
+        'stages': [],
+        'load': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as directory:
+        print(f"🎵 Generating clips for {', '.join(extensions)}...")
+        clips = generate_clips(directory, extensions, args.durations, args.sample_rates, args.seed, ffmpeg_path)
+        results['clips'] = [{k: v for k, v in clip.items() if k != 'path'} for clip in clips]
+        print(f"✅ {len(clips)} clips")
+
+        if not args.load_only:
+            print("⏱️  Stage benchmarks (p50 ms)...")
+            results['stages'] = bench_stages(app_module, clips, args.repeat, args.warmup)
+
+        if not args.stages_only:
+            load_clips = [clip for clip in clips if clip['duration'] == args.load_duration] or clips
+            server = None
+            base_url = args.url
+            if base_url is None:
+                server, base_url = start_local_server(app_module.app)
+            print(f"🚀 Load test against {base_url}/upload...")
+            try:
+                results['load'] = bench_load(base_url, load_clips, args.concurrency, args.requests)
+            finally:
+                if server is not None:
+                    server.shutdown()
+
+    results['meta']['peak_rss_mb'] = peak_rss_mb()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        sys.exit(1 if compare(args.compare, results, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(buffer):
+    """Short, collision-resistant hex digest of a bytes-like object or array."""
+    return hashlib.blake2b(memoryview(buffer).cast('B'), digest_size=16).hexdigest()
+
+
+def _variant_key(key, variant):
+    return key if variant is None else f"{variant}:{key}"
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a size bound and a per-entry TTL."""
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class ResultCache:
+    """
+    Two-level cache of final analysis dicts for repeated uploads.
+
+    Level one is keyed by the hash of the uploaded bytes and is checked
+    before any decoding. Level two is keyed by the hash of the decoded PCM,
+    so the same recording re-sent in another container still skips MFCC and
+    inference.
+    """
+
+    def __init__(self, max_entries=1024, ttl=600):
+        self.by_bytes = LRUCache(max_entries, ttl)
+        self.by_pcm = LRUCache(max_entries, ttl)
+
+    def lookup_bytes(self, data, variant=None):
+        """
+        Return (key, cached analysis or None) for uploaded bytes.
+        variant separates analyses of the same input with different options.
+        """
+        key = _variant_key(content_hash(data), variant)
+        return key, self.by_bytes.get(key)
+
+    def lookup_pcm(self, audio, variant=None):
+        """Return (key, cached analysis or None) for a decoded signal."""
+        key = _variant_key(content_hash(audio), variant)
+        return key, self.by_pcm.get(key)
+
+    def store(self, analysis, bytes_key=None, pcm_key=None):
+        if bytes_key is not None:
+            self.by_bytes.put(bytes_key, analysis)
+        if pcm_key is not None:
+            self.by_pcm.put(pcm_key, analysis)
+
+    def clear(self):
+        self.by_bytes.clear()
+        self.by_pcm.clear()
+
+    def stats(self):
+        return {
+            'bytes': self.by_bytes.stats(),
+            'pcm': self.by_pcm.stats()
+        }
@@ -0,0 +1,276 @@
+"""
+Thread budgets for the numeric libraries and the featurize process pool.
+
+BLAS/OpenMP, scipy.fft and TensorFlow each size their thread pools to every
+core of the host.  With several request threads per worker and several
+workers per host that oversubscribes the CPU many times over, so each
+worker process gets an explicit budget instead: its share of the cores
+(cores // WEB_CONCURRENCY) split between TensorFlow's intra-op pool, the
+scipy.fft workers of batch featurization and a pool of featurize
+processes, each pinned to a few threads.
+
+The library thread counts are read from the environment when NumPy and
+TensorFlow load, so apply_thread_budget() must run before they are
+imported (main.py does it first thing).  tune() benchmarks a few
+featurize splits on the host and caches the fastest one.
+
+    python concurrency.py          # print the budget for this host
+    python concurrency.py --tune   # benchmark and cache the featurize split
+"""
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TUNE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.thread_tune.json')
+
+# Environment variables read by the BLAS/OpenMP runtimes, numexpr and numba
+BLAS_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+            'NUMEXPR_NUM_THREADS', 'NUMBA_NUM_THREADS')
+
+ThreadBudget = namedtuple('ThreadBudget', 'cores blas fft tf_intra tf_inter featurize_workers featurize_threads')
+
+
+def available_cores():
+    """Cores this process may run on (respects taskset/cgroup CPU affinity)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def thread_budget(cores=None, processes=None):
+    """
+    The budget for one worker process.
+
+    Defaults: BLAS single-threaded (requests already run in parallel
+    threads), TensorFlow intra-op and scipy.fft sized to the worker's share
+    of the cores, and half of that share as single-threaded featurize
+    processes (none when the share is one core).  A tuned split from
+    TUNE_CACHE, then the THREADS_* / FEATURIZE_* variables, override them.
+    """
+    cores = cores or available_cores()
+    processes = processes or int(os.environ.get('WEB_CONCURRENCY', 1))
+    share = max(1, cores // max(processes, 1))
+
+    budget = ThreadBudget(cores=share, blas=1, fft=share, tf_intra=share, tf_inter=1,
+                          featurize_workers=share // 2, featurize_threads=1)
+
+    tuned = load_tuned(share)
+    if tuned:
+        budget = budget._replace(**tuned)
+
+    overrides = {
+        'blas': 'THREADS_BLAS',
+        'fft': 'THREADS_FFT',
+        'tf_intra': 'THREADS_TF_INTRA',
+        'tf_inter': 'THREADS_TF_INTER',
+        'featurize_workers': 'FEATURIZE_WORKERS',
+        'featurize_threads': 'FEATURIZE_THREADS'
+    }
+    return budget._replace(**{field: int(os.environ[var]) for field, var in overrides.items() if var in os.environ})
+
+
+def apply_thread_budget(budget):
+    """Export the budget to the environment; variables set explicitly are left alone."""
+    for var in BLAS_ENV:
+        os.environ.setdefault(var, str(budget.blas))
+    os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(budget.tf_intra))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(budget.tf_inter))
+    if 'numpy' in sys.modules:
+        limit_threads(budget.blas)
+
+
+def limit_threads(n):
+    """Limit already-loaded BLAS/OpenMP pools at runtime (needs the optional threadpoolctl)."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return False
+    threadpool_limits(n)
+    return True
+
+
+def load_tuned(cores):
+    """The cached featurize split for a worker with this many cores, or None."""
+    try:
+        with open(TUNE_CACHE) as f:
+            return json.load(f).get(str(cores))
+    except (OSError, ValueError):
+        return None
+
+
+# Per-process featurizer for the pool workers
+_featurizer = None
+_clip_length = None
+
+
+def _init_featurizer(sr, n_mfcc, duration, threads):
+    global _featurizer, _clip_length
+    # Takes effect if NumPy is not loaded yet in this worker, otherwise via threadpoolctl
+    for var in BLAS_ENV:
+        os.environ[var] = str(threads)
+    limit_threads(threads)
+    from mfcc import BatchMFCC
+    _featurizer = BatchMFCC(sr=sr, n_mfcc=n_mfcc, workers=threads)
+    _clip_length = int(sr * duration)
+
+
+def _featurize(clips):
+    import numpy as np
+    clips = np.atleast_2d(clips)
+    if clips.shape[1] < _clip_length:
+        clips = np.pad(clips, ((0, 0), (0, _clip_length - clips.shape[1])), mode='constant')
+    return _featurizer.features(clips[:, :_clip_length])
+
+
+def _process_context():
+    """
+    Start method for the featurize pool.
+
+    The parent already holds TensorFlow's thread pools, so workers must not be
+    forked from it; and spawn would re-run main.py (model load included) as
+    __mp_main__ in every worker.  A forkserver that preloads only this module
+    avoids both; platforms without it (Windows) fall back to spawn.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        ctx.set_forkserver_preload([__name__])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+
+class FeaturizePool:
+    """
+    MFCC mean/std features computed in worker processes.
+
+    Each of the ``workers`` processes runs BatchMFCC with ``threads``
+    threads for BLAS and scipy.fft, so featurization uses a fixed number of
+    cores no matter how many requests arrive at once.
+    """
+
+    def __init__(self, workers, sr=22050, n_mfcc=13, duration=4.0, threads=1):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.threads = threads
+        self._executor = ProcessPoolExecutor(
+            workers,
+            mp_context=_process_context(),
+            initializer=_init_featurizer,
+            initargs=(sr, n_mfcc, duration, threads)
+        )
+
+    def submit(self, clips):
+        """Future of the (N, 26) features of an (N, samples) or 1-D clip array."""
+        return self._executor.submit(_featurize, clips)
+
+    def features(self, clips):
+        """(N, samples) clips -> (N, 26) features, split across the workers."""
+        import numpy as np
+        clips = np.atleast_2d(clips)
+        if len(clips) == 1:
+            return self.submit(clips).result()
+        chunks = np.array_split(clips, min(self.workers, len(clips)))
+        return np.concatenate([future.result() for future in [self.submit(chunk) for chunk in chunks]])
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def tune(budget, sr=22050, n_mfcc=13, duration=4.0, requests=64, concurrency=None):
+    """
+    Benchmark featurize splits of budget.cores and return the fastest.
+
+    Each candidate featurizes ``requests`` single-clip calls issued from
+    ``concurrency`` threads (like concurrent uploads): in-process with
+    scipy.fft on 1 or all cores, or a FeaturizePool of w processes with
+    cores // w threads each.  Returns ({featurize_workers, featurize_threads,
+    fft}, {candidate: clips per second}).
+    """
+    import numpy as np
+    from mfcc import BatchMFCC
+
+    cores = budget.cores
+    concurrency = concurrency or max(cores, 2)
+    clips = np.random.default_rng(0).standard_normal((requests, int(sr * duration))).astype(np.float32) * 0.1
+
+    candidates = [(0, 1), (0, cores)]
+    for workers in sorted({1, max(cores // 2, 1), cores}):
+        candidates.append((workers, max(cores // workers, 1)))
+    candidates = list(dict.fromkeys(candidates))
+
+    results = {}
+    for workers, threads in candidates:
+        if workers == 0:
+            featurizer = BatchMFCC(sr=sr, n_mfcc=n_mfcc, workers=threads)
+            pool = None
+        else:
+            pool = featurizer = FeaturizePool(workers, sr, n_mfcc, duration, threads)
+        try:
+            featurizer.features(clips[:max(workers, 1)])  # warm up (worker start, FFT plans)
+            with ThreadPoolExecutor(concurrency) as clients:
+                start = time.perf_counter()
+                list(clients.map(lambda clip: featurizer.features(clip[np.newaxis]), clips))
+                elapsed = time.perf_counter() - start
+        finally:
+            if pool is not None:
+                pool.close()
+        results[f"{workers}x{threads}"] = requests / elapsed
+        logger.info("⏱️  featurize %d process(es) x %d thread(s): %.1f clips/s", workers, threads, requests / elapsed)
+
+    best = max(results, key=results.get)
+    workers, threads = (int(part) for part in best.split('x'))
+    split = {'featurize_workers': workers, 'featurize_threads': threads, 'fft': threads if workers == 0 else cores}
+    return split, results
+
+
+def save_tuned(cores, split):
+    """Add a split to TUNE_CACHE; returns False (and logs) when it cannot be written."""
+    try:
+        with open(TUNE_CACHE) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[str(cores)] = split
+    # Per-process temp file, so concurrent writers never replace each other's
+    tmp = f"{TUNE_CACHE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, TUNE_CACHE)
+    except OSError as e:
+        logger.warning(f"⚠️  Could not cache the tuned split in {TUNE_CACHE}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or tune the per-worker thread budget")
+    parser.add_argument('--tune', action='store_true', help="Benchmark featurize splits and cache the fastest")
+    parser.add_argument('--processes', type=int, help="Worker processes per host (default: WEB_CONCURRENCY or 1)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    budget = thread_budget(processes=args.processes)
+    if args.tune:
+        apply_thread_budget(budget)
+        split, _ = tune(budget)
+        save_tuned(budget.cores, split)
+        logger.info(f"✅ Cached {split} for {budget.cores}-core workers in {TUNE_CACHE}")
+        budget = budget._replace(**split)
+    print(json.dumps(budget._asdict(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
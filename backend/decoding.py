@@ -0,0 +1,170 @@
+import io
+import logging
+import struct
+import time
+
+import numpy as np
+import soundfile as sf
+
+from metrics import CONVERSION_SECONDS, FALLBACKS
+from probe import iter_boxes, probe, MIN_CONFIDENCE, MP4_CONTAINER_BOXES
+from transcoder import get_ffmpeg_info, get_transcoder, TranscoderError
+from wavio import decode_wav, resample
+
+logger = logging.getLogger(__name__)
+
+TARGET_SR = 22050
+
+# Containers libsndfile reads natively; everything else goes through ffmpeg
+SOUNDFILE_FORMATS = {'wav', 'flac', 'ogg', 'mp3'}
+
+
+class DecodeError(Exception):
+    """Raised when uploaded bytes cannot be decoded to PCM."""
+
+
+def _shift_chunk_offsets(moov, delta):
+    """Add delta to every stco/co64 entry inside a moov box (in place)."""
+    def walk(start, end):
+        for box_type, pos, header_size, box_end in iter_boxes(moov, start, end):
+            body = pos + header_size
+            if box_type in MP4_CONTAINER_BOXES:
+                walk(body, box_end)
+            elif box_type in (b'stco', b'co64'):
+                count = struct.unpack_from('>I', moov, body + 4)[0]
+                fmt = '>I' if box_type == b'stco' else '>Q'
+                width = struct.calcsize(fmt)
+                for i in range(count):
+                    offset = body + 8 + i * width
+                    value = struct.unpack_from(fmt, moov, offset)[0]
+                    struct.pack_into(fmt, moov, offset, value + delta)
+
+    walk(0, len(moov))
+
+
+def faststart(data):
+    """
+    Move the moov box in front of mdat so ffmpeg can demux the file from a pipe.
+
+    Android's MediaRecorder writes 3GP/MP4 files with the index at the end,
+    which a non-seekable input cannot reach.  Returns data unchanged when the
+    layout is already streamable or not recognised.
+    """
+    boxes = list(iter_boxes(data, 0, len(data)))
+    types = [box[0] for box in boxes]
+    if b'moov' not in types or b'mdat' not in types:
+        return data
+    if types.index(b'moov') < types.index(b'mdat'):
+        return data
+
+    moov_box = next(box for box in boxes if box[0] == b'moov')
+    moov = bytearray(data[moov_box[1]:moov_box[3]])
+    _shift_chunk_offsets(moov, len(moov))
+
+    out = bytearray()
+    for box_type, pos, _, box_end in boxes:
+        if box_type == b'moov':
+            continue
+        if box_type == b'mdat':
+            out += moov
+        out += data[pos:box_end]
+    return bytes(out)
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a bytes-like buffer, without copying it."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def _decode_soundfile(data, target_sr, max_duration):
+    with sf.SoundFile(BufferReader(data)) as f:
+        frames = int(f.samplerate * max_duration) if max_duration else -1
+        audio = f.read(frames=frames, dtype='float32', always_2d=True)
+        sr = f.samplerate
+
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    return np.ascontiguousarray(resample(audio, sr, target_sr), dtype=np.float32)
+
+
+def decode_audio(data, target_sr=TARGET_SR, max_duration=None):
+    """
+    Decode uploaded audio bytes to a mono float32 array at target_sr.
+
+    data may be any bytes-like object (bytes, bytearray, memoryview) and is
+    read in place; PCM and float WAV, and headerless PCM whose layout and
+    rate probe.estimate_pcm() can tell, is interpreted with np.frombuffer
+    (see wavio).
+    Formats libsndfile understands are decoded in-process; AMR/3GP/AAC/MP4
+    (and anything soundfile rejects) go through the shared transcoder pool,
+    which raises TranscoderBusy when it is saturated.
+    Returns (audio, method) where method names the decoder that succeeded.
+    """
+    if not data:
+        raise DecodeError("Empty audio data")
+
+    start = time.perf_counter()
+    info = probe(data)
+    fmt = info.format
+
+    if info.pcm is not None and info.confidence >= MIN_CONFIDENCE:
+        # WAV, or headerless PCM whose layout and rate were estimated
+        decoded = decode_wav(data, target_sr, max_duration, info=info.pcm)
+        if decoded is not None:
+            method = 'wav' if fmt == 'wav' else 'raw'
+            if info.confidence < 1.0:
+                logger.info(f"🔎 Headerless PCM: {info.codec}, {info.channels} ch at an estimated {info.sample_rate} Hz")
+            CONVERSION_SECONDS.observe(time.perf_counter() - start, method=method)
+            return decoded[0], method
+
+    if fmt in SOUNDFILE_FORMATS:
+        try:
+            audio = _decode_soundfile(data, target_sr, max_duration)
+            CONVERSION_SECONDS.observe(time.perf_counter() - start, method='soundfile')
+            return audio, 'soundfile'
+        except Exception as e:
+            logger.warning(f"⚠️  soundfile could not decode {fmt}: {e}")
+            FALLBACKS.inc(step='decode', method='ffmpeg')
+
+    transcoder = get_transcoder()
+    if transcoder is None:
+        raise DecodeError(f"No decoder available for format '{fmt}'")
+
+    # The codec comes from the container header (the stsd entry for 3GP/MP4)
+    if info.codec and info.format != 'pcm' and not get_ffmpeg_info().can_decode(info.codec):
+        raise DecodeError(f"ffmpeg was built without the '{info.codec}' decoder")
+
+    try:
+        audio = transcoder.transcode(faststart(data), max_duration)
+    except TranscoderError as e:
+        raise DecodeError(str(e))
+
+    audio = resample(audio, transcoder.target_sr, target_sr)
+    CONVERSION_SECONDS.observe(time.perf_counter() - start, method='ffmpeg')
+    return audio, 'ffmpeg'
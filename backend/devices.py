@@ -0,0 +1,272 @@
+"""
+Per-device upload sessions.
+
+Uploads that carry a device id are scored as one continuous stream per
+device instead of as unrelated clips.  Each session keeps an
+IncrementalFeaturizer (the log-mel frames of the last window and the
+samples not yet framed) and the last ``tail_seconds`` of PCM, so that:
+
+- a back-to-back upload only computes frames for its own samples; the
+  frames across the boundary reuse the previous clip's tail, and windows
+  that straddle two uploads are scored like any other;
+- an upload that starts with audio the previous one already ended with
+  (overlapping recordings) is aligned against the stored tail and only
+  its new samples are featurized;
+- every upload updates an exponential moving average of its peak danger
+  probability, so decisions can take several clips into account.
+
+An upload only continues the stream when it follows on from the previous
+one: its ``seq`` is the previous one plus 1, its ``start`` time is within
+``max_gap`` seconds of where the previous clip ended or, when the client
+sends neither, it arrived no more than ``max_gap`` seconds later than a
+back-to-back recording would have.  Otherwise the featurizer and tail are
+reset and only the moving average carries over.
+
+Sessions expire after ``ttl`` seconds without uploads, and the least
+recently used ones are evicted beyond ``max_sessions`` or ``max_bytes``
+of session state, which bounds the RAM used by many devices.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import DEVICE_FRAMES, DEVICE_EVICTIONS
+from streaming import IncrementalFeaturizer
+
+logger = logging.getLogger(__name__)
+
+# Overlaps are found by matching the head of an upload against the stored
+# tail; a match needs this normalized correlation
+OVERLAP_MIN_CORRELATION = 0.98
+OVERLAP_PROBE_SAMPLES = 2048
+
+
+class DeviceSession:
+    """One device's uploads, featurized as a stream."""
+
+    def __init__(self, device_id, processor, hop_seconds=1.0, tail_seconds=1.0, ema_alpha=0.5, threshold=0.5,
+                 max_gap=2.0):
+        self.device_id = device_id
+        self.processor = processor
+        self.hop_seconds = hop_seconds
+        self.featurizer = IncrementalFeaturizer(processor.batch_mfcc, processor.duration, hop_seconds)
+        self.tail_samples = int(tail_seconds * self.featurizer.sr)
+        self.max_gap = float(max_gap)
+        self.ema_alpha = float(ema_alpha)
+        self.threshold = float(threshold)
+
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_seen = self.created
+        self.uploads = 0
+        self.rolling_danger = None
+        self.seconds_received = 0.0
+        self.overlap_seconds = 0.0
+        self.stream_resets = 0
+        self._last_seq = None
+        self._last_end = None  # client time the previous clip ended, from its start
+        self._tail = np.zeros(0, dtype=np.float16)
+
+    @property
+    def nbytes(self):
+        """Memory held by the session's audio state."""
+        featurizer = self.featurizer
+        return featurizer._history.nbytes + featurizer._pending.nbytes + self._tail.nbytes
+
+    def _overlap(self, audio):
+        """Number of leading samples of audio the stream already contains."""
+        tail = self._tail.astype(np.float32)
+        n = min(len(tail) // 2, len(audio), OVERLAP_PROBE_SAMPLES)
+        if n < 256:
+            return 0
+        head = audio[:n]
+        head_energy = float(np.dot(head, head))
+        if head_energy == 0.0:
+            return 0  # silence matches anywhere
+
+        # Normalized correlation of the head with every tail position
+        # (through np.fft: scipy.signal would add over a second to startup)
+        size = 1 << (len(tail) + n - 1).bit_length()
+        spectrum = np.fft.rfft(tail, size) * np.conj(np.fft.rfft(head, size))
+        correlation = np.fft.irfft(spectrum, size)[:len(tail) - n + 1]
+        energy = np.cumsum(np.concatenate([[0.0], tail.astype(np.float64) ** 2]))
+        window_energy = np.maximum(energy[n:] - energy[:-n], 1e-12)
+        score = correlation / np.sqrt(window_energy * head_energy)
+        lag = int(np.argmax(score))
+        if score[lag] < OVERLAP_MIN_CORRELATION:
+            return 0
+        return min(len(tail) - lag, len(audio))
+
+    def _follows(self, seconds, seq, start, now):
+        """Whether an upload of this length continues the previous one (see the module docstring)."""
+        if seq is not None and self._last_seq is not None:
+            return seq == self._last_seq + 1
+        if start is not None and self._last_end is not None:
+            return abs(start - self._last_end) <= self.max_gap
+        # A back-to-back recording is uploaded about its own length after the previous one
+        return now - self.last_seen - seconds <= self.max_gap
+
+    def _reset_stream(self):
+        self.featurizer = IncrementalFeaturizer(self.processor.batch_mfcc, self.processor.duration, self.hop_seconds)
+        self._tail = np.zeros(0, dtype=np.float16)
+        self.stream_resets += 1
+
+    def push(self, audio, seq=None, start=None):
+        """
+        Score one decoded upload (mono float32 at the processor rate) in the
+        context of the device's previous uploads.
+
+        ``seq`` (upload counter) and ``start`` (recording start time in
+        seconds, client clock) are optional; they decide whether the upload
+        continues the stream, which otherwise goes by arrival time.
+
+        Returns the result dict of the highest-scoring window this upload
+        completed, or of the upload scored on its own while the stream is
+        shorter than a window, with a 'session' summary added.
+        """
+        now = time.time()
+        clip = audio = np.asarray(audio, dtype=np.float32)
+        seconds = len(audio) / self.featurizer.sr
+
+        contiguous = self.uploads == 0 or self._follows(seconds, seq, start, now)
+        if not contiguous:
+            self._reset_stream()
+        self.last_seen = now
+        if seq is not None:
+            self._last_seq = seq
+        if start is not None:
+            self._last_end = start + seconds
+
+        overlap = self._overlap(audio)
+        if overlap:
+            self.overlap_seconds += overlap / self.featurizer.sr
+            audio = audio[overlap:]
+        self.seconds_received += len(audio) / self.featurizer.sr
+
+        reused = len(self.featurizer._history)
+        frames_before = self.featurizer.frames_seen
+        end_times, features = self.featurizer.push(audio)
+        DEVICE_FRAMES.inc(self.featurizer.frames_seen - frames_before, outcome='computed')
+        if len(audio):
+            self._tail = np.concatenate([self._tail, audio.astype(np.float16)])[-self.tail_samples:]
+
+        if end_times:
+            DEVICE_FRAMES.inc(reused, outcome='reused')
+            results = self.processor.predict_features_batch(features)
+            peak = int(np.argmax([r['danger_probability'] for r in results]))
+            result = dict(results[peak], window_end=round(end_times[peak], 3), windows_scored=len(results))
+        else:
+            # Not a full window of audio yet: score the upload like a stateless one
+            result = self.processor.predict_danger_from_audio(clip, self.processor.target_sr)
+            if result.get('status') == 'error':
+                return result
+
+        danger = float(result['danger_probability'])
+        if self.rolling_danger is None:
+            self.rolling_danger = danger
+        else:
+            self.rolling_danger = self.ema_alpha * danger + (1 - self.ema_alpha) * self.rolling_danger
+        self.uploads += 1
+
+        result['session'] = dict(self.summary(), contiguous=contiguous, overlap_samples=overlap,
+                                 frames_reused=reused if end_times else 0)
+        return result
+
+    def summary(self):
+        return {
+            'device_id': self.device_id,
+            'uploads': self.uploads,
+            'seconds_received': round(self.seconds_received, 3),
+            'overlap_seconds': round(self.overlap_seconds, 3),
+            'stream_resets': self.stream_resets,
+            'rolling_danger_probability': self.rolling_danger,
+            'is_danger': int(self.rolling_danger is not None and self.rolling_danger >= self.threshold),
+            'last_seen': self.last_seen
+        }
+
+
+class DeviceSessionStore:
+    """
+    Device sessions by id, LRU-ordered, with a TTL and count/memory caps.
+
+    The memory cap counts the audio state of every session (see
+    DeviceSession.nbytes), which is re-measured after each upload.
+    """
+
+    def __init__(self, ttl=300, max_sessions=10000, max_bytes=256 * 1024 * 1024, **session_kwargs):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.session_kwargs = session_kwargs
+        self.nbytes = 0
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def push(self, device_id, processor, audio, seq=None, start=None):
+        """Score an upload in its device session (created on first use); see DeviceSession.push()."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(device_id)
+            if session is None:
+                session = self._sessions[device_id] = DeviceSession(device_id, processor, **self.session_kwargs)
+                self._sizes[device_id] = 0
+            self._sessions.move_to_end(device_id)
+
+        with session.lock:
+            result = session.push(audio, seq=seq, start=start)
+            size = session.nbytes
+
+        with self._lock:
+            if self._sessions.get(device_id) is session:
+                self.nbytes += size - self._sizes[device_id]
+                self._sizes[device_id] = size
+            self._evict()
+        return result
+
+    def get(self, device_id):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(device_id)
+
+    def close(self, device_id):
+        with self._lock:
+            return self._remove(device_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _remove(self, device_id):
+        session = self._sessions.pop(device_id, None)
+        if session is not None:
+            self.nbytes -= self._sizes.pop(device_id)
+        return session
+
+    def _expire(self):
+        # Least recently used first, so the scan stops at the first live session
+        cutoff = time.time() - self.ttl
+        while self._sessions:
+            device_id, session = next(iter(self._sessions.items()))
+            if session.last_seen >= cutoff:
+                break
+            self._remove(device_id)
+            DEVICE_EVICTIONS.inc(reason='ttl')
+
+    def _evict(self):
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.nbytes > self.max_bytes):
+            reason = 'lru' if len(self._sessions) > self.max_sessions else 'memory'
+            device_id = next(iter(self._sessions))
+            self._remove(device_id)
+            DEVICE_EVICTIONS.inc(reason=reason)
+            logger.debug(f"Evicted device session {device_id} ({reason})")
+
+    def stats(self):
+        return {
+            'sessions': len(self._sessions),
+            'bytes': self.nbytes,
+            'max_sessions': self.max_sessions,
+            'max_bytes': self.max_bytes
+        }
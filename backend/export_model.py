@@ -0,0 +1,160 @@
+"""
+Export the Keras .h5 danger model to a NumPy .npz for TensorFlow-free serving.
+
+    python export_model.py modals/audio_danger_detection_cnn.h5
+    python export_model.py modals/audio_danger_detection_cnn.h5 -o model.npz --verify
+
+The weights and layer configs are read straight from the HDF5 file with
+h5py, so the export itself does not need TensorFlow either.  --verify
+compares NumpyModel against Keras on random inputs when TensorFlow is
+installed.
+
+The server calls sync_export() at load time and on hot reload, so a
+retrained .h5 replaces a stale export without running this script.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Layer config keys NumpyModel needs, by layer type
+LAYER_KEYS = {
+    'Conv2D': ['strides', 'padding', 'activation', 'use_bias', 'data_format', 'dilation_rate', 'groups'],
+    'Dense': ['activation', 'use_bias'],
+    'BatchNormalization': ['epsilon', 'axis', 'center', 'scale'],
+    'MaxPooling2D': ['pool_size', 'strides', 'padding'],
+    'AveragePooling2D': ['pool_size', 'strides', 'padding'],
+    'GlobalAveragePooling2D': [],
+    'GlobalMaxPooling2D': [],
+    'Flatten': [],
+    'Dropout': [],
+    'Activation': ['activation'],
+}
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _check_layer(kind, config):
+    if kind not in LAYER_KEYS:
+        raise ValueError(f"Layer type {kind} is not supported by NumpyModel")
+    if config.get('data_format', 'channels_last') != 'channels_last':
+        raise ValueError(f"{config['name']}: only channels_last is supported")
+    if tuple(config.get('dilation_rate', (1, 1))) != (1, 1) or config.get('groups', 1) != 1:
+        raise ValueError(f"{config['name']}: dilated/grouped convolutions are not supported")
+    if kind == 'BatchNormalization' and (config.get('axis') not in (-1, 3, [-1], [3])
+                                         or not config.get('center', True) or not config.get('scale', True)):
+        raise ValueError(f"{config['name']}: only last-axis BatchNormalization with center and scale is supported")
+
+
+def export_h5(h5_path, out_path):
+    """Write the layers and weights of a Sequential .h5 model to out_path."""
+    with h5py.File(h5_path, 'r') as f:
+        model_config = json.loads(_decode(f.attrs['model_config']))
+        if model_config['class_name'] != 'Sequential':
+            raise ValueError("Only Sequential models can be exported")
+
+        weights_group = f['model_weights']
+        layers = []
+        arrays = {}
+
+        for layer in model_config['config']['layers']:
+            kind, config = layer['class_name'], layer['config']
+            if kind == 'InputLayer':
+                continue
+            _check_layer(kind, config)
+
+            index = len(layers)
+            spec = {'type': kind, 'name': config['name']}
+            spec.update({key: config[key] for key in LAYER_KEYS[kind] if key in config})
+            if kind in ('MaxPooling2D', 'AveragePooling2D') and spec.get('strides') is None:
+                spec['strides'] = spec['pool_size']
+            layers.append(spec)
+
+            group = weights_group[config['name']]
+            for weight_name in group.attrs.get('weight_names', []):
+                weight_name = _decode(weight_name)
+                short_name = weight_name.split('/')[-1].split(':')[0]
+                arrays[f"{index}/{short_name}"] = np.asarray(group[weight_name], dtype=np.float32)
+
+    np.savez(out_path, __layers__=np.array(json.dumps(layers)), **arrays)
+    return layers, arrays
+
+
+def sync_export(h5_path, npz_path):
+    """
+    Re-export h5_path to npz_path when the .h5 is newer than the export.
+
+    Returns the path to serve: npz_path when it is (now) current, h5_path
+    when the export fails (a layer NumpyModel does not support), so a
+    stale export is never served in place of a retrained model.
+    """
+    try:
+        h5_mtime = os.stat(h5_path).st_mtime_ns
+    except OSError:
+        return npz_path
+    try:
+        if os.stat(npz_path).st_mtime_ns >= h5_mtime:
+            return npz_path
+    except OSError:
+        pass
+
+    # Per-process name: every server worker may export at once
+    tmp_path = f"{npz_path}.{os.getpid()}.tmp.npz"
+    try:
+        export_h5(h5_path, tmp_path)
+        os.replace(tmp_path, npz_path)
+    except Exception as e:
+        logger.warning(f"⚠️  Could not re-export {h5_path}, serving it with Keras: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return h5_path
+    logger.info(f"🔄 Re-exported {h5_path} to {npz_path}")
+    return npz_path
+
+
+def verify(h5_path, npz_path, samples=256):
+    """Return the max absolute difference between Keras and NumpyModel outputs."""
+    from tensorflow.keras.models import load_model
+    from numpy_model import NumpyModel
+
+    keras_model = load_model(h5_path, compile=False)
+    numpy_model = NumpyModel.load(npz_path)
+
+    shape = keras_model.input_shape[1:]
+    x = np.random.default_rng(0).normal(0, 50, size=(samples,) + tuple(shape)).astype(np.float32)
+    return float(np.max(np.abs(keras_model.predict(x, verbose=0) - numpy_model.predict(x))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a Keras .h5 model to a NumPy .npz")
+    parser.add_argument('model', help="Path to the .h5 model")
+    parser.add_argument('-o', '--output', help="Output .npz path (default: next to the model)")
+    parser.add_argument('--verify', action='store_true', help="Compare outputs against Keras")
+    args = parser.parse_args()
+
+    out_path = args.output or os.path.splitext(args.model)[0] + '.npz'
+    layers, arrays = export_h5(args.model, out_path)
+
+    n_params = sum(a.size for a in arrays.values())
+    print(f"✅ Exported {len(layers)} layers, {n_params} parameters to {out_path}")
+    for spec in layers:
+        print(f"   - {spec['type']} ({spec['name']})")
+
+    if args.verify:
+        diff = verify(args.model, out_path)
+        print(f"📊 Max difference vs Keras: {diff:.2e}")
+        if diff > 1e-4:
+            print("❌ Outputs do not match")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+Append-only store of extracted features for retraining and re-scoring.
+
+Rows are keyed by the content hash of the clip the model saw (decoded,
+resampled to target_sr and padded/trimmed to the processor duration), so
+the same recording gets the same key whether it came in through /upload,
+/upload/batch or score.py.  A store is a directory of immutable segments:
+
+    seg-<time>-<pid>-<n>/
+        keys.npy        (N,) S32 hex content hashes
+        features.npy    (N, 26) float32 MFCC mean/std vectors
+        meta.jsonl      one JSON object per row (filename, source, ...)
+        mfcc.npy        optional (13, frames) float32 MFCC matrices of all
+        mfcc_index.npy  rows concatenated along time, and the (N + 1,)
+                        frame offsets of each row
+
+A segment is written to a temporary directory and renamed into place, so
+readers never see a partial one and several processes (gunicorn workers,
+score.py runs) can append to the same store.  Arrays are opened with
+mmap_mode='r': scanning a store copies nothing until rows are used.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from cache import content_hash
+from metrics import FEATURE_STORE_ROWS
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'seg-'
+KEY_DTYPE = np.dtype('S32')
+
+_STOP = object()
+
+
+class Segment:
+    """One immutable segment, with its arrays memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+        self.features = np.load(os.path.join(path, 'features.npy'), mmap_mode='r')
+        self._meta = None
+        self._mfcc = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            with open(os.path.join(self.path, 'meta.jsonl')) as f:
+                self._meta = [json.loads(line) for line in f]
+        return self._meta
+
+    @property
+    def has_mfcc(self):
+        return os.path.exists(os.path.join(self.path, 'mfcc_index.npy'))
+
+    def mfcc(self, row):
+        """The (13, T) MFCC matrix of a row, or None if the segment has none."""
+        if not self.has_mfcc:
+            return None
+        if self._mfcc is None:
+            self._mfcc = (np.load(os.path.join(self.path, 'mfcc.npy'), mmap_mode='r'),
+                          np.load(os.path.join(self.path, 'mfcc_index.npy')))
+        matrix, index = self._mfcc
+        return matrix[:, index[row]:index[row + 1]]
+
+
+class FeatureStore:
+    """A directory of feature segments; see the module docstring for the layout."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._seq = itertools.count()
+        self._known = None
+        self._lock = threading.Lock()
+
+    def segments(self):
+        """All complete segments, oldest first."""
+        names = sorted(name for name in os.listdir(self.root) if name.startswith(SEGMENT_PREFIX))
+        return [Segment(os.path.join(self.root, name)) for name in names]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments())
+
+    def keys(self):
+        return {key.decode('ascii') for segment in self.segments() for key in segment.keys}
+
+    def iter_batches(self, batch_size=4096, start=0):
+        """
+        Yield (keys, features, meta) for consecutive rows, one row per key,
+        skipping the first start of them.  A key stored more than once (by
+        concurrent writers) is yielded for its first row only, like load().
+        Segments without duplicates are sliced from the memory-mapped arrays;
+        batches never span two segments.
+        """
+        seen = set()
+        for segment in self.segments():
+            rows = []
+            for i, key in enumerate(segment.keys.tolist()):
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(i)
+            if start >= len(rows):
+                start -= len(rows)
+                continue
+            contiguous = len(rows) == len(segment)
+            for lo in range(start, len(rows), batch_size):
+                hi = min(lo + batch_size, len(rows))
+                if contiguous:
+                    index = slice(lo, hi)
+                    meta = segment.meta[lo:hi]
+                else:
+                    index = np.array(rows[lo:hi])
+                    meta = [segment.meta[i] for i in rows[lo:hi]]
+                keys = [key.decode('ascii') for key in segment.keys[index]]
+                yield keys, segment.features[index], meta
+            start = 0
+
+    def load(self):
+        """
+        Return (keys, features, meta) for the whole store, one row per key.
+        A single-segment store is returned as its memory-mapped arrays.
+        """
+        segments = self.segments()
+        if not segments:
+            return [], np.zeros((0, 26), dtype=np.float32), []
+        if len(segments) == 1:
+            keys, features, meta = segments[0].keys, segments[0].features, segments[0].meta
+        else:
+            keys = np.concatenate([segment.keys for segment in segments])
+            features = np.concatenate([segment.features for segment in segments])
+            meta = [row for segment in segments for row in segment.meta]
+
+        # Concurrent writers may have stored the same clip twice; keep the first
+        _, first = np.unique(keys, return_index=True)
+        if len(first) < len(keys):
+            first.sort()
+            keys, features, meta = keys[first], features[first], [meta[i] for i in first]
+        return [key.decode('ascii') for key in keys], features, meta
+
+    def append(self, rows):
+        """
+        Write rows as a new segment; returns the number of rows written.
+        Each row is a dict with key, features, meta and optionally mfcc.
+        Keys already in the store (as far as this process knows) are skipped.
+        """
+        with self._lock:
+            if self._known is None:
+                self._known = self.keys()
+            unique = []
+            for row in rows:
+                if row['key'] not in self._known:
+                    self._known.add(row['key'])
+                    unique.append(row)
+        if len(unique) < len(rows):
+            FEATURE_STORE_ROWS.inc(len(rows) - len(unique), outcome='duplicate')
+        if not unique:
+            return 0
+
+        name = f"{SEGMENT_PREFIX}{time.time_ns():020d}-{os.getpid()}-{next(self._seq)}"
+        tmp = os.path.join(self.root, f".tmp-{name}")
+        os.makedirs(tmp)
+        try:
+            np.save(os.path.join(tmp, 'keys.npy'), np.array([row['key'] for row in unique], dtype=KEY_DTYPE))
+            np.save(os.path.join(tmp, 'features.npy'),
+                    np.stack([np.asarray(row['features'], dtype=np.float32).ravel() for row in unique]))
+            with open(os.path.join(tmp, 'meta.jsonl'), 'w') as f:
+                for row in unique:
+                    f.write(json.dumps(row.get('meta') or {}) + '\n')
+
+            if all(row.get('mfcc') is not None for row in unique):
+                matrices = [np.asarray(row['mfcc'], dtype=np.float32) for row in unique]
+                index = np.concatenate([[0], np.cumsum([m.shape[1] for m in matrices])]).astype(np.int64)
+                np.save(os.path.join(tmp, 'mfcc.npy'), np.concatenate(matrices, axis=1))
+                np.save(os.path.join(tmp, 'mfcc_index.npy'), index)
+
+            os.rename(tmp, os.path.join(self.root, name))
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        FEATURE_STORE_ROWS.inc(len(unique), outcome='written')
+        return len(unique)
+
+
+class FeatureStoreWriter:
+    """
+    Records features from request threads without blocking them.
+
+    submit() hashes the clip and enqueues its key, feature vector and meta;
+    the optional MFCC matrix and the disk writes happen on a background
+    thread, which appends a segment every ``segment_rows`` rows or
+    ``flush_interval`` seconds.  Only with ``store_mfcc`` does a pending row
+    keep its clip (about 350 KB for 4 s), and those clips are capped at
+    ``max_pending_bytes``.  When ``max_pending`` rows or the byte cap are
+    reached, new rows are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, store, processor, store_mfcc=False, segment_rows=1024, flush_interval=60.0,
+                 max_pending=10000, max_pending_bytes=64 * 1024 * 1024):
+        self.store = store
+        self.processor = processor
+        self.store_mfcc = store_mfcc
+        self.segment_rows = segment_rows
+        self.flush_interval = flush_interval
+        self.max_pending_bytes = max_pending_bytes
+
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='feature-store', daemon=True)
+        self._thread.start()
+
+    def submit(self, audio, features, meta=None):
+        """Queue one clip (at target_sr) and its feature vector; returns False if it was dropped."""
+        if self._closed:
+            return False
+        clip = self.processor.fit_length(np.asarray(audio, dtype=np.float32))
+        row = {'key': content_hash(clip), 'features': features, 'meta': meta or {}}
+
+        # A copy, so a trimmed view does not keep the whole decoded upload alive
+        clip = clip.copy() if self.store_mfcc else None
+        size = clip.nbytes if clip is not None else 0
+        with self._lock:
+            if self._pending_bytes + size > self.max_pending_bytes:
+                FEATURE_STORE_ROWS.inc(outcome='dropped')
+                return False
+            self._pending_bytes += size
+        try:
+            self._queue.put_nowait((row, clip))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._pending_bytes -= size
+            FEATURE_STORE_ROWS.inc(outcome='dropped')
+            return False
+
+    def close(self, timeout=None):
+        """Write the buffered rows and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _row(self, row, clip):
+        if clip is not None:
+            try:
+                row['mfcc'] = self.processor.batch_mfcc.mfcc(clip[np.newaxis])[0]
+            finally:
+                with self._lock:
+                    self._pending_bytes -= clip.nbytes
+        return row
+
+    def _run(self):
+        rows = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                item = None
+
+            if item is not None and item is not _STOP:
+                try:
+                    rows.append(self._row(*item))
+                except Exception as e:
+                    logger.warning("⚠️  Could not record features: %s", e)
+
+            if rows and (item is _STOP or len(rows) >= self.segment_rows or time.monotonic() >= deadline):
+                try:
+                    self.store.append(rows)
+                except Exception as e:
+                    logger.error("❌ Feature store write failed: %s", e)
+                    FEATURE_STORE_ROWS.inc(len(rows), outcome='error')
+                rows = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+            if item is _STOP:
+                return
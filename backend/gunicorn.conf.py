@@ -0,0 +1,62 @@
+"""
+Production server settings: gunicorn -c gunicorn.conf.py main:app
+
+Each worker is a separate process with its own model, scaler and ffmpeg
+pool, so feature extraction and inference scale across cores instead of
+contending for one GIL. The app is imported after fork (preload_app is off)
+because TensorFlow's thread pools do not survive fork(); main.py loads the
+model and runs a warm-up inference during that import, before the worker
+accepts requests.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+
+# One process per core; threads within a worker share its micro-batcher
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# Workers size their thread budgets to cores // WEB_CONCURRENCY (concurrency.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = False
+
+# Model load + warm-up can take a while on cold start
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # THREAD_TUNE=1: benchmark the featurize split once, here in the master
+    # before any worker exists. Tuning in every worker at once would run the
+    # benchmarks against each other and skew the result.
+    if os.environ.get('THREAD_TUNE', '0') != '1':
+        return
+    os.environ['THREAD_TUNE'] = '0'  # inherited by the workers
+
+    from concurrency import thread_budget, apply_thread_budget, load_tuned, tune, save_tuned
+    budget = thread_budget(processes=workers)
+    if load_tuned(budget.cores) is not None:
+        return
+    try:
+        apply_thread_budget(budget)
+        split, _ = tune(budget)
+    except Exception as e:
+        server.log.warning(f"⚠️  Thread tuning failed, workers keep the default budget: {e}")
+        return
+    if save_tuned(budget.cores, split):
+        server.log.info(f"✅ Tuned featurize split for {budget.cores}-core workers: {split}")
+
+
+def post_worker_init(worker):
+    worker.log.info(f"✅ Worker {worker.pid} ready")
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import tempfile
@@ -8,12 +8,54 @@ import traceback
 import logging
 import subprocess
 import struct
+import json
+import time
+import threading
+import atexit
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+# Thread budgets have to be in the environment before NumPy/TensorFlow load
+from concurrency import thread_budget, apply_thread_budget, tune, save_tuned, load_tuned, FeaturizePool
+THREAD_BUDGET = thread_budget()
+apply_thread_budget(THREAD_BUDGET)
+import numpy as np
+from decoding import decode_audio, DecodeError, BufferReader
+from probe import probe_file, MIN_CONFIDENCE
+from transcoder import init_transcoder, get_ffmpeg_info, TranscoderBusy
+from streaming import StreamSessionStore
+from devices import DeviceSessionStore
+from pipeline import UploadPipeline
+from cache import ResultCache
+from activity import ActivityGate
+from admission import AdmissionController, AdmissionRejected
+from featurestore import FeatureStore, FeatureStoreWriter
+from metrics import (REGISTRY, STAGE_SECONDS, CONVERSION_SECONDS, ERRORS, FALLBACKS, REQUESTS, IN_FLIGHT,
+                     PROCESS_START, STARTUP_PHASE_SECONDS, STARTUP_READY_SECONDS, mark_first_prediction)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class UploadBuffer(io.BytesIO):
+    """In-memory multipart file stream whose buffer is handed to the decoders."""
+
+    def close(self):
+        # A memoryview from getbuffer() may outlive the request; the data is
+        # freed once that view is gone
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+class InMemoryRequest(Request):
+    """Parse uploads into memory (bounded by MAX_CONTENT_LENGTH) instead of spooling to temp files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)
 
 # Configuration
@@ -22,23 +64,136 @@ UPLOAD_FOLDER = tempfile.gettempdir()
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Try to import audio processor
-try:
-    from audio_processor import AudioProcessor
-    AUDIO_PROCESSOR_AVAILABLE = True
-    logger.info("✅ Audio processor imported successfully")
-except ImportError as e:
-    logger.error(f"❌ Failed to import audio processor: {e}")
-    AUDIO_PROCESSOR_AVAILABLE = False
-    AudioProcessor = None
+# Process-pool workers started with spawn/forkserver re-import this file as
+# __mp_main__ when it is run directly; they must not load models or pools.
+POOL_WORKER = __name__ == '__mp_main__'
+
+# Micro-batching of concurrent predictions (batch size 1 disables it)
+INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 32))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_WAIT_MS', 10))
+
+# ffmpeg transcoder pool (resolved once at startup)
+TRANSCODER_WORKERS = int(os.environ.get('TRANSCODER_WORKERS', 4))
+TRANSCODER_QUEUE = int(os.environ.get('TRANSCODER_QUEUE', 16))
+if not POOL_WORKER:
+    init_transcoder(workers=TRANSCODER_WORKERS, max_queue=TRANSCODER_QUEUE)
+
+# Streaming detection sessions
+STREAM_HOP_SECONDS = float(os.environ.get('STREAM_HOP_SECONDS', 0.5))
+STREAM_SESSION_TTL = float(os.environ.get('STREAM_SESSION_TTL', 60))
+STREAM_CHUNK_BYTES = 8192
+stream_sessions = StreamSessionStore(ttl=STREAM_SESSION_TTL)
+
+# Per-device upload sessions: uploads with ?device_id= (or X-Device-Id) are
+# featurized as one stream per device and get a rolling danger score;
+# idle sessions expire and the least recently used are evicted beyond the caps
+DEVICE_SESSION_TTL = float(os.environ.get('DEVICE_SESSION_TTL', 300))
+DEVICE_SESSION_MAX = int(os.environ.get('DEVICE_SESSION_MAX', 10000))
+DEVICE_SESSION_MAX_MB = float(os.environ.get('DEVICE_SESSION_MAX_MB', 256))
+DEVICE_SESSION_HOP_SECONDS = float(os.environ.get('DEVICE_SESSION_HOP_SECONDS', 1.0))
+DEVICE_SESSION_EMA_ALPHA = float(os.environ.get('DEVICE_SESSION_EMA_ALPHA', 0.5))
+DEVICE_SESSION_TAIL_SECONDS = float(os.environ.get('DEVICE_SESSION_TAIL_SECONDS', 1.0))
+# An upload continues the device's stream only if it follows on from the last
+# one (by ?seq=, ?start= or arrival time) within this many seconds
+DEVICE_SESSION_MAX_GAP = float(os.environ.get('DEVICE_SESSION_MAX_GAP', 2.0))
+device_sessions = DeviceSessionStore(
+    ttl=DEVICE_SESSION_TTL,
+    max_sessions=DEVICE_SESSION_MAX,
+    max_bytes=int(DEVICE_SESSION_MAX_MB * 1024 * 1024),
+    hop_seconds=DEVICE_SESSION_HOP_SECONDS,
+    tail_seconds=DEVICE_SESSION_TAIL_SECONDS,
+    ema_alpha=DEVICE_SESSION_EMA_ALPHA,
+    max_gap=DEVICE_SESSION_MAX_GAP
+)
+REGISTRY.gauge('device_sessions', 'Open per-device upload sessions', function=lambda: len(device_sessions))
+REGISTRY.gauge('device_session_bytes', 'Audio state held by device sessions',
+               function=lambda: device_sessions.nbytes)
+
+# Result cache for repeated uploads (size 0 disables it)
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 600))
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL) if RESULT_CACHE_SIZE > 0 else None
+if result_cache is not None:
+    for _level in ('bytes', 'pcm'):
+        _lru = getattr(result_cache, f'by_{_level}')
+        REGISTRY.gauge(f'result_cache_{_level}_hits', f'Result cache hits ({_level} level)',
+                       function=lambda lru=_lru: lru.hits)
+        REGISTRY.gauge(f'result_cache_{_level}_misses', f'Result cache misses ({_level} level)',
+                       function=lambda lru=_lru: lru.misses)
+
+# Activity gate: near-silent clips skip feature extraction and inference
+ACTIVITY_GATE = os.environ.get('ACTIVITY_GATE', '1') == '1'
+ACTIVITY_THRESHOLD_DB = float(os.environ.get('ACTIVITY_THRESHOLD_DB', -55))
+ACTIVITY_MIN_RATIO = float(os.environ.get('ACTIVITY_MIN_RATIO', 0.05))
+ACTIVITY_MAX_FLATNESS = os.environ.get('ACTIVITY_MAX_FLATNESS')
+activity_gate = ActivityGate(
+    threshold_db=ACTIVITY_THRESHOLD_DB,
+    min_active_ratio=ACTIVITY_MIN_RATIO,
+    max_flatness=float(ACTIVITY_MAX_FLATNESS) if ACTIVITY_MAX_FLATNESS else None
+) if ACTIVITY_GATE else None
+
+# Full-length analysis (/upload with mode=full)
+FULL_CLIP_MAX_SECONDS = float(os.environ.get('FULL_CLIP_MAX_SECONDS', 600))
+FULL_CLIP_HOP_SECONDS = float(os.environ.get('FULL_CLIP_HOP_SECONDS', 1.0))
+
+# Multi-file /upload/batch
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 64))
+BATCH_DECODE_WORKERS = int(os.environ.get('BATCH_DECODE_WORKERS', 4))
+BATCH_MAX_ARCHIVE_BYTES = 64 * 1024 * 1024  # uncompressed size limit for zip uploads
+batch_decode_pool = None if POOL_WORKER else ThreadPoolExecutor(BATCH_DECODE_WORKERS, thread_name_prefix='batch-decode')
+
+# Admission control for /upload and /upload/batch: at most ADMISSION_MAX_ACTIVE
+# analyses run at once, ADMISSION_MAX_QUEUE more wait (emergency first) for up
+# to ADMISSION_MAX_WAIT seconds, the rest get 503 + Retry-After (0 disables)
+ADMISSION_MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', 8))
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', 32))
+ADMISSION_MAX_WAIT = float(os.environ.get('ADMISSION_MAX_WAIT', 5))
+admission = AdmissionController(
+    max_active=ADMISSION_MAX_ACTIVE,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait=ADMISSION_MAX_WAIT
+) if ADMISSION_MAX_ACTIVE > 0 else None
+if admission is not None:
+    REGISTRY.gauge('admission_active', 'Analysis requests holding an admission slot',
+                   function=lambda: admission.active)
+    REGISTRY.gauge('admission_waiting', 'Analysis requests queued for an admission slot',
+                   function=lambda: admission.waiting)
+
+# Feature store: features of analyzed uploads are recorded off the request
+# path for retraining and re-scoring (unset FEATURE_STORE_DIR disables it)
+FEATURE_STORE_DIR = os.environ.get('FEATURE_STORE_DIR')
+FEATURE_STORE_MFCC = os.environ.get('FEATURE_STORE_MFCC', '0') == '1'
+FEATURE_STORE_SEGMENT_ROWS = int(os.environ.get('FEATURE_STORE_SEGMENT_ROWS', 1024))
+FEATURE_STORE_FLUSH_SECONDS = float(os.environ.get('FEATURE_STORE_FLUSH_SECONDS', 60))
+FEATURE_STORE_PENDING_MB = int(os.environ.get('FEATURE_STORE_PENDING_MB', 64))
+feature_writer = None
+
+# Staged asyncio upload pipeline (UPLOAD_PIPELINE=async), otherwise serial
+UPLOAD_PIPELINE = os.environ.get('UPLOAD_PIPELINE', 'serial')
+PIPELINE_RECEIVE_LIMIT = int(os.environ.get('PIPELINE_RECEIVE_LIMIT', 64))
+PIPELINE_DECODE_WORKERS = int(os.environ.get('PIPELINE_DECODE_WORKERS', 4))
+PIPELINE_FEATURIZE_WORKERS = int(os.environ.get('PIPELINE_FEATURIZE_WORKERS', 2))
+PIPELINE_INFER_LIMIT = int(os.environ.get('PIPELINE_INFER_LIMIT', 64))
 
 # Initialize model paths
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'modals')
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 # Look for model files
+# MODEL_RUNTIME=auto serves the NumPy export (no TensorFlow) when it exists,
+# MODEL_RUNTIME=keras always loads the .h5. The export follows the .h5: a
+# newer .h5 (a retrained model) is re-exported at startup and on hot reload
+MODEL_RUNTIME = os.environ.get('MODEL_RUNTIME', 'auto')
 MODEL_PATH = os.path.join(MODEL_DIR, 'audio_danger_detection_cnn.h5')
+NUMPY_MODEL_PATH = os.path.join(MODEL_DIR, 'audio_danger_detection_cnn.npz')
 SCALER_PATH = os.path.join(MODEL_DIR, 'feature_scaler.pkl')
+MODEL_SOURCE_PATH = None
+
+if MODEL_RUNTIME in ('auto', 'numpy') and os.path.exists(NUMPY_MODEL_PATH):
+    MODEL_SOURCE_PATH = MODEL_PATH if os.path.exists(MODEL_PATH) else None
+    MODEL_PATH = NUMPY_MODEL_PATH
+elif MODEL_RUNTIME == 'numpy':
+    logger.warning(f"⚠️  NumPy model not found: {NUMPY_MODEL_PATH}, run export_model.py")
 
 # Check if files exist
 if not os.path.exists(MODEL_PATH):
@@ -49,48 +204,204 @@ if not os.path.exists(SCALER_PATH):
     logger.warning(f"⚠️  Scaler file not found: {SCALER_PATH}")
     SCALER_PATH = None
 
+# Model registry: hot reload and A/B routing
+# MODEL_RELOAD_INTERVAL polls the model files and swaps in a changed model
+# without a restart (0 disables). CANDIDATE_MODEL_PATH loads a second model
+# (relative to modals/) that serves CANDIDATE_SHARE of the requests; with
+# SHADOW_SCORING=1 it also scores the other requests in the background.
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+CANDIDATE_MODEL_PATH = os.environ.get('CANDIDATE_MODEL_PATH')
+CANDIDATE_SCALER_PATH = os.environ.get('CANDIDATE_SCALER_PATH', SCALER_PATH)
+CANDIDATE_SHARE = float(os.environ.get('CANDIDATE_SHARE', 0))
+SHADOW_SCORING = os.environ.get('SHADOW_SCORING', '0') == '1'
+
+# Confidence cascade: CASCADE_MODEL_PATH (relative to modals/, e.g. a
+# scaler + random forest .pkl) scores every clip first, and only clips whose
+# danger probability falls inside CASCADE_BAND ("low,high") go on to the CNN
+CASCADE_MODEL_PATH = os.environ.get('CASCADE_MODEL_PATH')
+CASCADE_SCALER_PATH = os.environ.get('CASCADE_SCALER_PATH', SCALER_PATH)
+CASCADE_BAND = tuple(float(x) for x in os.environ.get('CASCADE_BAND', '0.2,0.8').split(','))
+
+# THREAD_TUNE=1 benchmarks featurize splits on first start and caches the
+# fastest (see concurrency.py); the THREADS_* variables pin the budget by hand.
+# Under gunicorn the master tunes once before forking (gunicorn.conf.py) and
+# clears THREAD_TUNE, so workers never benchmark against each other
+THREAD_TUNE = os.environ.get('THREAD_TUNE', '0') == '1'
+# Batches smaller than this are featurized in the request thread, not the
+# featurize pool, whose IPC round-trip costs more than one clip's MFCC
+FEATURIZE_POOL_MIN_CLIPS = int(os.environ.get('FEATURIZE_POOL_MIN_CLIPS', 8))
+
 # Initialize audio processor
+# STARTUP_MODE=lazy serves / and the health checks right away and imports
+# the audio stack and loads the model in a background thread; eager (the
+# default) does it during import, before the first request is accepted.
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+# librosa's numba kernels are compiled on first use; caching them on disk
+# lets later starts load the compiled code instead of recompiling it
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(os.path.dirname(__file__), '.numba_cache'))
 processor = None
-if AUDIO_PROCESSOR_AVAILABLE and MODEL_PATH and os.path.exists(MODEL_PATH):
+upload_pipeline = None
+model_ready = threading.Event()
+
+def load_processor():
+    """Import the audio stack, load and warm up the model, then mark the server ready."""
+    global processor, upload_pipeline, feature_writer
     try:
-        processor = AudioProcessor(MODEL_PATH, SCALER_PATH)
-        logger.info(f"✅ Audio Processor initialized successfully")
-    except Exception as e:
-        logger.error(f"❌ Failed to initialize audio processor: {e}")
-        processor = None
+        start = time.perf_counter()
+        try:
+            from audio_processor import AudioProcessor
+            logger.info("✅ Audio processor imported successfully")
+        except ImportError as e:
+            logger.error(f"❌ Failed to import audio processor: {e}")
+            return
+        STARTUP_PHASE_SECONDS.set(time.perf_counter() - start, phase='import')
+        
+        if not MODEL_PATH:
+            return
+        
+        budget = THREAD_BUDGET
+        if THREAD_TUNE and load_tuned(budget.cores) is None:
+            try:
+                start = time.perf_counter()
+                split, _ = tune(budget)
+                save_tuned(budget.cores, split)
+                budget = budget._replace(**split)
+                STARTUP_PHASE_SECONDS.set(time.perf_counter() - start, phase='tune')
+            except Exception as e:
+                logger.warning(f"⚠️  Thread tuning failed, keeping the default budget: {e}")
+        logger.info(f"🧵 Thread budget: {budget._asdict()}")
+        
+        try:
+            start = time.perf_counter()
+            featurizer = None
+            if budget.featurize_workers > 0:
+                featurizer = FeaturizePool(budget.featurize_workers, threads=budget.featurize_threads)
+            loaded = AudioProcessor(
+                MODEL_PATH,
+                SCALER_PATH,
+                max_batch_size=INFERENCE_BATCH_SIZE,
+                max_batch_wait_ms=INFERENCE_BATCH_WAIT_MS,
+                activity_gate=activity_gate,
+                featurizer=featurizer,
+                featurizer_min_clips=FEATURIZE_POOL_MIN_CLIPS,
+                fft_workers=budget.fft,
+                source_path=MODEL_SOURCE_PATH
+            )
+            STARTUP_PHASE_SECONDS.set(time.perf_counter() - start, phase='model_load')
+            logger.info(f"✅ Audio Processor initialized successfully")
+            
+            if os.environ.get('MODEL_WARMUP', '1') == '1':
+                start = time.perf_counter()
+                loaded.warmup()
+                STARTUP_PHASE_SECONDS.set(time.perf_counter() - start, phase='warmup')
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize audio processor: {e}")
+            return
+        
+        if CASCADE_MODEL_PATH:
+            try:
+                fast = loaded.models.load(
+                    'fast',
+                    os.path.join(MODEL_DIR, CASCADE_MODEL_PATH),
+                    os.path.join(MODEL_DIR, CASCADE_SCALER_PATH) if CASCADE_SCALER_PATH else None
+                )
+                loaded.models.add_cascade('cascade', 'fast', 'primary', CASCADE_BAND)
+                loaded.models.configure(primary='cascade')
+                logger.info(f"✅ Cascade: {fast.model_type} model {fast.version} first, "
+                            f"CNN for danger probability in [{CASCADE_BAND[0]}, {CASCADE_BAND[1]}]")
+            except Exception as e:
+                logger.error(f"❌ Failed to set up the model cascade: {e}")
+        
+        if CANDIDATE_MODEL_PATH:
+            try:
+                candidate = loaded.models.load(
+                    'candidate',
+                    os.path.join(MODEL_DIR, CANDIDATE_MODEL_PATH),
+                    os.path.join(MODEL_DIR, CANDIDATE_SCALER_PATH) if CANDIDATE_SCALER_PATH else None
+                )
+                loaded.models.configure(candidate='candidate', candidate_share=CANDIDATE_SHARE, shadow=SHADOW_SCORING)
+                logger.info(f"✅ Candidate model {candidate.version} ({candidate.model_type}): "
+                            f"{CANDIDATE_SHARE:.0%} of traffic, shadow {'on' if SHADOW_SCORING else 'off'}")
+            except Exception as e:
+                logger.error(f"❌ Failed to load candidate model: {e}")
+        
+        # Results cached from a replaced model version are stale
+        if result_cache is not None:
+            loaded.models.on_swap(lambda name, model: result_cache.clear())
+        loaded.models.watch(MODEL_RELOAD_INTERVAL)
+        
+        if UPLOAD_PIPELINE == 'async':
+            upload_pipeline = UploadPipeline(
+                loaded,
+                receive_limit=PIPELINE_RECEIVE_LIMIT,
+                decode_workers=PIPELINE_DECODE_WORKERS,
+                featurize_workers=PIPELINE_FEATURIZE_WORKERS,
+                infer_limit=PIPELINE_INFER_LIMIT,
+                result_cache=result_cache,
+                featurizer=loaded.featurizer
+            )
+            logger.info("✅ Async upload pipeline enabled")
+        
+        if FEATURE_STORE_DIR:
+            feature_writer = FeatureStoreWriter(
+                FeatureStore(FEATURE_STORE_DIR),
+                loaded,
+                store_mfcc=FEATURE_STORE_MFCC,
+                segment_rows=FEATURE_STORE_SEGMENT_ROWS,
+                flush_interval=FEATURE_STORE_FLUSH_SECONDS,
+                max_pending_bytes=FEATURE_STORE_PENDING_MB * 1024 * 1024
+            )
+            atexit.register(feature_writer.close)
+            logger.info(f"✅ Recording features to {FEATURE_STORE_DIR}")
+        
+        processor = loaded
+        STARTUP_READY_SECONDS.set(time.time() - PROCESS_START)
+        logger.info(f"🚀 Ready {time.time() - PROCESS_START:.2f}s after process start")
+    finally:
+        model_ready.set()
+
+if not POOL_WORKER:
+    if STARTUP_MODE == 'lazy':
+        threading.Thread(target=load_processor, name='model-loader', daemon=True).start()
+    else:
+        load_processor()
+
+def feature_sink(**meta):
+    """Callback recording a clip's features in the feature store, or None when it is disabled."""
+    if feature_writer is None:
+        return None
+    meta['received_at'] = time.time()
+    return lambda audio, features: feature_writer.submit(audio, features, meta)
+
+def processor_unavailable():
+    """Error response for requests that need the model: 503 while it loads, 500 if loading failed."""
+    if not model_ready.is_set():
+        return jsonify({
+            'status': 'error',
+            'message': 'Model is loading, please retry'
+        }), 503, {'Retry-After': '2'}
+    return jsonify({
+        'status': 'error',
+        'message': 'Audio processor not available.'
+    }), 500
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def upload_buffer(file):
+    """Zero-copy view of an uploaded file's bytes."""
+    if isinstance(file.stream, io.BytesIO):
+        return file.stream.getbuffer()
+    return file.read()
+
 def detect_audio_format(file_path):
-    """Detect audio format by reading file header."""
+    """Detect audio format from the file's headers ('pcm' for headerless PCM)."""
     try:
-        with open(file_path, 'rb') as f:
-            header = f.read(100)
-        
-        # Check common signatures
-        if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
-            return 'wav'
-        elif header[:3] == b'ID3':
-            return 'mp3'
-        elif header[:4] == b'OggS':
-            return 'ogg'
-        elif header[:4] == b'fLaC':
-            return 'flac'
-        elif b'ftyp3gp' in header[:20]:
-            return '3gp'
-        elif b'ftypmp4' in header[:20] or b'ftypM4A' in header[:20]:
-            return 'mp4'
-        elif header[:6] == b'#!AMR\n':
-            return 'amr'
-        elif header[:11] == b'#!AMR-WB\n':
-            return 'amr-wb'
-        else:
-            return 'unknown'
+        return probe_file(file_path).format
     except:
         return 'unknown'
 
-def create_wav_header(data_length, sample_rate=44100, channels=1, bits_per_sample=16):
+def create_wav_header(data_length, sample_rate=44100, channels=1, bits_per_sample=16, audio_format=1):
     """Create a proper WAV header."""
     byte_rate = sample_rate * channels * bits_per_sample // 8
     block_align = channels * bits_per_sample // 8
@@ -101,7 +412,7 @@ def create_wav_header(data_length, sample_rate=44100, channels=1, bits_per_sampl
     header += b'WAVE'
     header += b'fmt '
     header += struct.pack('<I', 16)  # Subchunk1 size
-    header += struct.pack('<H', 1)   # Audio format (1 = PCM)
+    header += struct.pack('<H', audio_format)   # Audio format (1 = PCM, 3 = float)
     header += struct.pack('<H', channels)
     header += struct.pack('<I', sample_rate)
     header += struct.pack('<I', byte_rate)
@@ -117,29 +428,12 @@ def convert_to_wav(input_path, output_path):
     Convert any audio file to standard WAV format.
     Uses multiple methods for robustness.
     """
+    start = time.perf_counter()
     try:
         # Method 1: Try ffmpeg (most reliable)
         try:
-            # Try to find ffmpeg
-            ffmpeg_path = None
-            possible_paths = [
-                'ffmpeg',
-                'ffmpeg.exe',
-                os.path.join(os.path.dirname(__file__), 'ffmpeg', 'bin', 'ffmpeg.exe'),
-                os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-            ]
-            
-            for path in possible_paths:
-                try:
-                    result = subprocess.run([path, '-version'], 
-                                          capture_output=True, 
-                                          text=True,
-                                          timeout=2)
-                    if result.returncode == 0:
-                        ffmpeg_path = path
-                        break
-                except:
-                    continue
+            ffmpeg_info = get_ffmpeg_info()
+            ffmpeg_path = ffmpeg_info.path if ffmpeg_info else None
             
             if ffmpeg_path:
                 cmd = [
@@ -160,9 +454,11 @@ def convert_to_wav(input_path, output_path):
                 
                 if result.returncode == 0 and os.path.exists(output_path):
                     logger.info("✅ FFmpeg conversion successful")
+                    CONVERSION_SECONDS.observe(time.perf_counter() - start, method='ffmpeg_cli')
                     return True
         except Exception as e:
             logger.warning(f"⚠️  FFmpeg conversion failed: {e}")
+        FALLBACKS.inc(step='convert', method='pydub')
         
         # Method 2: Try pydub
         try:
@@ -174,59 +470,80 @@ def convert_to_wav(input_path, output_path):
             
             if os.path.exists(output_path):
                 logger.info("✅ Pydub conversion successful")
+                CONVERSION_SECONDS.observe(time.perf_counter() - start, method='pydub')
                 return True
         except Exception as e:
             logger.warning(f"⚠️  Pydub conversion failed: {e}")
+        FALLBACKS.inc(step='convert', method='raw')
         
-        # Method 3: Raw file repair (for corrupted Android WAV files)
+        # Method 3: Raw PCM repair (headerless or corrupted Android WAV files)
         try:
-            with open(input_path, 'rb') as f:
-                raw_data = f.read()
-            
-            file_size = len(raw_data)
+            # Layout and rate come from whatever header survived, else are
+            # estimated from a prefix; the samples are streamed, not buffered
+            info = probe_file(input_path)
+            if info.pcm is None or info.confidence < MIN_CONFIDENCE:
+                logger.error(f"❌ Not raw PCM ({info.format}), cannot repair")
+                ERRORS.inc(stage='convert')
+                return False
+            pcm = info.pcm
             
-            # Check if it might be raw PCM data
-            # Common Android PCM: 16-bit, mono, 44.1kHz or 8kHz
-            
-            # Try common sample rates
-            sample_rates_to_try = [44100, 22050, 16000, 8000]
-            
-            for sample_rate in sample_rates_to_try:
-                # Calculate expected size for 4 seconds of audio
-                expected_size = sample_rate * 2 * 4  # 4 seconds, 16-bit = 2 bytes per sample
-                
-                if file_size >= expected_size:
-                    # Take first 4 seconds
-                    audio_data = raw_data[:expected_size]
-                    
-                    # Create WAV header
-                    header = create_wav_header(len(audio_data), sample_rate, 1, 16)
-                    
-                    with open(output_path, 'wb') as f:
-                        f.write(header)
-                        f.write(audio_data)
-                    
-                    if os.path.exists(output_path):
-                        logger.info(f"✅ Raw PCM conversion with {sample_rate}Hz successful")
-                        return True
-            
-            # If none worked, just wrap in WAV header as last resort
-            header = create_wav_header(file_size, 44100, 1, 16)
-            with open(output_path, 'wb') as f:
-                f.write(header)
-                f.write(raw_data)
+            with open(input_path, 'rb') as src, open(output_path, 'wb') as f:
+                f.write(create_wav_header(pcm.data_size, pcm.sample_rate, pcm.channels, pcm.bits, pcm.format_tag))
+                src.seek(pcm.data_offset)
+                remaining = pcm.data_size
+                while remaining > 0:
+                    chunk = src.read(min(remaining, 1 << 20))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
             
-            logger.info("✅ Raw data wrapped in WAV header")
+            logger.info(f"✅ Raw PCM wrapped as {info.codec}, {pcm.channels} ch, {pcm.sample_rate}Hz "
+                        f"(confidence {info.confidence:.2f})")
+            CONVERSION_SECONDS.observe(time.perf_counter() - start, method='raw')
             return True
             
         except Exception as e:
             logger.error(f"❌ Raw conversion failed: {e}")
+            ERRORS.inc(stage='convert')
             return False
             
     except Exception as e:
         logger.error(f"❌ Conversion failed: {e}")
+        ERRORS.inc(stage='convert')
         return False
 
+def build_upload_response(filename, result, cached=False):
+    """Build the /upload success payload from a processor result."""
+    mark_first_prediction()
+    response = {
+        'status': 'success',
+        'filename': filename,
+        'converted': True,
+        'cached': cached,
+        'analysis': {
+            'prediction': result.get('prediction', -1),
+            'is_danger': result.get('is_danger', 0),
+            'confidence': float(result.get('confidence', 0.0)),
+            'class_label': result.get('class_label', 'UNKNOWN'),
+            'danger_probability': float(result.get('danger_probability', 0.0)),
+            'safe_probability': float(result.get('safe_probability', 0.0)),
+            'gated': result.get('gated', False)
+        }
+    }
+    if 'model' in result:
+        response['analysis'].update({'model': result['model'], 'model_version': result['model_version']})
+    if 'stage' in result:
+        response['analysis']['stage'] = result['stage']
+    if 'session' in result:
+        response['analysis'].update({key: result[key] for key in ('window_end', 'windows_scored') if key in result})
+        response['session'] = result['session']
+    if result.get('mode') == 'full':
+        response['analysis'].update({
+            key: result[key] for key in ('mode', 'duration', 'windows', 'peak_time', 'mean_danger_probability', 'timeline')
+        })
+    return response
+
 @app.route('/')
 def home():
     """Home endpoint"""
@@ -236,28 +553,90 @@ def home():
         'version': '2.1.0',
         'feature': 'Forced WAV conversion for Android audio',
         'processor_loaded': processor is not None,
+        'ffmpeg': get_ffmpeg_info().to_dict() if get_ffmpeg_info() else None,
         'supported_formats': list(ALLOWED_EXTENSIONS)
     })
 
+@app.route('/health')
+def health():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    """Readiness: 200 once the model is loaded, 503 while loading or if loading failed"""
+    if processor is None:
+        return jsonify({
+            'status': 'loading' if not model_ready.is_set() else 'unavailable'
+        }), 503
+    return jsonify({'status': 'ready'})
+
+@app.route('/models')
+def models():
+    """Loaded model versions and the current routing"""
+    if processor is None:
+        return processor_unavailable()
+    return jsonify(processor.models.describe())
+
 @app.route('/upload', methods=['POST'])
 def upload_audio():
     """
     Upload and analyze audio file.
-    ALWAYS converts to WAV first.
+    Decodes in memory, falling back to WAV conversion on disk.
     """
-    if processor is None:
+    with IN_FLIGHT.track_inprogress():
+        response = app.make_response(run_admitted(_analyze_upload, 'normal'))
+    REQUESTS.inc(status=response.status_code)
+    return response
+
+def receive_body():
+    """
+    Read and parse the request body.
+    Werkzeug does it on the first access to the form data; with the upload
+    pipeline on, a receive slot caps how many bodies are read at once.
+    """
+    with STAGE_SECONDS.time(stage='upload_save'):
+        if upload_pipeline is not None:
+            with upload_pipeline.receiving():
+                return request.files
+        return request.files
+
+def run_admitted(handler, default_priority):
+    """
+    Run a request handler under admission control.
+    The priority comes from ?priority= or the X-Priority header (emergency,
+    normal, background).  The body is read before a slot is taken, so a
+    slow client uploading over a mobile link does not hold one; the slot
+    covers only decoding, featurizing and inference.
+    """
+    receive_body()
+    if admission is None:
+        return handler()
+    
+    priority = request.args.get('priority') or request.headers.get('X-Priority', default_priority)
+    try:
+        with admission.admit(priority):
+            return app.make_response(handler())
+    except AdmissionRejected as e:
+        logger.warning(f"⚠️  Shedding {priority} request: {e.reason}")
         return jsonify({
             'status': 'error',
-            'message': 'Audio processor not available.'
-        }), 500
+            'message': e.reason
+        }), 503, {'Retry-After': str(e.retry_after)}
+
+def _analyze_upload():
+    if processor is None:
+        return processor_unavailable()
     
-    if 'file' not in request.files:
+    # Already read by receive_body()
+    files = request.files
+    if 'file' not in files:
         return jsonify({
             'status': 'error',
             'message': 'No file provided.'
         }), 400
     
-    file = request.files['file']
+    file = files['file']
     if file.filename == '':
         return jsonify({
             'status': 'error',
@@ -265,43 +644,130 @@ def upload_audio():
         }), 400
     
     filename = secure_filename(file.filename)
-    temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    temp_path = None
     converted_path = None
     
-    logger.info(f"📥 Receiving file: {filename}")
+    # mode=full scores the whole recording in overlapping windows
+    full_clip = request.values.get('mode', 'clip') == 'full'
+    variant = None
+    if full_clip:
+        try:
+            hop_seconds = float(request.values.get('hop', FULL_CLIP_HOP_SECONDS))
+        except ValueError:
+            hop_seconds = 0
+        if not 0 < hop_seconds <= processor.duration:
+            return jsonify({
+                'status': 'error',
+                'message': f'hop must be between 0 and {processor.duration} seconds'
+            }), 400
+        variant = f'full:{hop_seconds}'
     
-    try:
-        # Save uploaded file
-        file.save(temp_path)
-        original_size = os.path.getsize(temp_path)
-        logger.info(f"✅ File saved: {original_size} bytes")
-        
-        if original_size == 0:
+    # Uploads that name a device are scored in the context of its earlier ones
+    device_id = None if full_clip else request.values.get('device_id') or request.headers.get('X-Device-Id')
+    if device_id and len(device_id) > 128:
+        return jsonify({
+            'status': 'error',
+            'message': 'device_id must be at most 128 characters'
+        }), 400
+    # Optional upload counter / recording start time, to tell contiguous clips from gaps
+    seq = start = None
+    if device_id:
+        seq = request.values.get('seq') or request.headers.get('X-Device-Seq')
+        start = request.values.get('start') or request.headers.get('X-Device-Start')
+        try:
+            seq = int(seq) if seq is not None else None
+            start = float(start) if start is not None else None
+        except ValueError:
             return jsonify({
                 'status': 'error',
-                'message': 'Empty file'
+                'message': 'seq must be an integer and start a time in seconds'
             }), 400
+    
+    logger.info(f"📥 Receiving file: {filename}")
+    
+    try:
+        # Already read into an in-memory UploadBuffer with the form (at most MAX_CONTENT_LENGTH, 16 MB)
+        data = upload_buffer(file)
+        logger.info(f"✅ File received: {len(data)} bytes")
         
-        # ALWAYS convert to WAV
-        converted_path = os.path.join(
-            os.path.dirname(temp_path),
-            f"converted_{os.path.splitext(filename)[0]}.wav"
-        )
-        
-        logger.info(f"🔄 Converting to WAV...")
-        
-        if not convert_to_wav(temp_path, converted_path):
+        if len(data) == 0:
             return jsonify({
                 'status': 'error',
-                'message': 'Failed to convert audio to WAV format'
+                'message': 'Empty file'
             }), 400
         
-        converted_size = os.path.getsize(converted_path)
-        logger.info(f"✅ Conversion successful: {converted_size} bytes")
+        # Same bytes uploaded again (client retries)
+        bytes_key = pcm_key = None
+        cached = False
+        if result_cache is not None and not device_id:
+            bytes_key, result = result_cache.lookup_bytes(data, variant)
+            if result is not None:
+                logger.info("⚡ Result cache hit (upload bytes)")
+                return jsonify(build_upload_response(filename, result, cached=True))
         
-        # Analyze the audio
-        logger.info("🤖 Analyzing audio...")
-        result = processor.predict_danger(converted_path)
+        # Decode straight to PCM in memory
+        try:
+            if upload_pipeline is not None and not full_clip and not device_id:
+                result, method, cached = upload_pipeline.run(
+                    data, feature_sink=feature_sink(filename=filename, source='upload', bytes=len(data)))
+                logger.info(f"✅ Decoded with {method} and analyzed in pipeline")
+            else:
+                max_duration = FULL_CLIP_MAX_SECONDS if full_clip or device_id else processor.duration
+                audio, method = decode_audio(data, processor.target_sr, max_duration=max_duration)
+                logger.info(f"✅ Decoded with {method}: {len(audio)} samples")
+                
+                # Same audio in a different container
+                result = None
+                if result_cache is not None and not device_id:
+                    pcm_key, result = result_cache.lookup_pcm(audio, variant)
+                    cached = result is not None
+                
+                if result is None and full_clip:
+                    logger.info("🤖 Analyzing full recording...")
+                    result = processor.predict_full_clip(audio, processor.target_sr, hop_seconds)
+                elif result is None and device_id:
+                    logger.info(f"🤖 Analyzing audio in device session {device_id}...")
+                    result = device_sessions.push(device_id, processor, audio, seq=seq, start=start)
+                elif result is None:
+                    logger.info("🤖 Analyzing audio...")
+                    result = processor.predict_danger_from_audio(
+                        audio, processor.target_sr,
+                        feature_sink=feature_sink(filename=filename, source='upload', decoder=method, bytes=len(data)))
+                else:
+                    logger.info("⚡ Result cache hit (decoded audio)")
+            
+        except DecodeError as e:
+            # Fall back to the file-based WAV conversion
+            logger.warning(f"⚠️  In-memory decoding failed ({e}), converting to WAV...")
+            FALLBACKS.inc(step='decode', method='convert_to_wav')
+            
+            # Unique names so concurrent uploads of the same filename cannot collide
+            fd, temp_path = tempfile.mkstemp(suffix=f"_{filename}", dir=app.config['UPLOAD_FOLDER'])
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            
+            fd, converted_path = tempfile.mkstemp(suffix='_converted.wav', dir=app.config['UPLOAD_FOLDER'])
+            os.close(fd)
+            
+            if not convert_to_wav(temp_path, converted_path):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Failed to convert audio to WAV format'
+                }), 400
+            
+            converted_size = os.path.getsize(converted_path)
+            logger.info(f"✅ Conversion successful: {converted_size} bytes")
+            
+            logger.info("🤖 Analyzing audio...")
+            if full_clip or device_id:
+                import librosa
+                audio, sr = librosa.load(converted_path, sr=processor.target_sr, duration=FULL_CLIP_MAX_SECONDS)
+                if full_clip:
+                    result = processor.predict_full_clip(audio, sr, hop_seconds)
+                else:
+                    result = device_sessions.push(device_id, processor, audio, seq=seq, start=start)
+            else:
+                result = processor.predict_danger(converted_path)
         
         if result is None or result.get('status') == 'error':
             return jsonify({
@@ -309,26 +775,25 @@ def upload_audio():
                 'message': result.get('message', 'Analysis failed') if result else 'Unknown error'
             }), 500
         
-        # Prepare response
-        response = {
-            'status': 'success',
-            'filename': filename,
-            'converted': True,
-            'analysis': {
-                'prediction': result.get('prediction', -1),
-                'is_danger': result.get('is_danger', 0),
-                'confidence': float(result.get('confidence', 0.0)),
-                'class_label': result.get('class_label', 'UNKNOWN'),
-                'danger_probability': float(result.get('danger_probability', 0.0)),
-                'safe_probability': float(result.get('safe_probability', 0.0))
-            }
-        }
+        if result_cache is not None:
+            result_cache.store(result, bytes_key=bytes_key, pcm_key=pcm_key)
+        
+        response = build_upload_response(filename, result, cached=cached)
         
         logger.info(f"✅ Analysis complete: {response['analysis']['class_label']}")
         return jsonify(response)
         
+    except TranscoderBusy as e:
+        logger.warning("⚠️  Transcoder queue full, rejecting upload")
+        ERRORS.inc(stage='transcoder_busy')
+        return jsonify({
+            'status': 'error',
+            'message': 'Server busy, please retry'
+        }), 503, {'Retry-After': str(e.retry_after)}
+        
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
+        ERRORS.inc(stage='upload')
         return jsonify({
             'status': 'error',
             'message': f'Processing error: {str(e)}'
@@ -337,13 +802,304 @@ def upload_audio():
     finally:
         # Cleanup
         try:
-            if os.path.exists(temp_path):
+            if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
             if converted_path and os.path.exists(converted_path):
                 os.remove(converted_path)
         except:
             pass
 
+def read_batch_items():
+    """
+    Collect (filename, bytes) pairs from a /upload/batch request.
+
+    Accepts any number of `file`/`files` fields, and zip archives (by
+    extension or content) whose audio members are expanded in order.
+    """
+    items = []
+    for file in request.files.getlist('file') + request.files.getlist('files'):
+        if not file.filename:
+            continue
+        data = upload_buffer(file)
+        if file.filename.lower().endswith('.zip') or data[:4] == b'PK\x03\x04':
+            with zipfile.ZipFile(BufferReader(data)) as archive:
+                members = [m for m in archive.infolist() if not m.is_dir() and allowed_file(m.filename)]
+                if sum(m.file_size for m in members) > BATCH_MAX_ARCHIVE_BYTES:
+                    raise ValueError('Archive too large when extracted')
+                for member in members[:BATCH_MAX_FILES + 1]:
+                    items.append((secure_filename(os.path.basename(member.filename)), archive.read(member)))
+        else:
+            items.append((secure_filename(file.filename), data))
+        if len(items) > BATCH_MAX_FILES:
+            raise ValueError(f'Too many files (max {BATCH_MAX_FILES})')
+    return items
+
+def decode_batch_item(filename, data):
+    """
+    Decode one batch item for the thread pool.
+    Returns ('audio', samples), ('features', vector) after a WAV conversion
+    fallback, or ('error', message).
+    """
+    if not data:
+        return 'error', 'Empty file'
+    try:
+        audio, method = decode_audio(data, processor.target_sr, max_duration=processor.duration)
+        return 'audio', processor.fit_length(audio)
+    except TranscoderBusy:
+        ERRORS.inc(stage='transcoder_busy')
+        return 'error', 'Server busy, please retry'
+    except DecodeError as e:
+        logger.warning(f"⚠️  In-memory decoding of {filename} failed ({e}), converting to WAV...")
+        FALLBACKS.inc(step='decode', method='convert_to_wav')
+
+    # Unique names: several items of one batch may share a filename
+    fd, temp_path = tempfile.mkstemp(suffix=f"_{filename}", dir=app.config['UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    fd, converted_path = tempfile.mkstemp(suffix='_converted.wav', dir=app.config['UPLOAD_FOLDER'])
+    os.close(fd)
+    try:
+        if not convert_to_wav(temp_path, converted_path):
+            return 'error', 'Failed to convert audio to WAV format'
+        features, success = processor.extract_features(converted_path)
+        if not success:
+            return 'error', 'Feature extraction failed'
+        return 'features', features
+    finally:
+        for path in (temp_path, converted_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Analyze many audio files in one request.
+    Files are decoded in parallel and scored with a single model call;
+    results come back in upload order with per-item errors.
+    Offline backlogs are admitted at background priority by default.
+    """
+    return run_admitted(_analyze_batch, 'background')
+
+def _analyze_batch():
+    if processor is None:
+        return processor_unavailable()
+    
+    try:
+        items = read_batch_items()
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    
+    if not items:
+        return jsonify({
+            'status': 'error',
+            'message': 'No files provided.'
+        }), 400
+    
+    logger.info(f"📥 Receiving batch of {len(items)} files")
+    results = [None] * len(items)
+    
+    # Cached uploads skip decoding entirely
+    bytes_keys = [None] * len(items)
+    pending = []
+    for i, (filename, data) in enumerate(items):
+        if result_cache is not None and data:
+            bytes_keys[i], cached = result_cache.lookup_bytes(data)
+            if cached is not None:
+                results[i] = build_upload_response(filename, cached, cached=True)
+                continue
+        pending.append(i)
+    
+    decoded = batch_decode_pool.map(lambda i: decode_batch_item(*items[i]), pending)
+    
+    clips, clip_indices = [], []
+    features, feature_indices = [], []
+    pcm_keys = {}
+    for i, (kind, value) in zip(pending, decoded):
+        if kind == 'error':
+            results[i] = {'status': 'error', 'filename': items[i][0], 'message': value}
+        elif kind == 'audio':
+            if result_cache is not None:
+                pcm_keys[i], cached = result_cache.lookup_pcm(value)
+                if cached is not None:
+                    results[i] = build_upload_response(items[i][0], cached, cached=True)
+                    continue
+            gated = processor.gate(value)
+            if gated is not None:
+                results[i] = build_upload_response(items[i][0], gated)
+                continue
+            clips.append(value)
+            clip_indices.append(i)
+        else:
+            features.append(value)
+            feature_indices.append(i)
+    
+    try:
+        # One feature pass and one forward pass for the whole batch
+        if clips:
+            clip_features = processor.extract_features_batch(np.stack(clips))
+            for i, clip, vector in zip(clip_indices, clips, clip_features):
+                sink = feature_sink(filename=items[i][0], source='batch')
+                if sink is not None:
+                    sink(clip, vector)
+            features = list(clip_features) + features
+            feature_indices = clip_indices + feature_indices
+        if features:
+            logger.info(f"🤖 Analyzing {len(features)} clips...")
+            for i, result in zip(feature_indices, processor.predict_features_batch(np.stack(features))):
+                if result_cache is not None:
+                    result_cache.store(result, bytes_key=bytes_keys[i], pcm_key=pcm_keys.get(i))
+                results[i] = build_upload_response(items[i][0], result)
+    except Exception as e:
+        logger.error(f"❌ Batch analysis error: {str(e)}")
+        ERRORS.inc(stage='batch')
+        for i in feature_indices:
+            results[i] = {'status': 'error', 'filename': items[i][0], 'message': f'Processing error: {str(e)}'}
+    
+    for i, item in enumerate(results):
+        item['index'] = i
+    failed = sum(item['status'] != 'success' for item in results)
+    logger.info(f"✅ Batch complete: {len(results) - failed} succeeded, {failed} failed")
+    
+    return jsonify({
+        'status': 'success' if failed < len(results) else 'error',
+        'count': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'results': results
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Result cache hit/miss counters"""
+    if result_cache is None:
+        return jsonify({'status': 'disabled'})
+    return jsonify({
+        'status': 'enabled',
+        **result_cache.stats()
+    })
+
+@app.route('/stream/start', methods=['POST'])
+def stream_start():
+    """
+    Open a streaming detection session.
+    Optional JSON/form fields: sample_rate, hop_seconds, threshold.
+    """
+    if processor is None:
+        return processor_unavailable()
+    
+    params = request.get_json(silent=True) or request.form
+    try:
+        sample_rate = int(params.get('sample_rate', processor.target_sr))
+        hop_seconds = float(params.get('hop_seconds', STREAM_HOP_SECONDS))
+        threshold = float(params.get('threshold', 0.5))
+        if sample_rate <= 0:
+            raise ValueError('sample_rate must be positive')
+        if not 0 < hop_seconds <= processor.duration:
+            raise ValueError(f'hop_seconds must be between 0 and {processor.duration} seconds')
+        if not 0 <= threshold <= 1:
+            raise ValueError('threshold must be between 0 and 1')
+        session = stream_sessions.create(processor, sample_rate=sample_rate, hop_seconds=hop_seconds,
+                                         threshold=threshold)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid stream parameters: {e}'
+        }), 400
+    except OverflowError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, {'Retry-After': '5'}
+    
+    logger.info(f"🎙️  Stream session opened: {session.id}")
+    return jsonify({
+        'status': 'success',
+        **session.summary(),
+        'window_seconds': processor.duration,
+        'hop_seconds': session.featurizer.hop_frames * session.featurizer.hop_length / session.featurizer.sr,
+        'format': 's16le mono'
+    })
+
+@app.route('/stream/<session_id>', methods=['POST'])
+def stream_push(session_id):
+    """
+    Append raw s16le mono PCM to a session (plain or chunked request body).
+    Responds with NDJSON, one line per scored window, as the body is read.
+    """
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown or expired stream session'
+        }), 404
+    
+    stream = request.stream
+    
+    def generate():
+        with session.lock:
+            while True:
+                chunk = stream.read(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                for event in session.push_pcm(chunk):
+                    yield json.dumps(event) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/stream/<session_id>', methods=['DELETE'])
+def stream_stop(session_id):
+    """Close a streaming session and return its summary."""
+    session = stream_sessions.close(session_id)
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown or expired stream session'
+        }), 404
+    
+    logger.info(f"🎙️  Stream session closed: {session_id}")
+    return jsonify({
+        'status': 'success',
+        **session.summary()
+    })
+
+@app.route('/devices/<device_id>', methods=['GET'])
+def device_status(device_id):
+    """Rolling danger score and stream state of a device session."""
+    session = device_sessions.get(device_id)
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown or expired device session'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        **session.summary()
+    })
+
+@app.route('/devices/<device_id>', methods=['DELETE'])
+def device_reset(device_id):
+    """Drop a device session; its next upload starts a new stream."""
+    session = device_sessions.close(device_id)
+    if session is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown or expired device session'
+        }), 404
+    
+    logger.info(f"📱 Device session closed: {device_id}")
+    return jsonify({
+        'status': 'success',
+        **session.summary()
+    })
+
 @app.route('/test', methods=['POST'])
 def test_endpoint():
     """Simple test endpoint"""
@@ -362,9 +1118,10 @@ if __name__ == '__main__':
     print(f"📡 Starting on http://0.0.0.0:5000")
     print("="*60)
     
+    # Development server only; use `gunicorn -c gunicorn.conf.py main:app` in production
     app.run(
         host="0.0.0.0",
         port=5000,
-        debug=True,
+        debug=os.environ.get('FLASK_DEBUG', '1') == '1',
         threaded=True
     )
\ No newline at end of file
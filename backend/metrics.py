@@ -0,0 +1,275 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Metrics are per process: under gunicorn each worker reports its own
+values, so scrape the workers individually or aggregate by instance.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond model calls to slow transcodes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        super().__init__(name, help_text, labelnames)
+        self._function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self):
+        # Gauges backed by a callback are evaluated at scrape time
+        if self._function is not None:
+            value = self._function()
+            if value is None:
+                return []
+            with self._lock:
+                self._values[()] = value
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            labels = _format_labels(self.labelnames, key, [('le', repr(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self.register(Gauge(name, help_text, labelnames, function))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Hot-path metrics shared by main.py, AudioProcessor and the decoders
+STAGE_SECONDS = REGISTRY.histogram(
+    'audio_stage_seconds',
+    'Time spent in each processing stage (upload_save, load, resample, mfcc, scaler, predict, ...)',
+    ['stage'])
+CONVERSION_SECONDS = REGISTRY.histogram(
+    'audio_conversion_seconds',
+    'Time to convert an upload to PCM, by the method that succeeded',
+    ['method'])
+ERRORS = REGISTRY.counter(
+    'audio_errors_total',
+    'Errors by processing stage',
+    ['stage'])
+FALLBACKS = REGISTRY.counter(
+    'audio_fallbacks_total',
+    'Times a processing step fell back to a slower method',
+    ['step', 'method'])
+REQUESTS = REGISTRY.counter(
+    'upload_requests_total',
+    'Completed /upload requests by HTTP status',
+    ['status'])
+IN_FLIGHT = REGISTRY.gauge(
+    'upload_requests_in_flight',
+    '/upload requests currently being processed')
+GATE = REGISTRY.counter(
+    'activity_gate_total',
+    'Clips checked by the activity gate, by outcome (gated clips skip inference)',
+    ['outcome'])
+ADMISSIONS = REGISTRY.counter(
+    'admission_total',
+    'Admission decisions for analysis requests (admitted, rejected, shed, timeout), by priority',
+    ['priority', 'outcome'])
+ADMISSION_WAIT = REGISTRY.histogram(
+    'admission_wait_seconds',
+    'Time admitted requests spent queued before running, by priority',
+    ['priority'])
+FEATURE_STORE_ROWS = REGISTRY.counter(
+    'feature_store_rows_total',
+    'Rows offered to the feature store, by outcome (written, duplicate, dropped, error)',
+    ['outcome'])
+MODEL_PREDICTIONS = REGISTRY.counter(
+    'model_predictions_total',
+    'Rows scored per registered model, by role (served or shadow)',
+    ['model', 'role'])
+MODEL_RELOADS = REGISTRY.counter(
+    'model_reloads_total',
+    'Hot reloads of a model after its files changed, by outcome',
+    ['model', 'outcome'])
+SHADOW_DISAGREEMENTS = REGISTRY.counter(
+    'shadow_disagreements_total',
+    'Shadow predictions whose class differed from the served model',
+    ['model'])
+CASCADE_ROWS = REGISTRY.counter(
+    'cascade_rows_total',
+    'Rows decided by each cascade stage (full = escalated to the full model)',
+    ['stage'])
+DEVICE_FRAMES = REGISTRY.counter(
+    'device_session_frames_total',
+    'Log-mel frames of device session uploads, computed vs reused from the previous upload',
+    ['outcome'])
+DEVICE_EVICTIONS = REGISTRY.counter(
+    'device_session_evictions_total',
+    'Device sessions dropped, by reason (ttl, lru, memory)',
+    ['reason'])
+STARTUP_PHASE_SECONDS = REGISTRY.gauge(
+    'startup_phase_seconds',
+    'Duration of each startup phase (import, model_load, warmup)',
+    ['phase'])
+STARTUP_READY_SECONDS = REGISTRY.gauge(
+    'startup_ready_seconds',
+    'Seconds from process start until the model was ready to serve')
+FIRST_PREDICTION_SECONDS = REGISTRY.gauge(
+    'time_to_first_prediction_seconds',
+    'Seconds from process start until the first prediction was returned')
+
+
+def _process_start_time():
+    """Wall-clock start of this process, so interpreter and import time count toward startup."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (starttime) is in clock ticks since boot; the command
+            # name in field 2 may contain spaces, so split after its ')'
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_START = _process_start_time()
+_first_prediction = threading.Event()
+
+
+def mark_first_prediction():
+    if not _first_prediction.is_set():
+        _first_prediction.set()
+        FIRST_PREDICTION_SECONDS.set(time.time() - PROCESS_START)
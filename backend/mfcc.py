@@ -0,0 +1,114 @@
+import numpy as np
+import scipy.fft
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class BatchMFCC:
+    """
+    Vectorized MFCC + mean/std features for many fixed-length clips at once.
+
+    Reproduces librosa.feature.mfcc(y, sr, n_mfcc, n_fft, hop_length) with its
+    defaults (centered STFT with zero padding, periodic Hann window, power
+    mel spectrogram, power_to_db with top_db=80, orthonormal DCT-II), but runs
+    the STFT, mel projection and DCT once over the whole (N, samples) batch.
+    The mel filterbank and DCT matrices are built once here.
+    """
+
+    def __init__(self, sr=22050, n_mfcc=13, n_fft=2048, hop_length=512, n_mels=128,
+                 top_db=80.0, chunk_size=32, workers=-1):
+        import librosa
+        import scipy.signal
+
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.top_db = top_db
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        self.window = scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        # (n_fft // 2 + 1, n_mels) so frames @ mel_basis projects the last axis
+        self.mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).T.astype(np.float32)
+        # (n_mels, n_mfcc) orthonormal DCT-II, truncated to the kept coefficients
+        self.dct_basis = scipy.fft.dct(np.eye(n_mels), type=2, norm='ortho', axis=0)[:n_mfcc].T.astype(np.float32)
+
+    def frames(self, clips, center=True):
+        """Slice (N, samples) clips into (N, T, n_fft) STFT frames."""
+        clips = np.asarray(clips, dtype=np.float32)
+        if center:
+            pad = self.n_fft // 2
+            clips = np.pad(clips, ((0, 0), (pad, pad)), mode='constant')
+        return sliding_window_view(clips, self.n_fft, axis=-1)[:, ::self.hop_length]
+
+    def log_mel(self, frames):
+        """Power mel spectrogram in dB for (..., n_fft) frames, before top_db clipping."""
+        spectrum = scipy.fft.rfft(frames * self.window, axis=-1, workers=self.workers)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mel = power @ self.mel_basis
+        return 10.0 * np.log10(np.maximum(mel, 1e-10))
+
+    def mfcc_from_log_mel(self, log_mel):
+        """Apply per-clip top_db clipping and the DCT: (N, T, n_mels) -> (N, T, n_mfcc)."""
+        if self.top_db is not None:
+            floor = log_mel.max(axis=(-2, -1), keepdims=True) - self.top_db
+            log_mel = np.maximum(log_mel, floor)
+        return log_mel @ self.dct_basis
+
+    def mfcc(self, clips):
+        """MFCCs in librosa layout: (N, samples) -> (N, n_mfcc, T)."""
+        return np.swapaxes(self.mfcc_from_log_mel(self.log_mel(self.frames(clips))), 1, 2)
+
+    def features(self, clips):
+        """Per-clip MFCC mean and std: (N, samples) -> (N, 2 * n_mfcc)."""
+        clips = np.atleast_2d(np.asarray(clips, dtype=np.float32))
+        out = np.empty((len(clips), 2 * self.n_mfcc), dtype=np.float32)
+
+        for start in range(0, len(clips), self.chunk_size):
+            chunk = clips[start:start + self.chunk_size]
+            mfccs = self.mfcc_from_log_mel(self.log_mel(self.frames(chunk)))
+            out[start:start + len(chunk), :self.n_mfcc] = mfccs.mean(axis=1)
+            out[start:start + len(chunk), self.n_mfcc:] = mfccs.std(axis=1)
+
+        return np.nan_to_num(out, nan=0.0, posinf=0.0, neginf=0.0)
+
+    def window_features(self, signal, window_seconds=4.0, hop_seconds=1.0, chunk_frames=2048):
+        """
+        Mean/std features of overlapping windows over one long signal.
+
+        The MFCC is computed once for the whole signal (top_db clipping is
+        relative to the loudest frame of the signal, not of each window) and
+        every window's mean/std is read off cumulative sums, so the cost grows
+        linearly with the signal length rather than with the number of
+        windows.  Signals shorter than a window are zero-padded to one window;
+        a last window aligned to the end covers any tail the hop grid misses.
+
+        Returns (starts, features): window start times in seconds and a
+        (W, 2 * n_mfcc) float32 matrix.
+        """
+        signal = np.asarray(signal, dtype=np.float32).ravel()
+        window_samples = int(self.sr * window_seconds)
+        if len(signal) < window_samples:
+            signal = np.pad(signal, (0, window_samples - len(signal)), mode='constant')
+
+        frames = self.frames(signal[np.newaxis])[0]
+        log_mel = np.concatenate([self.log_mel(frames[i:i + chunk_frames])
+                                  for i in range(0, len(frames), chunk_frames)])
+        mfccs = self.mfcc_from_log_mel(log_mel[np.newaxis])[0].astype(np.float64)
+
+        window_frames = 1 + window_samples // self.hop_length
+        hop_frames = max(1, int(round(hop_seconds * self.sr / self.hop_length)))
+        last = len(mfccs) - window_frames
+        starts = np.arange(0, last + 1, hop_frames)
+        if starts[-1] != last:
+            starts = np.append(starts, last)
+
+        zero = np.zeros((1, self.n_mfcc))
+        sums = np.concatenate([zero, np.cumsum(mfccs, axis=0)])
+        squares = np.concatenate([zero, np.cumsum(mfccs ** 2, axis=0)])
+        mean = (sums[starts + window_frames] - sums[starts]) / window_frames
+        var = (squares[starts + window_frames] - squares[starts]) / window_frames - mean ** 2
+        features = np.hstack([mean, np.sqrt(np.maximum(var, 0.0))]).astype(np.float32)
+
+        return starts * self.hop_length / self.sr, np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0)
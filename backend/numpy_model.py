@@ -0,0 +1,128 @@
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _activate(x, activation):
+    if activation in (None, 'linear'):
+        return x
+    if activation == 'relu':
+        return np.maximum(x, 0.0)
+    if activation == 'sigmoid':
+        return 1.0 / (1.0 + np.exp(-x))
+    if activation == 'tanh':
+        return np.tanh(x)
+    if activation == 'softmax':
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    raise ValueError(f"Unsupported activation: {activation}")
+
+
+def _same_padding(size, kernel, stride):
+    """TensorFlow 'same' padding: (before, after), with the extra pixel after."""
+    out = -(-size // stride)
+    total = max((out - 1) * stride + kernel - size, 0)
+    return total // 2, total - total // 2
+
+
+def _pad(x, kernel, strides, padding, value=0.0):
+    if padding != 'same':
+        return x
+    (ph0, ph1) = _same_padding(x.shape[1], kernel[0], strides[0])
+    (pw0, pw1) = _same_padding(x.shape[2], kernel[1], strides[1])
+    return np.pad(x, ((0, 0), (ph0, ph1), (pw0, pw1), (0, 0)), constant_values=value)
+
+
+def _windows(x, kernel, strides):
+    """(N, H, W, C) -> (N, H', W', C, kh, kw) views."""
+    w = sliding_window_view(x, kernel, axis=(1, 2))
+    return w[:, ::strides[0], ::strides[1]]
+
+
+class NumpyModel:
+    """
+    Inference-only forward pass for the exported Keras CNN.
+
+    Loads the .npz written by export_model.py and mirrors the Keras layers it
+    contains using NumPy only, so serving does not need TensorFlow.  predict()
+    takes the same (N, 13, 2, 1) input as model.predict().
+    """
+
+    def __init__(self, layers, weights):
+        self.layers = layers
+        self.weights = weights
+
+        # Fold BatchNormalization into one scale/shift and lay conv kernels
+        # out for im2col once, instead of on every call
+        for i, layer in enumerate(layers):
+            if layer['type'] == 'BatchNormalization':
+                scale = self._weight(i, 'gamma') / np.sqrt(self._weight(i, 'moving_variance') + layer['epsilon'])
+                weights[f"{i}/_scale"] = scale
+                weights[f"{i}/_shift"] = self._weight(i, 'beta') - self._weight(i, 'moving_mean') * scale
+            elif layer['type'] == 'Conv2D':
+                kh, kw, c, f = self._weight(i, 'kernel').shape
+                weights[f"{i}/_im2col"] = np.ascontiguousarray(
+                    self._weight(i, 'kernel').transpose(2, 0, 1, 3).reshape(c * kh * kw, f))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            layers = json.loads(str(data['__layers__']))
+            weights = {key: data[key].astype(np.float32) for key in data.files if key != '__layers__'}
+        return cls(layers, weights)
+
+    def _weight(self, index, name):
+        return self.weights[f"{index}/{name}"]
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+
+        for i, layer in enumerate(self.layers):
+            kind = layer['type']
+
+            if kind == 'Conv2D':
+                size, strides = self._weight(i, 'kernel').shape[:2], tuple(layer['strides'])
+                x = _windows(_pad(x, size, strides, layer['padding']), size, strides)
+                # im2col: (N, H, W, C*kh*kw) @ (C*kh*kw, F)
+                x = x.reshape(x.shape[:3] + (-1,)) @ self._weight(i, '_im2col')
+                if layer.get('use_bias', True):
+                    x = x + self._weight(i, 'bias')
+                x = _activate(x, layer['activation'])
+
+            elif kind == 'BatchNormalization':
+                x = x * self._weight(i, '_scale') + self._weight(i, '_shift')
+
+            elif kind in ('MaxPooling2D', 'AveragePooling2D'):
+                size, strides = tuple(layer['pool_size']), tuple(layer['strides'])
+                if kind == 'MaxPooling2D':
+                    x = _windows(_pad(x, size, strides, layer['padding'], -np.inf), size, strides).max(axis=(-2, -1))
+                else:
+                    x = _windows(_pad(x, size, strides, layer['padding'], np.nan), size, strides)
+                    x = np.nanmean(x, axis=(-2, -1))
+
+            elif kind == 'GlobalAveragePooling2D':
+                x = x.mean(axis=(1, 2))
+
+            elif kind == 'GlobalMaxPooling2D':
+                x = x.max(axis=(1, 2))
+
+            elif kind == 'Flatten':
+                x = x.reshape(len(x), -1)
+
+            elif kind == 'Dense':
+                x = x @ self._weight(i, 'kernel')
+                if layer.get('use_bias', True):
+                    x = x + self._weight(i, 'bias')
+                x = _activate(x, layer['activation'])
+
+            elif kind == 'Activation':
+                x = _activate(x, layer['activation'])
+
+            elif kind == 'Dropout':
+                continue
+
+            else:
+                raise ValueError(f"Unsupported layer type: {kind}")
+
+        return x
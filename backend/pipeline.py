@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+
+from concurrency import FeaturizePool
+from decoding import decode_audio
+from metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class UploadPipeline:
+    """
+    Staged upload processing on a dedicated asyncio event loop.
+
+    receive (request thread) -> decode (thread pool) -> activity gate ->
+    featurize (process pool) -> infer (micro-batcher).  Every stage has its
+    own concurrency limit.  The receive slot is held while the request body
+    is read and parsed (see receiving()), which caps how many bodies are
+    buffered at once; a slow client still ties up its request thread.
+
+    The request thread waits in run() until its result is ready, so the
+    pipeline does not let a worker hold more requests open.  What it buys
+    is that, across the requests a worker already has, the CPU-bound stages
+    are capped separately and overlap: one request decodes while another is
+    featurized and a third waits on the model, and concurrent inferences
+    share micro-batches instead of each request running every stage back to
+    back.
+    """
+
+    def __init__(self, processor, receive_limit=64, decode_workers=4, featurize_workers=2, infer_limit=64,
+                 result_cache=None, featurizer=None):
+        self.processor = processor
+        self.result_cache = result_cache
+        self._receive_slots = threading.BoundedSemaphore(receive_limit)
+
+        self._decode_pool = ThreadPoolExecutor(decode_workers, thread_name_prefix='decode')
+        # Use the featurize pool shared with the processor, or start one
+        self._owns_featurizer = featurizer is None
+        self._featurizer = featurizer or FeaturizePool(
+            featurize_workers, processor.target_sr, processor.n_mfcc, processor.duration)
+        featurize_workers = self._featurizer.workers
+
+        self._loop = asyncio.new_event_loop()
+        self._decode_limit = asyncio.Semaphore(decode_workers)
+        self._featurize_limit = asyncio.Semaphore(featurize_workers)
+        self._infer_limit = asyncio.Semaphore(infer_limit)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='upload-pipeline', daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def receiving(self):
+        """
+        Hold a receive slot while the request body is read.
+
+        Werkzeug reads and parses the whole body on the first access to
+        request.files/form/values, so that access must happen inside.
+        """
+        with self._receive_slots:
+            yield
+
+    @asynccontextmanager
+    async def _timed(self, stage):
+        # Time a stage once it holds its slot, so queueing is not counted
+        with STAGE_SECONDS.time(stage=f'pipeline_{stage}'):
+            yield
+
+    async def _process(self, data, feature_sink=None):
+        loop = asyncio.get_running_loop()
+        processor = self.processor
+
+        async with self._decode_limit, self._timed('decode'):
+            audio, method = await loop.run_in_executor(
+                self._decode_pool, decode_audio, data, processor.target_sr, processor.duration)
+
+        pcm_key = None
+        if self.result_cache is not None:
+            pcm_key, result = self.result_cache.lookup_pcm(audio)
+            if result is not None:
+                return result, method, True
+
+        gated = processor.gate(audio)
+        if gated is not None:
+            if self.result_cache is not None:
+                self.result_cache.store(gated, pcm_key=pcm_key)
+            return gated, method, False
+
+        async with self._featurize_limit, self._timed('featurize'):
+            features = (await asyncio.wrap_future(self._featurizer.submit(audio)))[0]
+        if feature_sink is not None:
+            feature_sink(audio, features)
+
+        async with self._infer_limit, self._timed('infer'):
+            model, shadow = processor.models.route()
+            model_input = model.preprocess(features)
+            if model.batcher is not None:
+                proba, stages = await asyncio.wrap_future(model.batcher.submit(model_input)), None
+            else:
+                proba, stages = await loop.run_in_executor(None, model.decide, model_input)
+        processor.models.record(model, features, proba, shadow)
+
+        result = processor.format_prediction(proba[0], model, stages[0] if stages else None)
+        if self.result_cache is not None:
+            self.result_cache.store(result, pcm_key=pcm_key)
+        return result, method, False
+
+    def submit(self, data, feature_sink=None):
+        """
+        Schedule an upload; returns a concurrent.futures.Future of (result, method, cached).
+        feature_sink(audio, features) is called with the extracted features.
+        """
+        return asyncio.run_coroutine_threadsafe(self._process(data, feature_sink), self._loop)
+
+    def run(self, data, timeout=None, feature_sink=None):
+        """Blocking wrapper around submit() for WSGI request threads."""
+        return self.submit(data, feature_sink).result(timeout=timeout)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._decode_pool.shutdown(wait=False)
+        if self._owns_featurizer:
+            self._featurizer.close()
@@ -0,0 +1,450 @@
+"""
+Header-aware audio probing: codec, sample rate and channels without decoding.
+
+probe() reads what the container already declares: the RIFF fmt chunk,
+the stsd sample entry of 3GP/MP4 files (wherever the moov box is), the
+AMR storage magic, ADTS and MP3 frame headers, FLAC STREAMINFO and the
+Ogg identification packet.  For PCM without a usable header (an Android
+recording whose WAV header was never written, or a bare AudioRecord dump)
+estimate_pcm() guesses the sample layout and rate from a small prefix:
+
+- anything else first: executables, archives and images by their magic
+  numbers (NON_AUDIO_MAGIC), text by its share of printable ASCII;
+- the layout: float32 when the values read as floats are plausible
+  samples, 16-bit when the even and odd bytes are distributed differently
+  (random low bytes, high bytes bunched around zero), 8-bit otherwise;
+  stereo when the channels are identical or each is smoother than the
+  interleaved reading.  The lag-1 autocorrelation of the chosen reading
+  is the confidence, since recorded sound is smooth from one sample to
+  the next and compressed or random bytes are not.  An 8-bit reading
+  also has to be centred on the unsigned midpoint and pass the higher
+  MIN_CONFIDENCE_8BIT, since any byte soup can be read as 8-bit samples;
+- the rate is 8 kHz for telephone-band audio, otherwise the common rate
+  that puts the 85% spectral rolloff nearest to where recorded sound
+  usually has it (ROLLOFF_HZ), weighted by how common the rate is
+  (COMMON_RATES) and excluding rates that would place content above what
+  microphones capture (MAX_BANDWIDTH_HZ).  When no rate wins clearly the
+  estimate is DEFAULT_PCM_RATE.
+
+PCM layouts come back as a wavio.WavInfo, so decode_wav() reads them in
+place, whether the bytes are an upload buffer or an mmap of a file.
+"""
+import mmap
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from wavio import WavInfo, SAMPLE_DTYPES, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, parse_wav
+
+# pcm is a WavInfo when the samples can be read in place, confidence is 1.0
+# for values read from a header and the autocorrelation of an estimate
+AudioInfo = namedtuple('AudioInfo', 'format codec sample_rate channels pcm confidence')
+
+UNKNOWN = AudioInfo('unknown', None, None, None, None, 0.0)
+
+# Magic numbers of containers ffmpeg reads but sniff_format() does not name;
+# never guess these as headerless PCM
+OTHER_CONTAINERS = (b'FORM', b'\x1aE\xdf\xa3', b'caff', b'.snd', b'MThd', b'ID3')
+
+# Executables, archives, documents and images: not audio, and never PCM
+NON_AUDIO_MAGIC = (
+    b'\x7fELF', b'MZ', b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe', b'\xca\xfe\xba\xbe', b'#!',
+    b'PK\x03\x04', b'\x1f\x8b', b'BZh', b'\xfd7zXZ', b'7z\xbc\xaf', b'(\xb5/\xfd', b'Rar!',
+    b'%PDF', b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'SQLite format 3'
+)
+
+# RIFF format tags -> ffmpeg decoder
+WAV_CODECS = {
+    (WAVE_FORMAT_PCM, 8): 'pcm_u8',
+    (WAVE_FORMAT_PCM, 16): 'pcm_s16le',
+    (WAVE_FORMAT_PCM, 24): 'pcm_s24le',
+    (WAVE_FORMAT_PCM, 32): 'pcm_s32le',
+    (WAVE_FORMAT_IEEE_FLOAT, 32): 'pcm_f32le',
+    (WAVE_FORMAT_IEEE_FLOAT, 64): 'pcm_f64le',
+    (0x0002, 4): 'adpcm_ms',
+    (0x0006, 8): 'pcm_alaw',
+    (0x0007, 8): 'pcm_mulaw',
+    (0x0011, 4): 'adpcm_ima_wav',
+}
+
+# MP4/3GP audio sample entries -> ffmpeg decoder
+MP4_CODECS = {
+    b'samr': 'amrnb', b'sawb': 'amrwb', b'mp4a': 'aac', b'.mp3': 'mp3', b'alac': 'alac',
+    b'Opus': 'opus', b'fLaC': 'flac', b'ulaw': 'pcm_mulaw', b'alaw': 'pcm_alaw',
+    b'sowt': 'pcm_s16le', b'twos': 'pcm_s16be'
+}
+
+# MP4 boxes on the path to the sample descriptions
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl', b'edts', b'udta'}
+
+ADTS_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+# MPEG version bits -> sample rates of the 2-bit rate index
+MP3_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Headerless PCM: candidate rates and how often uploads use them.  Raw
+# AudioRecord dumps and the streaming endpoint are 16 kHz, the app's own
+# recorders write 44.1 kHz and 22.05 kHz (with a header, normally)
+COMMON_RATES = {16000: 0.3, 44100: 0.25, 22050: 0.15, 48000: 0.1, 8000: 0.1, 11025: 0.05, 32000: 0.05}
+DEFAULT_PCM_RATE = 16000
+ROLLOFF_HZ = 4500.0
+MAX_BANDWIDTH_HZ = 20000.0
+PRIOR_WEIGHT = 0.2
+RATE_MARGIN = 0.1
+TELEPHONE_BAND = (200.0, 3000.0)
+
+# Prefix read for the estimate, and the autocorrelation that passes for audio
+ESTIMATE_BYTES = 1 << 18
+MIN_CONFIDENCE = 0.3
+MIN_CONFIDENCE_8BIT = 0.5
+# A prefix this printable (ASCII, tabs and newlines) is text
+TEXT_FRACTION = 0.95
+
+_FRAME = 512
+
+
+def sniff_format(header):
+    """Detect audio format from the first bytes of a file."""
+    header = bytes(header[:100])
+
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    elif header[:3] == b'ID3' or (len(header) > 1 and header[0] == 0xFF and (header[1] & 0xE0) == 0xE0 and (header[1] & 0x06)):
+        return 'mp3'
+    elif header[:4] == b'OggS':
+        return 'ogg'
+    elif header[:4] == b'fLaC':
+        return 'flac'
+    elif b'ftyp3gp' in header[:20]:
+        return '3gp'
+    elif b'ftyp' in header[:20]:
+        return 'mp4'
+    elif header.startswith(b'#!AMR-WB\n'):
+        return 'amr-wb'
+    elif header.startswith(b'#!AMR\n'):
+        return 'amr'
+    elif len(header) > 1 and header[0] == 0xFF and (header[1] & 0xF6) == 0xF0:
+        return 'aac'
+    else:
+        return 'unknown'
+
+
+def iter_boxes(data, start, end):
+    """Yield (type, box_start, header_size, box_end) for MP4 boxes in data[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, pos)
+        header_size = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            return
+        yield box_type, pos, header_size, pos + size
+        pos += size
+
+
+def probe(data):
+    """AudioInfo of a bytes-like buffer (or mmap); reads headers only."""
+    # Views are released on return so an mmap can be closed afterwards
+    with memoryview(data) as base, base.cast('B') as view:
+        return _probe(view)
+
+
+def _probe(view):
+    fmt = sniff_format(view[:100])
+
+    if fmt == 'wav':
+        return _probe_wav(view)
+    if fmt in ('3gp', 'mp4'):
+        return _probe_mp4(view, fmt)
+    if fmt in ('amr', 'amr-wb'):
+        return _probe_amr(view, fmt)
+    if fmt == 'aac':
+        return _probe_adts(view)
+    if fmt == 'mp3':
+        return _probe_mp3(view)
+    if fmt == 'flac':
+        return _probe_flac(view)
+    if fmt == 'ogg':
+        return _probe_ogg(view)
+    if bytes(view[:4]).startswith(OTHER_CONTAINERS):
+        return UNKNOWN
+    return _estimate_pcm(view, 0)
+
+
+def probe_file(path):
+    """probe() for a file, mapped rather than read so only the header pages are touched."""
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return UNKNOWN
+    try:
+        return probe(mapped)
+    finally:
+        mapped.close()
+
+
+def _probe_wav(view):
+    info = parse_wav(view)
+    if info is None:
+        return _salvage_riff(view)
+    pcm = info if (info.format_tag, info.bits) in SAMPLE_DTYPES else None
+    return AudioInfo('wav', WAV_CODECS.get((info.format_tag, info.bits)), info.sample_rate, info.channels, pcm, 1.0)
+
+
+def _salvage_riff(view):
+    """A RIFF header parse_wav() rejects: keep a readable fmt chunk, estimate the rest."""
+    head = bytes(view[:4096])
+    data = head.find(b'data', 12)
+    offset = data + 8 if data >= 0 else min(44, len(view))
+
+    fmt = head.find(b'fmt ', 12)
+    if fmt >= 0 and fmt + 24 <= len(head):
+        tag, channels, sample_rate, _, block_align, bits = struct.unpack_from('<HHIIHH', head, fmt + 8)
+        if (tag, bits) in SAMPLE_DTYPES and channels >= 1 and block_align == channels * bits // 8 and \
+                1000 <= sample_rate <= 192000:
+            size = (len(view) - offset) // block_align * block_align
+            pcm = WavInfo(tag, channels, sample_rate, bits, block_align, offset, size)
+            return AudioInfo('wav', WAV_CODECS[(tag, bits)], sample_rate, channels, pcm, 1.0)
+
+    info = _estimate_pcm(view, offset)
+    return info._replace(format='wav')
+
+
+def _probe_mp4(view, fmt):
+    """Codec, rate and channels from the first audio sample entry (moov may follow mdat)."""
+    def walk(start, end):
+        for box_type, pos, header_size, box_end in iter_boxes(view, start, end):
+            body = pos + header_size
+            if box_type in MP4_CONTAINER_BOXES:
+                found = walk(body, box_end)
+                if found:
+                    return found
+            elif box_type == b'stsd':
+                # version/flags and entry count precede the sample entries
+                for entry, entry_pos, entry_header, entry_end in iter_boxes(view, body + 8, box_end):
+                    if entry in MP4_CODECS and entry_pos + entry_header + 28 <= entry_end:
+                        sample_entry = entry_pos + entry_header
+                        channels = struct.unpack_from('>H', view, sample_entry + 16)[0]
+                        sample_rate = struct.unpack_from('>I', view, sample_entry + 24)[0] >> 16
+                        return AudioInfo(fmt, MP4_CODECS[entry], sample_rate or None, channels or None, None, 1.0)
+        return None
+
+    return walk(0, len(view)) or AudioInfo(fmt, None, None, None, None, 1.0)
+
+
+def _probe_amr(view, fmt):
+    magic = b'#!AMR-WB\n' if fmt == 'amr-wb' else b'#!AMR\n'
+    if len(view) > len(magic) and view[len(magic)] & 0x83:
+        # Frame headers have zero padding bits; this is not AMR after all
+        return AudioInfo(fmt, None, None, None, None, 0.0)
+    if fmt == 'amr-wb':
+        return AudioInfo(fmt, 'amrwb', 16000, 1, None, 1.0)
+    return AudioInfo(fmt, 'amrnb', 8000, 1, None, 1.0)
+
+
+def _probe_adts(view):
+    if len(view) < 7:
+        return AudioInfo('aac', 'aac', None, None, None, 0.0)
+    rate_index = (view[2] >> 2) & 0x0F
+    channels = ((view[2] & 0x01) << 2) | (view[3] >> 6)
+    sample_rate = ADTS_RATES[rate_index] if rate_index < len(ADTS_RATES) else None
+    return AudioInfo('aac', 'aac', sample_rate, channels or None, None, 1.0)
+
+
+def _probe_mp3(view):
+    pos = 0
+    if bytes(view[:3]) == b'ID3' and len(view) >= 10:
+        # Tag size is a 28-bit syncsafe integer
+        pos = 10 + ((view[6] & 0x7F) << 21 | (view[7] & 0x7F) << 14 | (view[8] & 0x7F) << 7 | (view[9] & 0x7F))
+    if pos + 4 > len(view) or view[pos] != 0xFF or (view[pos + 1] & 0xE0) != 0xE0:
+        return AudioInfo('mp3', 'mp3', None, None, None, 1.0)
+    version = (view[pos + 1] >> 3) & 0x03
+    rate_index = (view[pos + 2] >> 2) & 0x03
+    sample_rate = MP3_RATES[version][rate_index] if version in MP3_RATES and rate_index < 3 else None
+    channels = 1 if view[pos + 3] >> 6 == 3 else 2
+    return AudioInfo('mp3', 'mp3', sample_rate, channels, None, 1.0)
+
+
+def _probe_flac(view):
+    if len(view) < 22:
+        return AudioInfo('flac', 'flac', None, None, None, 1.0)
+    # STREAMINFO follows the magic and its block header: 20-bit rate, 3-bit channels - 1
+    sample_rate = (view[18] << 12) | (view[19] << 4) | (view[20] >> 4)
+    channels = ((view[20] >> 1) & 0x07) + 1
+    return AudioInfo('flac', 'flac', sample_rate or None, channels, None, 1.0)
+
+
+def _probe_ogg(view):
+    if len(view) < 28:
+        return AudioInfo('ogg', None, None, None, None, 1.0)
+    packet = 27 + view[26]  # after the page header and its segment table
+    head = bytes(view[packet:packet + 20])
+    if head.startswith(b'\x01vorbis') and len(head) >= 16:
+        channels, sample_rate = struct.unpack_from('<BI', head, 11)
+        return AudioInfo('ogg', 'vorbis', sample_rate, channels, None, 1.0)
+    if head.startswith(b'OpusHead') and len(head) >= 10:
+        # Opus always decodes at 48 kHz whatever the input rate was
+        return AudioInfo('ogg', 'opus', 48000, head[9], None, 1.0)
+    return AudioInfo('ogg', None, None, None, None, 1.0)
+
+
+def _lag1(x):
+    """Lag-1 autocorrelation of a float signal (0 for constant signals)."""
+    x = x - x.mean()
+    energy = float(np.dot(x, x))
+    if energy == 0.0:
+        return 0.0
+    return float(np.dot(x[:-1], x[1:])) / energy
+
+
+def _samples(view, tag, bits, channels, offset, limit=ESTIMATE_BYTES):
+    """First frames of a candidate layout as float32 (frames, channels), or None if they cannot be audio."""
+    dtype = SAMPLE_DTYPES[(tag, bits)]
+    block_align = channels * bits // 8
+    frames = min(len(view) - offset, limit) // block_align
+    if frames < 2 * _FRAME:
+        return None
+    samples = np.frombuffer(view, dtype=dtype, count=frames * channels, offset=offset).reshape(frames, channels)
+    samples = samples.astype(np.float32)
+    if dtype == np.uint8:
+        samples -= 128.0
+    elif dtype.kind == 'f':
+        # Float PCM stays within [-1, 1] (with some headroom) above the noise
+        # floor; integers read as floats are huge, NaN or vanishingly small
+        magnitude = np.abs(samples[samples != 0])
+        if not np.all(np.isfinite(samples)) or magnitude.size == 0 or magnitude.max() > 4.0 or \
+                np.median(magnitude) < 1e-6:
+            return None
+    return samples
+
+
+def _byte_entropy(data):
+    """Entropy in bits of a uint8 array's byte values."""
+    counts = np.bincount(data, minlength=256)
+    p = counts[counts > 0] / max(counts.sum(), 1)
+    return float(-(p * np.log2(p)).sum())
+
+
+def estimate_pcm(data, offset=0):
+    """
+    Guess the layout and rate of headerless PCM starting at offset.
+
+    Returns an AudioInfo with format 'pcm' whose confidence is the lag-1
+    autocorrelation of the chosen layout, at least MIN_CONFIDENCE for
+    float and 16-bit readings (their checks already rule out most non-PCM
+    bytes) and at least MIN_CONFIDENCE_8BIT for 8-bit ones.  Callers should
+    only trust estimates of at least MIN_CONFIDENCE; compressed or random
+    bytes score near 0, and text, executables and archives are UNKNOWN.
+    Digital silence is returned as 16-bit mono at DEFAULT_PCM_RATE.
+    """
+    with memoryview(data) as base, base.cast('B') as view:
+        return _estimate_pcm(view, offset)
+
+
+def _is_text(prefix):
+    head = prefix[:4096]
+    printable = ((head >= 0x20) & (head < 0x7F)) | (head == 0x09) | (head == 0x0A) | (head == 0x0D)
+    return len(head) > 0 and printable.mean() >= TEXT_FRACTION
+
+
+def _estimate_pcm(view, offset):
+    prefix = np.frombuffer(view[offset:offset + ESTIMATE_BYTES], dtype=np.uint8)
+    if bytes(prefix[:16]).startswith(NON_AUDIO_MAGIC) or _is_text(prefix):
+        return UNKNOWN
+    float_samples = _samples(view, WAVE_FORMAT_IEEE_FLOAT, 32, 1, offset)
+    if len(prefix) >= 2 * _FRAME and not prefix.any():
+        # Digital silence reads the same under any layout
+        best = (1.0, WAVE_FORMAT_PCM, 16, 1, np.zeros((len(prefix) // 2, 1), dtype=np.float32))
+    elif float_samples is not None:
+        # Integer PCM practically never passes the float checks
+        best = (max(_lag1(float_samples[:, 0]), MIN_CONFIDENCE), WAVE_FORMAT_IEEE_FLOAT, 32, 1, float_samples)
+    elif abs(_byte_entropy(prefix[0::2]) - _byte_entropy(prefix[1::2])) > 0.5:
+        # 16-bit little-endian: near-random low bytes, high bytes bunched around 0x00/0xFF
+        mono = _samples(view, WAVE_FORMAT_PCM, 16, 1, offset)
+        stereo = _samples(view, WAVE_FORMAT_PCM, 16, 2, offset)
+        best = (_lag1(mono[:, 0]), WAVE_FORMAT_PCM, 16, 1, mono) if mono is not None else None
+        if stereo is not None:
+            left, right = stereo[:, 0], stereo[:, 1]
+            if left.any() and np.array_equal(left, right):
+                # The same signal in both channels
+                best = (1.0, WAVE_FORMAT_PCM, 16, 2, stereo)
+            elif best is None or min(_lag1(left), _lag1(right)) > best[0] + 0.05:
+                best = (min(_lag1(left), _lag1(right)), WAVE_FORMAT_PCM, 16, 2, stereo)
+        if best is not None:
+            # The byte statistics are evidence of PCM on their own
+            best = (max(best[0], MIN_CONFIDENCE),) + best[1:]
+    else:
+        # Unsigned 8-bit sound sits around 128 and is smooth; text and
+        # machine code are neither
+        samples = _samples(view, WAVE_FORMAT_PCM, 8, 1, offset)
+        best = None
+        if samples is not None and abs(float(np.median(samples))) < 16:
+            score = _lag1(samples[:, 0])
+            if score >= MIN_CONFIDENCE_8BIT:
+                best = (score, WAVE_FORMAT_PCM, 8, 1, samples)
+
+    if best is None:
+        return UNKNOWN
+    score, tag, bits, channels, samples = best
+    block_align = channels * bits // 8
+    sample_rate = estimate_rate(samples.mean(axis=1))
+    size = (len(view) - offset) // block_align * block_align
+    pcm = WavInfo(tag, channels, sample_rate, bits, block_align, offset, size)
+    return AudioInfo('pcm', WAV_CODECS[(tag, bits)], sample_rate, channels, pcm, max(min(score, 1.0), 0.0))
+
+
+def estimate_rate(audio):
+    """
+    The most plausible of COMMON_RATES for a mono signal; see the module docstring.
+
+    Returns DEFAULT_PCM_RATE when no rate scores clearly better than the
+    runner-up: a spectrum says little about the rate on its own (the same
+    clip at 16 and 22.05 kHz only differs in where its rolloff falls), so a
+    guess within RATE_MARGIN is worse than the rate headerless uploads most
+    often have.
+    """
+    frames = len(audio) // _FRAME
+    if frames < 1:
+        return DEFAULT_PCM_RATE
+    windowed = audio[:frames * _FRAME].reshape(frames, _FRAME) * np.hanning(_FRAME).astype(np.float32)
+    power = np.abs(np.fft.rfft(windowed, axis=1)) ** 2
+    power[:, 0] = 0.0
+
+    # Only frames within 20 dB of the loudest count; leading silence says nothing
+    energy = power.sum(axis=1)
+    loud = energy >= energy.max() * 0.01
+    if energy.max() == 0.0 or loud.sum() < 4:
+        return DEFAULT_PCM_RATE
+    spectrum = power[loud].mean(axis=0)
+
+    bins = len(spectrum)
+    cumulative = np.cumsum(spectrum) / spectrum.sum()
+    rolloff = (np.searchsorted(cumulative, 0.85) + 0.5) / bins
+    level = 10 * np.log10(np.convolve(spectrum, np.ones(8) / 8, mode='same') + 1e-20)
+    band = np.flatnonzero(level > level.max() - 60.0)
+    low, edge = band[0] / bins, (band[-1] + 1) / bins
+
+    # Telephone audio (G.712: 300-3400 Hz) is 8 kHz PCM; nothing else has a
+    # band cut off at both ends like this
+    if low * 4000 >= TELEPHONE_BAND[0] and TELEPHONE_BAND[1] <= edge * 4000 < 4000 * 0.96:
+        return 8000
+
+    scores = {}
+    for rate, prior in COMMON_RATES.items():
+        if edge * rate / 2 > MAX_BANDWIDTH_HZ:
+            continue
+        scores[rate] = abs(np.log(rolloff * rate / 2 / ROLLOFF_HZ)) - PRIOR_WEIGHT * np.log(prior)
+    if not scores:
+        return min(COMMON_RATES)
+    ranked = sorted(scores, key=scores.get)
+    if len(ranked) > 1 and scores[ranked[1]] - scores[ranked[0]] < RATE_MARGIN:
+        return DEFAULT_PCM_RATE
+    return ranked[0]
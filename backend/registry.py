@@ -0,0 +1,390 @@
+"""
+Registry of loaded models for hot reload and A/B routing.
+
+Every model (Keras CNN, NumPy export, sklearn RF) consumes the same 26-dim
+MFCC mean/std vector, so features are extracted once per request and only
+the forward pass differs between models.  The registry keeps one
+LoadedModel per name, serves a configurable share of traffic from a
+candidate, optionally scores the candidate in shadow on the same
+features, and swaps in a new version when a model file changes on disk.
+"""
+import logging
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+
+from batching import MicroBatcher
+from cache import content_hash
+from metrics import STAGE_SECONDS, ERRORS, MODEL_PREDICTIONS, MODEL_RELOADS, SHADOW_DISAGREEMENTS, CASCADE_ROWS
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 26
+
+
+def _file_signature(path):
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class LoadedModel:
+    """
+    One model file (plus its optional scaler) loaded for inference.
+
+    source_path is the Keras .h5 a NumPy .npz model_path was exported
+    from: a newer .h5 is re-exported before loading (or served directly
+    when it cannot be exported), and its changes count as model changes.
+    """
+
+    def __init__(self, name, model_path, scaler_path=None, max_batch_size=None, max_batch_wait_ms=10.0,
+                 source_path=None):
+        self.name = name
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.source_path = source_path
+
+        load_path = model_path
+        if source_path:
+            from export_model import sync_export
+            load_path = sync_export(source_path, model_path)
+        if not os.path.exists(load_path):
+            raise FileNotFoundError(f"Model file not found: {load_path}")
+        self.signature = (_file_signature(model_path), _file_signature(scaler_path), _file_signature(source_path))
+
+        # Determine model type and runtime
+        self.model_type = 'rf' if load_path.endswith('.pkl') else 'cnn'
+        if load_path.endswith('.pkl'):
+            self.runtime = 'sklearn'
+        elif load_path.endswith('.npz'):
+            self.runtime = 'numpy'
+        else:
+            self.runtime = 'keras'
+        logger.info("📊 Detected model type: %s (%s)", self.model_type.upper(), self.runtime)
+
+        with open(load_path, 'rb') as f:
+            self.version = content_hash(f.read())[:12]
+
+        # Load model (TensorFlow is only imported for Keras models)
+        if self.runtime == 'keras':
+            from tensorflow.keras.models import load_model
+            self.model = load_model(load_path, compile=False)
+        elif self.runtime == 'numpy':
+            from numpy_model import NumpyModel
+            self.model = NumpyModel.load(load_path)
+        else:  # RF
+            self.model = joblib.load(load_path)
+
+        # Load scaler if provided
+        if scaler_path and os.path.exists(scaler_path):
+            self.scaler = joblib.load(scaler_path)
+            logger.info("✅ Loaded scaler from: %s", scaler_path)
+        else:
+            self.scaler = None
+            logger.warning("⚠️  No scaler loaded")
+
+        # Micro-batching of concurrent predictions
+        self.batcher = None
+        if max_batch_size and max_batch_size > 1:
+            self.batcher = MicroBatcher(
+                self.predict_proba,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_batch_wait_ms,
+                name=f"{name}-{self.model_type}"
+            )
+            logger.info("   Batching: up to %d inputs / %s ms", max_batch_size, max_batch_wait_ms)
+
+    def preprocess(self, features):
+        """Prepare a (26,) feature vector or an (N, 26) batch for this model."""
+        features_2d = np.asarray(features).reshape(-1, N_FEATURES)
+        if self.model_type == 'cnn':
+            # Reshape for CNN: (N, 13, 2, 1)
+            return features_2d.reshape(-1, N_FEATURES // 2, 2, 1)
+        else:  # RF
+            if self.scaler:
+                with STAGE_SECONDS.time(stage='scaler'):
+                    return self.scaler.transform(features_2d)
+            return features_2d
+
+    def predict_proba(self, model_input):
+        """Run the model on a batch of preprocessed inputs."""
+        if self.model_type == 'cnn':
+            return self.model.predict(model_input, verbose=0)
+        else:  # RF
+            return self.model.predict_proba(model_input)
+
+    def run(self, model_input):
+        """Predict, sharing the model call with concurrent requests when batching."""
+        with STAGE_SECONDS.time(stage='predict'):
+            if self.batcher is not None:
+                return self.batcher.predict(model_input)
+            return self.predict_proba(model_input)
+
+    def decide(self, model_input):
+        """run(), plus the stage that decided each row (None: a single model decides everything)."""
+        return self.run(model_input), None
+
+    def warmup(self):
+        self.predict_proba(self.preprocess(np.zeros(N_FEATURES, dtype=np.float32)))
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'model_type': self.model_type,
+            'runtime': self.runtime,
+            'model_path': self.model_path,
+            'source_path': self.source_path,
+            'scaler_path': self.scaler_path
+        }
+
+
+class CascadeModel:
+    """
+    Early-exit cascade of two registered models on the same features.
+
+    The fast model (typically scaler + RF) scores every row; only rows whose
+    danger probability falls inside ``band`` (inclusive) go on to the full
+    model (the CNN), whose probabilities then replace the fast ones.  Both
+    models are looked up in the registry on every call, so a hot reload of
+    either takes effect immediately.
+    """
+
+    model_type = 'cascade'
+    runtime = 'cascade'
+    batcher = None
+    model_path = None
+
+    def __init__(self, name, registry, fast, full, band=(0.2, 0.8)):
+        self.name = name
+        self.registry = registry
+        self.fast = fast
+        self.full = full
+        self.band = (float(band[0]), float(band[1]))
+
+    @property
+    def version(self):
+        return f"{self.registry.get(self.fast).version}+{self.registry.get(self.full).version}"
+
+    def preprocess(self, features):
+        # Each stage preprocesses the raw features its own way
+        return np.asarray(features, dtype=np.float32).reshape(-1, N_FEATURES)
+
+    def decide(self, features):
+        """Return (prediction_proba, stage per row: 'fast' or 'full')."""
+        fast = self.registry.get(self.fast)
+        proba = np.array(fast.run(fast.preprocess(features)), dtype=np.float32)
+        danger = proba[:, 0]
+        uncertain = np.flatnonzero((danger >= self.band[0]) & (danger <= self.band[1]))
+
+        if len(uncertain):
+            full = self.registry.get(self.full)
+            proba[uncertain] = full.run(full.preprocess(features[uncertain]))
+
+        CASCADE_ROWS.inc(len(proba) - len(uncertain), stage='fast')
+        if len(uncertain):
+            CASCADE_ROWS.inc(len(uncertain), stage='full')
+        stages = np.full(len(proba), 'fast', dtype=object)
+        stages[uncertain] = 'full'
+        return proba, list(stages)
+
+    def run(self, features):
+        return self.decide(features)[0]
+
+    def predict_proba(self, features):
+        return self.run(features)
+
+    def close(self):
+        pass
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'model_type': self.model_type,
+            'fast': self.fast,
+            'full': self.full,
+            'band': list(self.band)
+        }
+
+
+class ModelRegistry:
+    """
+    Named models with atomic replacement and primary/candidate routing.
+
+    route() picks the model that serves a request: the candidate for
+    ``candidate_share`` of the traffic, the primary otherwise.  With
+    ``shadow`` enabled, requests served by the primary are also scored by
+    the candidate in the background and only the agreement is recorded.
+
+    watch() polls the model and scaler files and reloads a model whose files
+    changed.  The new version is loaded and warmed up next to the old one
+    and then swapped in under the lock, so requests never wait on a load;
+    requests already holding the old version finish on it, and its batcher
+    is closed after ``retire_after`` seconds.
+    """
+
+    def __init__(self, max_batch_size=None, max_batch_wait_ms=10.0, retire_after=30.0):
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait_ms = max_batch_wait_ms
+        self.retire_after = retire_after
+        self.primary_name = None
+        self.candidate_name = None
+        self.candidate_share = 0.0
+        self.shadow = False
+        self._models = {}
+        self._failed = {}
+        self._on_swap = []
+        self._lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(1, thread_name_prefix='shadow')
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def load(self, name, model_path, scaler_path=None, warmup=True, source_path=None):
+        """Load (or replace) the model registered under name and return it; see LoadedModel for source_path."""
+        model = LoadedModel(name, model_path, scaler_path, self.max_batch_size, self.max_batch_wait_ms, source_path)
+        if warmup:
+            model.warmup()
+        with self._lock:
+            old = self._models.get(name)
+            self._models[name] = model
+            if self.primary_name is None:
+                self.primary_name = name
+        if old is not None:
+            logger.info("🔄 Model %s: %s -> %s", name, old.version, model.version)
+            self._retire(old)
+            for callback in self._on_swap:
+                callback(name, model)
+        return model
+
+    def add_cascade(self, name, fast, full, band=(0.2, 0.8)):
+        """Register a CascadeModel over two loaded models and return it."""
+        with self._lock:
+            for model in (fast, full):
+                if model not in self._models:
+                    raise KeyError(f"Unknown model: {model}")
+            cascade = self._models[name] = CascadeModel(name, self, fast, full, band)
+        return cascade
+
+    def configure(self, primary=None, candidate=None, candidate_share=0.0, shadow=False):
+        """Set routing; candidate_share is the fraction of requests served by the candidate."""
+        with self._lock:
+            for name in (primary, candidate):
+                if name is not None and name not in self._models:
+                    raise KeyError(f"Unknown model: {name}")
+            if primary is not None:
+                self.primary_name = primary
+            self.candidate_name = candidate
+            self.candidate_share = min(max(float(candidate_share), 0.0), 1.0) if candidate else 0.0
+            self.shadow = bool(shadow and candidate)
+
+    def on_swap(self, callback):
+        """Call callback(name, model) after a model was replaced."""
+        self._on_swap.append(callback)
+
+    def get(self, name):
+        return self._models[name]
+
+    @property
+    def primary(self):
+        return self._models[self.primary_name]
+
+    def route(self):
+        """Return (model serving this request, shadow model or None)."""
+        with self._lock:
+            primary = self._models[self.primary_name]
+            candidate = self._models.get(self.candidate_name) if self.candidate_name else None
+            share = self.candidate_share
+            shadow = self.shadow
+        if candidate is None:
+            return primary, None
+        if share > 0 and random.random() < share:
+            return candidate, None
+        return primary, candidate if shadow else None
+
+    def record(self, served, features, proba, shadow=None):
+        """Count served rows and score the shadow model on the same features in the background."""
+        MODEL_PREDICTIONS.inc(len(proba), model=served.name, role='served')
+        if shadow is not None:
+            self._shadow_pool.submit(self._score_shadow, shadow, features, np.asarray(proba))
+
+    def _score_shadow(self, shadow, features, served_proba):
+        try:
+            shadow_proba = shadow.run(shadow.preprocess(features))
+        except Exception as e:
+            logger.warning("⚠️  Shadow model %s failed: %s", shadow.name, e)
+            ERRORS.inc(stage='shadow')
+            return
+        MODEL_PREDICTIONS.inc(len(shadow_proba), model=shadow.name, role='shadow')
+        disagreements = int(np.sum(np.argmax(shadow_proba, axis=1) != np.argmax(served_proba, axis=1)))
+        if disagreements:
+            SHADOW_DISAGREEMENTS.inc(disagreements, model=shadow.name)
+
+    def reload_changed(self):
+        """Reload every model whose model, scaler or source .h5 changed; returns the reloaded names."""
+        reloaded = []
+        for name, model in list(self._models.items()):
+            if model.model_path is None:  # cascades reload through their stages
+                continue
+            signature = (_file_signature(model.model_path), _file_signature(model.scaler_path),
+                         _file_signature(model.source_path))
+            if signature == model.signature or (signature[0] is None and signature[2] is None) or \
+                    self._failed.get(name) == signature:
+                continue
+            try:
+                self.load(name, model.model_path, model.scaler_path, source_path=model.source_path)
+            except Exception as e:
+                # Keep serving the old version until the file changes again
+                logger.error("❌ Failed to reload model %s: %s", name, e)
+                self._failed[name] = signature
+                MODEL_RELOADS.inc(model=name, outcome='error')
+                continue
+            self._failed.pop(name, None)
+            MODEL_RELOADS.inc(model=name, outcome='success')
+            reloaded.append(name)
+        return reloaded
+
+    def watch(self, interval=5.0):
+        """Start a daemon thread calling reload_changed() every interval seconds."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def poll():
+            while not self._stop.wait(interval):
+                self.reload_changed()
+
+        self._watcher = threading.Thread(target=poll, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def _retire(self, model):
+        timer = threading.Timer(self.retire_after, model.close)
+        timer.daemon = True
+        timer.start()
+
+    def describe(self):
+        with self._lock:
+            return {
+                'primary': self.primary_name,
+                'candidate': self.candidate_name,
+                'candidate_share': self.candidate_share,
+                'shadow': self.shadow,
+                'models': [model.describe() for model in self._models.values()]
+            }
+
+    def close(self):
+        self._stop.set()
+        self._shadow_pool.shutdown(wait=False)
+        for model in self._models.values():
+            model.close()
@@ -0,0 +1,381 @@
+"""
+Bulk-score a directory or manifest of recordings with AudioProcessor.
+
+    python score.py /data/incidents -o scores.csv
+    python score.py manifest.txt -o scores.jsonl --workers 8 --batch-size 1024
+    python score.py /data/incidents -o scores.parquet --model modals/audio_danger_detection_cnn.h5
+
+Files are read and decoded in a process pool, featurized in vectorized
+batches (BatchMFCC) and predicted with one model call per batch.  Results
+are streamed to CSV, JSONL or Parquet in input order, and a checkpoint next
+to the output records how many inputs are done: re-running the same command
+resumes where it stopped (--restart starts over).  Parquet output resumes
+into numbered part files next to the first one.
+
+--store DIR also records every clip's features in a FeatureStore, and
+--from-store scores such a store instead of audio files, skipping decoding
+and MFCC extraction entirely:
+
+    python score.py /data/incidents -o scores.csv --store features/
+    python score.py features/ --from-store -o rescored.csv --model modals/new_model.h5
+
+A manifest is a text file with one path per line, or a CSV with a `path`
+column; relative paths are resolved against the manifest's directory.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Same extensions /upload accepts
+AUDIO_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac', 'm4a', '3gpp', '3gp', 'amr', 'aac', 'mp4'}
+
+COLUMNS = ['path', 'status', 'class_label', 'is_danger', 'prediction', 'confidence', 'danger_probability',
+           'safe_probability', 'decoder', 'bytes', 'error', 'key']
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modals')
+
+# Per-process decode settings for the pool workers
+_target_sr = None
+_duration = None
+
+
+def _init_worker(target_sr, duration):
+    global _target_sr, _duration
+    from transcoder import init_transcoder
+    _target_sr, _duration = target_sr, duration
+    # Each worker decodes one file at a time, so one ffmpeg process is enough
+    init_transcoder(workers=1, max_queue=0, target_sr=target_sr)
+
+
+def _decode_file(path):
+    """Read and decode one file in a pool worker; returns (path, audio or None, decoder, size, error)."""
+    from decoding import decode_audio, DecodeError
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return path, None, None, 0, str(e)
+
+    try:
+        audio, method = decode_audio(data, _target_sr, max_duration=_duration)
+    except DecodeError as e:
+        # Same last resort as AudioProcessor.extract_features
+        try:
+            import librosa
+            audio, _ = librosa.load(path, sr=_target_sr, duration=_duration, mono=True)
+            method = 'librosa'
+        except Exception:
+            return path, None, None, len(data), str(e)
+    except Exception as e:
+        return path, None, None, len(data), str(e)
+
+    target_length = int(_target_sr * _duration)
+    if len(audio) < target_length:
+        audio = np.pad(audio, (0, target_length - len(audio)), mode='constant')
+    return path, np.ascontiguousarray(audio[:target_length], dtype=np.float32), method, len(data), None
+
+
+def _process_context():
+    # The parent may hold TensorFlow's thread pools, so never fork it directly
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def collect_inputs(source):
+    """Sorted audio files under a directory, or the paths listed in a manifest."""
+    if os.path.isdir(source):
+        paths = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if '.' in name and name.rsplit('.', 1)[1].lower() in AUDIO_EXTENSIONS:
+                    paths.append(os.path.join(root, name))
+        return paths
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline='') as f:
+        if source.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            column = 'path' if 'path' in (reader.fieldnames or []) else reader.fieldnames[0]
+            entries = [row[column] for row in reader]
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [entry if os.path.isabs(entry) else os.path.join(base, entry) for entry in entries]
+
+
+class Checkpoint:
+    """Progress record next to the output, rewritten atomically after every batch."""
+
+    def __init__(self, path, inputs_digest, total):
+        self.path = path
+        self.state = {'inputs': inputs_digest, 'total': total, 'done': 0, 'offset': 0, 'parts': 0}
+
+    def load(self):
+        """Return True if a checkpoint for the same inputs was found."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get('inputs') != self.state['inputs']:
+            raise SystemExit(f"❌ {self.path} belongs to a different input list; use --restart to start over")
+        self.state = state
+        return True
+
+    def save(self, done, offset):
+        self.state.update(done=done, offset=offset)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CsvWriter:
+    def __init__(self, path, offset=0):
+        resume = offset > 0 and os.path.exists(path)
+        self.file = open(path, 'r+' if resume else 'w', newline='', encoding='utf-8')
+        if resume:
+            # Drop rows written after the last checkpoint
+            self.file.seek(offset)
+            self.file.truncate()
+        self.writer = csv.DictWriter(self.file, COLUMNS)
+        if not resume:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        """Flush to disk and return the resume offset."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter(CsvWriter):
+    def __init__(self, path, offset=0):
+        resume = offset > 0 and os.path.exists(path)
+        self.file = open(path, 'r+' if resume else 'w', encoding='utf-8')
+        if resume:
+            self.file.seek(offset)
+            self.file.truncate()
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+
+class ParquetWriter:
+    """Parquet output; a resumed run writes its rows to a new numbered part file."""
+
+    def __init__(self, path, part=0):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet output needs pyarrow (pip install pyarrow)")
+        self.pa = pa
+        if part:
+            stem, ext = os.path.splitext(path)
+            path = f"{stem}.part{part}{ext}"
+        self.path = path
+        self.schema = pa.schema([
+            ('path', pa.string()), ('status', pa.string()), ('class_label', pa.string()),
+            ('is_danger', pa.int8()), ('prediction', pa.int8()), ('confidence', pa.float32()),
+            ('danger_probability', pa.float32()), ('safe_probability', pa.float32()),
+            ('decoder', pa.string()), ('bytes', pa.int64()), ('error', pa.string()), ('key', pa.string())
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if rows:
+            self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def flush(self):
+        # Row groups are complete once written; resuming starts a new part
+        return 0
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, fmt, checkpoint):
+    if fmt == 'csv':
+        return CsvWriter(path, checkpoint.state['offset'])
+    if fmt == 'jsonl':
+        return JsonlWriter(path, checkpoint.state['offset'])
+    if checkpoint.state['done']:
+        checkpoint.state['parts'] += 1
+    return ParquetWriter(path, checkpoint.state['parts'])
+
+
+def score_batch(processor, batch, store=None):
+    """Featurize and predict the decoded items of a batch; returns output rows in input order."""
+    from cache import content_hash
+    decoded = [item for item in batch if item[1] is not None]
+    results = {}
+    keys = {path: content_hash(audio) for path, audio, _, _, _ in decoded}
+    if decoded:
+        features = processor.extract_features_batch(np.stack([audio for _, audio, _, _, _ in decoded]))
+        for (path, _, _, _, _), result in zip(decoded, processor.predict_features_batch(features)):
+            results[path] = result
+        if store is not None:
+            store.append([
+                {'key': keys[path], 'features': vector,
+                 'meta': {'filename': path, 'source': 'score', 'decoder': method, 'bytes': size}}
+                for (path, _, method, size, _), vector in zip(decoded, features)
+            ])
+
+    rows = []
+    for path, _, method, size, error in batch:
+        row = dict.fromkeys(COLUMNS)
+        row.update(path=path, decoder=method, bytes=size, key=keys.get(path))
+        if path in results:
+            result = results[path]
+            row.update({key: result[key] for key in ('status', 'class_label', 'is_danger', 'prediction',
+                                                      'confidence', 'danger_probability', 'safe_probability')})
+        else:
+            row.update(status='error', error=error)
+        rows.append(row)
+    return rows
+
+
+def score_store_batch(processor, keys, features, meta):
+    """Predict a batch of stored feature vectors; returns output rows."""
+    rows = []
+    for key, info, result in zip(keys, meta, processor.predict_features_batch(np.asarray(features))):
+        row = dict.fromkeys(COLUMNS)
+        row.update({column: result[column] for column in ('status', 'class_label', 'is_danger', 'prediction',
+                                                           'confidence', 'danger_probability', 'safe_probability')})
+        row.update(path=info.get('filename'), decoder='feature_store', bytes=info.get('bytes'), key=key)
+        rows.append(row)
+    return rows
+
+
+def decoded_batches(processor, pending, args, store=None):
+    """Decode files in a process pool and yield scored rows, one batch at a time."""
+    ctx = _process_context()
+    with ctx.Pool(args.workers, initializer=_init_worker,
+                  initargs=(processor.target_sr, processor.duration)) as pool:
+        # Ordered results keep the output and the checkpoint in input order
+        decoded = pool.imap(_decode_file, pending, chunksize=max(1, min(64, args.batch_size // (4 * args.workers))))
+        batch = []
+        for item in decoded:
+            batch.append(item)
+            if len(batch) == args.batch_size:
+                yield score_batch(processor, batch, store)
+                batch = []
+        if batch:
+            yield score_batch(processor, batch, store)
+
+
+def default_model_path():
+    npz = os.path.join(MODEL_DIR, 'audio_danger_detection_cnn.npz')
+    return npz if os.path.exists(npz) else os.path.join(MODEL_DIR, 'audio_danger_detection_cnn.h5')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of recordings")
+    parser.add_argument('source', help="Directory to walk, a manifest (.txt/.csv), or a feature store with --from-store")
+    parser.add_argument('-o', '--output', required=True, help="Results file (.csv, .jsonl or .parquet)")
+    parser.add_argument('--format', choices=['csv', 'jsonl', 'parquet'], help="Output format (default: from extension)")
+    parser.add_argument('--model', default=default_model_path(), help="Model (.npz, .h5 or .pkl)")
+    parser.add_argument('--scaler', default=os.path.join(MODEL_DIR, 'feature_scaler.pkl'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Decode processes")
+    parser.add_argument('--batch-size', type=int, default=512, help="Clips per featurize/predict batch")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--store', help="Also record the extracted features in this feature store")
+    parser.add_argument('--from-store', action='store_true', help="Score the feature vectors of a feature store")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Only log warnings and errors")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format='%(asctime)s - %(message)s')
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if fmt not in ('csv', 'jsonl', 'parquet'):
+        parser.error("Cannot tell the output format from the extension; pass --format")
+
+    from featurestore import FeatureStore
+    if args.from_store:
+        source_store = FeatureStore(args.source)
+        # Segments are immutable and named in write order, so their names identify the inputs
+        segments = source_store.segments()
+        # Row numbers stand in for paths, one per key (see FeatureStore.iter_batches)
+        paths = range(len({key for segment in segments for key in segment.keys.tolist()}))
+        digest = hashlib.sha256('\n'.join(os.path.basename(seg.path) for seg in segments).encode('utf-8')).hexdigest()
+        if not paths:
+            parser.error(f"Feature store {args.source} is empty")
+    else:
+        paths = collect_inputs(args.source)
+        if not paths:
+            parser.error(f"No audio files found in {args.source}")
+        digest = hashlib.sha256('\n'.join(paths).encode('utf-8')).hexdigest()
+
+    checkpoint = Checkpoint(args.output + '.checkpoint', digest, len(paths))
+    if args.restart:
+        checkpoint.remove()
+    elif checkpoint.load():
+        if checkpoint.state['done'] >= len(paths):
+            logger.info(f"✅ All {len(paths)} files already scored in {args.output} (use --restart to re-score)")
+            return
+        logger.info(f"🔄 Resuming after {checkpoint.state['done']}/{len(paths)} files")
+
+    from audio_processor import AudioProcessor
+    scaler = args.scaler if os.path.exists(args.scaler) else None
+    processor = AudioProcessor(args.model, scaler, max_batch_size=None)
+
+    done = checkpoint.state['done']
+    pending = paths[done:]
+    writer = open_writer(args.output, fmt, checkpoint)
+
+    if args.from_store:
+        logger.info(f"🚀 Scoring {len(pending)} stored feature vectors, batches of {args.batch_size}")
+        batches = (score_store_batch(processor, *batch)
+                   for batch in source_store.iter_batches(args.batch_size, start=done))
+    else:
+        store = FeatureStore(args.store) if args.store else None
+        logger.info(f"🚀 Scoring {len(pending)} files with {args.workers} decode workers, batches of {args.batch_size}")
+        batches = decoded_batches(processor, pending, args, store)
+
+    start = time.perf_counter()
+    scored = errors = total_bytes = 0
+    try:
+        for rows in batches:
+            writer.write(rows)
+            scored += len(rows)
+            errors += sum(row['status'] != 'success' for row in rows)
+            total_bytes += sum(row['bytes'] or 0 for row in rows)
+            checkpoint.save(done + scored, writer.flush())
+
+            elapsed = time.perf_counter() - start
+            rate = scored / elapsed
+            logger.info(f"📊 {done + scored}/{len(paths)} files  {rate:.1f} files/s  "
+                        f"{total_bytes / elapsed / 2 ** 20:.1f} MB/s  {errors} errors  "
+                        f"ETA {(len(pending) - scored) / rate:.0f}s")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"✅ Scored {scored} files in {elapsed:.1f}s ({scored / elapsed if elapsed else 0:.1f} files/s), "
+                f"{errors} errors, results in {args.output}")
+    sys.exit(1 if errors and errors == scored else 0)
+
+
+if __name__ == '__main__':
+    main()
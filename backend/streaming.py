@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from wavio import StreamingResampler
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalFeaturizer:
+    """
+    Sliding-window MFCC features over a PCM stream.
+
+    Log-mel frames are computed once, as samples arrive, and kept for the
+    last window; every ``hop_seconds`` a window's MFCC mean/std vector is
+    derived from the stored frames.  Frames are not centre-padded (the stream
+    has no edges), so scores can differ slightly from the same audio posted
+    to /upload as a 4 s clip.
+    """
+
+    def __init__(self, batch_mfcc, window_seconds=4.0, hop_seconds=0.5):
+        self.mfcc = batch_mfcc
+        self.sr = batch_mfcc.sr
+        self.hop_length = batch_mfcc.hop_length
+        self.window_frames = 1 + int(self.sr * window_seconds) // self.hop_length
+        self.hop_frames = max(1, int(round(hop_seconds * self.sr / self.hop_length)))
+
+        self.frames_seen = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._history = np.zeros((0, batch_mfcc.n_mels), dtype=np.float32)
+
+    def push(self, samples):
+        """
+        Add samples at the featurizer rate.
+
+        Returns (end_times, features): the end time in seconds of every window
+        completed by these samples and its (2 * n_mfcc,) feature vector.
+        """
+        samples = np.concatenate([self._pending, np.asarray(samples, dtype=np.float32)])
+        n_fft = self.mfcc.n_fft
+        n_new = 0 if len(samples) < n_fft else 1 + (len(samples) - n_fft) // self.hop_length
+        self._pending = samples[n_new * self.hop_length:]
+
+        if n_new == 0:
+            return [], np.zeros((0, 2 * self.mfcc.n_mfcc), dtype=np.float32)
+
+        frames = sliding_window_view(samples, n_fft)[::self.hop_length][:n_new]
+        log_mel = np.concatenate([self._history, self.mfcc.log_mel(frames)])
+
+        # Global index of every frame that closes a window on the hop grid
+        first = self.frames_seen - len(self._history)
+        ends = np.arange(self.frames_seen, self.frames_seen + n_new)
+        ends = ends[(ends >= self.window_frames - 1) &
+                    ((ends - (self.window_frames - 1)) % self.hop_frames == 0)]
+
+        self.frames_seen += n_new
+        self._history = log_mel[-(self.window_frames - 1):]
+
+        if len(ends) == 0:
+            return [], np.zeros((0, 2 * self.mfcc.n_mfcc), dtype=np.float32)
+
+        windows = np.stack([log_mel[e - first - self.window_frames + 1:e - first + 1] for e in ends])
+        mfccs = self.mfcc.mfcc_from_log_mel(windows)
+        features = np.hstack([mfccs.mean(axis=1), mfccs.std(axis=1)])
+        features = np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0)
+
+        end_times = [float((e * self.hop_length + n_fft) / self.sr) for e in ends]
+        return end_times, features
+
+
+class StreamSession:
+    """One client's detection stream: s16le PCM in, per-window danger scores out."""
+
+    def __init__(self, processor, sample_rate=22050, hop_seconds=0.5, threshold=0.5):
+        self.id = uuid.uuid4().hex
+        self.processor = processor
+        self.sample_rate = int(sample_rate)
+        self.threshold = float(threshold)
+        self.featurizer = IncrementalFeaturizer(processor.batch_mfcc, processor.duration, hop_seconds)
+        self.resampler = StreamingResampler(self.sample_rate, self.featurizer.sr)
+
+        self.lock = threading.Lock()
+        self.created = time.time()
+        self.last_seen = self.created
+        self.windows_scored = 0
+        self.max_danger = 0.0
+        self.alerted_at = None
+        self._odd_byte = b''
+
+    def push_pcm(self, chunk):
+        """Feed raw little-endian int16 mono bytes; returns the window events produced."""
+        self.last_seen = time.time()
+
+        chunk = self._odd_byte + bytes(chunk)
+        usable = len(chunk) - len(chunk) % 2
+        self._odd_byte = chunk[usable:]
+        if usable == 0:
+            return []
+
+        samples = np.frombuffer(chunk[:usable], dtype='<i2').astype(np.float32) / 32768.0
+        samples = self.resampler.push(samples)
+
+        end_times, features = self.featurizer.push(samples)
+        if not end_times:
+            return []
+
+        events = []
+        for end, result in zip(end_times, self.processor.predict_features_batch(features)):
+            danger = result['danger_probability']
+            event = {
+                'window_start': round(max(end - self.processor.duration, 0.0), 3),
+                'window_end': round(end, 3),
+                'danger_probability': danger,
+                'is_danger': int(danger >= self.threshold),
+                'class_label': result['class_label']
+            }
+            if event['is_danger'] and self.alerted_at is None:
+                self.alerted_at = end
+                event['alert'] = True
+                logger.warning(f"🚨 Stream {self.id[:8]}: danger {danger:.2f} at {end:.1f}s")
+
+            self.max_danger = max(self.max_danger, danger)
+            self.windows_scored += 1
+            events.append(event)
+
+        return events
+
+    def summary(self):
+        return {
+            'session_id': self.id,
+            'sample_rate': self.sample_rate,
+            'threshold': self.threshold,
+            'seconds_received': round(self.featurizer.frames_seen * self.featurizer.hop_length / self.featurizer.sr, 3),
+            'windows_scored': self.windows_scored,
+            'max_danger_probability': self.max_danger,
+            'alerted_at': self.alerted_at
+        }
+
+
+class StreamSessionStore:
+    """Open stream sessions, expired after ttl seconds without data."""
+
+    def __init__(self, ttl=60, max_sessions=1000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, processor, **kwargs):
+        session = StreamSession(processor, **kwargs)
+        with self._lock:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise OverflowError("Too many open stream sessions")
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for session_id in [k for k, v in self._sessions.items() if v.last_seen < cutoff]:
+            del self._sessions[session_id]
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class Clients:
+    """Requests on their own threads, recording the order they are admitted or shed in."""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.log = []
+        self.threads = []
+
+    def arrive(self, name, priority, queued=True):
+        """Start a request; with queued, return once it waits for a slot."""
+        # Displacing a waiter leaves the waiting count as it was, but every
+        # queued request adds a heap entry (popped only when a slot frees up)
+        queued_before = len(self.controller._heap)
+
+        def run():
+            try:
+                with self.controller.admit(priority):
+                    self.log.append(name)
+            except AdmissionRejected:
+                self.log.append(f'{name} shed')
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        if queued:
+            wait_until(lambda: len(self.controller._heap) > queued_before)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+
+
+@pytest.fixture
+def held():
+    """An AdmissionController factory whose single slot is held until release() is called."""
+    slots = []
+
+    def make(**kwargs):
+        controller = AdmissionController(max_active=1, **kwargs)
+        slot = controller.admit('normal')
+        slot.__enter__()
+        slots.append(slot)
+        return controller, lambda: slot.__exit__(None, None, None)
+
+    yield make
+
+
+def test_waiters_are_admitted_by_priority_then_arrival(held):
+    controller, release = held(max_queue=8, max_wait=5)
+    clients = Clients(controller)
+    for name, priority in [('b1', 'background'), ('n1', 'normal'), ('e1', 'emergency'), ('n2', 'normal')]:
+        clients.arrive(name, priority)
+    release()
+    clients.join()
+    assert clients.log == ['e1', 'n1', 'n2', 'b1']
+    assert controller.active == 0 and controller.waiting == 0
+
+
+def test_full_queue_sheds_the_newest_less_urgent_waiter(held):
+    controller, release = held(max_queue=2, max_wait=5)
+    clients = Clients(controller)
+    clients.arrive('b1', 'background')
+    clients.arrive('n1', 'normal')
+    clients.arrive('n2', 'normal')  # displaces b1
+    clients.arrive('n3', 'normal', queued=False)  # nothing less urgent to displace
+    wait_until(lambda: 'n3 shed' in clients.log)
+    clients.arrive('e1', 'emergency')  # displaces n2, the newest normal
+    wait_until(lambda: len(clients.log) == 3)
+    assert sorted(clients.log) == ['b1 shed', 'n2 shed', 'n3 shed']
+    release()
+    clients.join()
+    assert clients.log[3:] == ['e1', 'n1']
+
+
+def test_waiter_gives_up_after_max_wait(held):
+    controller, release = held(max_queue=8, max_wait=0.05)
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit('emergency'):
+            pass
+    assert rejected.value.retry_after >= 1
+    assert controller.waiting == 0
+    release()
+    assert controller.active == 0
+
+
+def test_free_slots_admit_at_once():
+    controller = AdmissionController(max_active=2, max_queue=0, max_wait=5)
+    with controller.admit('background'), controller.admit('unknown-priority'):
+        assert controller.active == 2
+        with pytest.raises(AdmissionRejected):
+            with controller.admit('emergency'):
+                pass
+    assert controller.active == 0
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+class RecordingModel:
+    """Returns each row's sum as its 'probability' and records the batch sizes."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, inputs):
+        self.batches.append(len(inputs))
+        return inputs.sum(axis=1, keepdims=True)
+
+
+def test_full_batch_is_flushed_and_split_back_per_caller():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=60_000)
+    try:
+        inputs = [np.full((n, 3), i, dtype=np.float32) for i, n in enumerate([1, 2, 1])]
+        futures = [batcher.submit(x) for x in inputs]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        batcher.close()
+
+    assert model.batches == [4]  # the size cap closed the batch, not the 60 s wait
+    assert [r.shape for r in results] == [(1, 1), (2, 1), (1, 1)]
+    np.testing.assert_array_equal(np.concatenate(results)[:, 0], [0, 3, 3, 6])
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=32, max_wait_ms=5)
+    try:
+        result = batcher.predict(np.ones((2, 3), dtype=np.float32), timeout=5)
+    finally:
+        batcher.close()
+    np.testing.assert_array_equal(result[:, 0], [3, 3])
+    assert model.batches == [2]
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    def failing(inputs):
+        raise ValueError("bad input")
+
+    batcher = MicroBatcher(failing, max_batch_size=2, max_wait_ms=60_000)
+    try:
+        futures = [batcher.submit(np.zeros((1, 3))) for _ in range(2)]
+        for future in futures:
+            with pytest.raises(ValueError, match="bad input"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+
+def test_close_serves_queued_inputs_then_rejects_new_ones():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=32, max_wait_ms=60_000)
+    future = batcher.submit(np.ones((1, 3)))
+    batcher.close(timeout=5)
+    assert future.result(timeout=0)[0, 0] == 3
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.ones((1, 3)))
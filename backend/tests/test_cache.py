@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import cache
+from cache import LRUCache, ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic() for the cache module."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    lru = LRUCache(max_entries=2, ttl=60)
+    lru.put('a', 1)
+    lru.put('b', 2)
+    assert lru.get('a') == 1  # a is now the most recently used
+    lru.put('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+    assert lru.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    lru = LRUCache(max_entries=8, ttl=60)
+    lru.put('a', 1)
+    clock[0] += 60
+    assert lru.get('a') == 1
+    clock[0] += 0.001
+    assert lru.get('a') is None
+    assert len(lru) == 0
+    assert (lru.hits, lru.misses) == (1, 1)
+
+
+def test_put_refreshes_ttl(clock):
+    lru = LRUCache(max_entries=8, ttl=60)
+    lru.put('a', 1)
+    clock[0] += 50
+    lru.put('a', 2)
+    clock[0] += 50
+    assert lru.get('a') == 2
+
+
+def test_zero_entries_disables_the_cache(clock):
+    lru = LRUCache(max_entries=0, ttl=60)
+    lru.put('a', 1)
+    assert lru.get('a') is None and len(lru) == 0
+
+
+def test_result_cache_levels_and_variants(clock):
+    results = ResultCache(max_entries=8, ttl=60)
+    audio = np.linspace(-1, 1, 1000, dtype=np.float32)
+    analysis = {'danger_probability': 0.9}
+
+    bytes_key, hit = results.lookup_bytes(b'RIFF...')
+    pcm_key, _ = results.lookup_pcm(audio)
+    assert hit is None
+    results.store(analysis, bytes_key=bytes_key, pcm_key=pcm_key)
+
+    assert results.lookup_bytes(b'RIFF...')[1] is analysis
+    # The same samples from another container hit the PCM level
+    assert results.lookup_pcm(audio.copy())[1] is analysis
+    assert results.lookup_pcm(audio * 0.5)[1] is None
+    # Other analysis options do not share entries
+    assert results.lookup_bytes(b'RIFF...', variant='full:1.0')[1] is None
+    assert results.lookup_pcm(audio, variant='full:1.0')[1] is None
+
+    clock[0] += 61
+    assert results.lookup_bytes(b'RIFF...')[1] is None
+    assert results.lookup_pcm(audio)[1] is None
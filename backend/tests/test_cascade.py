@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from registry import ModelRegistry, N_FEATURES
+
+
+class StubModel:
+    """A registered model whose danger probability is the first feature, or a constant."""
+
+    def __init__(self, version, danger=None):
+        self.version = version
+        self.danger = danger
+        self.rows_seen = []
+
+    def preprocess(self, features):
+        return np.asarray(features, dtype=np.float32).reshape(-1, N_FEATURES)
+
+    def run(self, model_input):
+        self.rows_seen.append(model_input[:, 0].tolist())
+        danger = model_input[:, 0] if self.danger is None else np.full(len(model_input), self.danger)
+        return np.stack([danger, 1 - danger], axis=1)
+
+
+@pytest.fixture
+def registry():
+    registry = ModelRegistry()
+    registry._models.update(fast=StubModel('f1'), full=StubModel('c1', danger=0.95))
+    registry.add_cascade('cascade', 'fast', 'full', band=(0.25, 0.75))
+    return registry
+
+
+def features(*dangers):
+    rows = np.zeros((len(dangers), N_FEATURES), dtype=np.float32)
+    rows[:, 0] = dangers
+    return rows
+
+
+def test_only_rows_inside_the_band_escalate(registry):
+    proba, stages = registry.get('cascade').decide(features(0.05, 0.25, 0.5, 0.75, 0.95))
+    # The band is inclusive at both ends (edges exact in float32)
+    assert stages == ['fast', 'full', 'full', 'full', 'fast']
+    assert registry.get('full').rows_seen == [[0.25, 0.5, 0.75]]
+    np.testing.assert_allclose(proba[:, 0], [0.05, 0.95, 0.95, 0.95, 0.95])
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0)
+
+
+def test_confident_batches_never_reach_the_full_model(registry):
+    _, stages = registry.get('cascade').decide(features(0.0, 0.1, 0.9, 1.0))
+    assert stages == ['fast'] * 4
+    assert registry.get('full').rows_seen == []
+
+
+def test_stages_are_looked_up_on_every_call(registry):
+    cascade = registry.get('cascade')
+    assert cascade.version == 'f1+c1'
+    registry._models['full'] = StubModel('c2', danger=0.4)  # what a hot reload does
+    assert cascade.version == 'f1+c2'
+    np.testing.assert_allclose(cascade.run(features(0.5))[:, 0], [0.4])
+
+
+def test_cascade_needs_registered_stages(registry):
+    with pytest.raises(KeyError):
+        registry.add_cascade('broken', 'fast', 'missing')
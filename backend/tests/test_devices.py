@@ -0,0 +1,71 @@
+import numpy as np
+
+from devices import DeviceSession
+from mfcc import BatchMFCC
+
+
+class ConstantProcessor:
+    """Stands in for AudioProcessor: every window and clip scores the same."""
+
+    duration = 4.0
+
+    def __init__(self, danger=0.8):
+        self.batch_mfcc = BatchMFCC()
+        self.target_sr = self.batch_mfcc.sr
+        self.danger = danger
+
+    def predict_features_batch(self, features):
+        return [{'danger_probability': self.danger, 'class_label': 'DANGER'} for _ in features]
+
+    def predict_danger_from_audio(self, audio, sr):
+        return {'danger_probability': self.danger, 'class_label': 'DANGER'}
+
+
+def noise(seconds, seed):
+    sr = BatchMFCC().sr
+    return np.random.default_rng(seed).standard_normal(int(sr * seconds)).astype(np.float32) * 0.1
+
+
+def test_consecutive_seq_continues_the_stream():
+    session = DeviceSession('d', ConstantProcessor())
+    session.push(noise(3, 0), seq=1)
+    result = session.push(noise(3, 1), seq=2)
+    assert result['session']['contiguous']
+    assert result['session']['stream_resets'] == 0
+    assert result['windows_scored'] > 0  # windows straddle both uploads
+
+
+def test_seq_gap_resets_stream_but_keeps_average():
+    session = DeviceSession('d', ConstantProcessor())
+    session.push(noise(3, 0), seq=1)
+    rolling = session.rolling_danger
+    result = session.push(noise(3, 1), seq=5)
+    assert not result['session']['contiguous']
+    assert result['session']['stream_resets'] == 1
+    assert 'windows_scored' not in result  # 3 s on its own is not a full window
+    assert session.rolling_danger == rolling
+    assert result['session']['seconds_received'] == 6.0
+
+
+def test_start_time_gap_resets_stream():
+    session = DeviceSession('d', ConstantProcessor(), max_gap=2.0)
+    session.push(noise(3, 0), start=100.0)
+    assert session.push(noise(3, 1), start=103.5)['session']['contiguous']
+    assert not session.push(noise(3, 2), start=200.0)['session']['contiguous']
+
+
+def test_arrival_gap_resets_stream_without_client_fields():
+    session = DeviceSession('d', ConstantProcessor(), max_gap=2.0)
+    session.push(noise(3, 0))
+    assert session.push(noise(3, 1))['session']['contiguous']  # arrived right away
+    session.last_seen -= 60
+    assert not session.push(noise(3, 2))['session']['contiguous']
+
+
+def test_overlapping_upload_is_aligned_against_the_tail():
+    session = DeviceSession('d', ConstantProcessor())
+    audio = noise(6, 3)
+    sr = session.featurizer.sr
+    session.push(audio[:3 * sr])
+    result = session.push(audio[int(2.5 * sr):])
+    assert result['session']['overlap_samples'] == sr // 2
@@ -0,0 +1,31 @@
+import numpy as np
+
+from featurestore import FeatureStore
+
+
+def rows(keys):
+    return [{'key': key, 'features': np.full(26, i, dtype=np.float32), 'meta': {'name': key}}
+            for i, key in enumerate(keys)]
+
+
+def duplicated_store(root):
+    # Two writers that do not know about each other's segments
+    FeatureStore(root).append(rows(['a', 'b', 'c']))
+    FeatureStore(root).append(rows(['b', 'd', 'a', 'e']))
+    return FeatureStore(root)
+
+
+def test_iter_batches_yields_each_key_once(tmp_path):
+    store = duplicated_store(str(tmp_path))
+    batches = list(store.iter_batches(batch_size=2))
+    keys = [key for batch_keys, _, _ in batches for key in batch_keys]
+    assert keys == ['a', 'b', 'c', 'd', 'e']
+    assert [meta['name'] for _, _, batch_meta in batches for meta in batch_meta] == keys
+    np.testing.assert_array_equal(np.concatenate([features for _, features, _ in batches])[:, 0], [0, 1, 2, 1, 3])
+    assert keys == store.load()[0]
+
+
+def test_iter_batches_start_counts_unique_rows(tmp_path):
+    store = duplicated_store(str(tmp_path))
+    keys = [key for batch_keys, _, _ in store.iter_batches(batch_size=2, start=3) for key in batch_keys]
+    assert keys == ['d', 'e']
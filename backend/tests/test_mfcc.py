@@ -0,0 +1,54 @@
+import librosa
+import numpy as np
+import pytest
+
+from mfcc import BatchMFCC
+
+SR = 22050
+
+
+@pytest.fixture(scope='module')
+def clips():
+    t = np.arange(4 * SR) / SR
+    rng = np.random.default_rng(0)
+    return np.stack([
+        0.5 * np.sin(2 * np.pi * 440 * t),
+        0.1 * rng.standard_normal(len(t)),
+        1e-3 * rng.standard_normal(len(t)),  # top_db clipping matters most for quiet clips
+        np.zeros(len(t)),
+    ]).astype(np.float32)
+
+
+def reference_mfcc(clip):
+    return librosa.feature.mfcc(y=clip, sr=SR, n_mfcc=13, n_fft=2048, hop_length=512)
+
+
+def test_mfcc_matches_librosa(clips):
+    batch = BatchMFCC(sr=SR).mfcc(clips)
+    for clip, mfcc in zip(clips, batch):
+        np.testing.assert_allclose(mfcc, reference_mfcc(clip), rtol=1e-5, atol=1e-3)
+
+
+def test_features_match_librosa_mean_std(clips):
+    features = BatchMFCC(sr=SR, chunk_size=3).features(clips)  # chunks of 3 and 1 clips
+    assert features.shape == (len(clips), 26) and features.dtype == np.float32
+    for clip, row in zip(clips, features):
+        reference = reference_mfcc(clip)
+        np.testing.assert_allclose(row, np.hstack([reference.mean(axis=1), reference.std(axis=1)]),
+                                   rtol=1e-5, atol=1e-3)
+
+
+def test_window_features_match_features_of_each_window():
+    t = np.arange(10 * SR) / SR
+    signal = (0.3 * np.sin(2 * np.pi * 300 * t * (1 + t / 10))).astype(np.float32)
+    featurizer = BatchMFCC(sr=SR, top_db=None)  # clipping is per signal there, per clip here
+    starts, features = featurizer.window_features(signal, window_seconds=4.0, hop_seconds=1.0)
+
+    np.testing.assert_allclose(starts[:-1], np.arange(len(starts) - 1) * round(SR / 512) * 512 / SR)
+    assert starts[-1] + 4.0 == pytest.approx(len(signal) / SR, abs=512 / SR)
+    # Every window is the mean/std of its slice of the signal's MFCC frames
+    mfccs = featurizer.mfcc(signal[np.newaxis])[0].T
+    window_frames = 1 + 4 * SR // 512
+    for start, row in zip(starts, features):
+        window = mfccs[int(round(start * SR / 512)):][:window_frames]
+        np.testing.assert_allclose(row, np.hstack([window.mean(axis=0), window.std(axis=0)]), rtol=1e-4, atol=1e-3)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from export_model import export_h5
+from numpy_model import NumpyModel
+
+
+def randomize_batch_norm(model, rng):
+    # Fresh BatchNormalization layers are identities; give them real statistics
+    for layer in model.layers:
+        if type(layer).__name__ == 'BatchNormalization':
+            n = layer.get_weights()[0].shape[0]
+            layer.set_weights([rng.uniform(0.5, 2, n), rng.normal(0, 1, n), rng.normal(0, 1, n),
+                               rng.uniform(0.5, 2, n)])
+
+
+def danger_cnn(layers):
+    """The layer stack of the shipped CNN, smaller."""
+    return [
+        layers.Conv2D(8, (3, 2), padding='same', activation='relu'),
+        layers.BatchNormalization(),
+        layers.MaxPooling2D((2, 2), padding='same'),
+        layers.Conv2D(8, (3, 1), padding='same', activation='relu'),
+        layers.BatchNormalization(),
+        layers.GlobalAveragePooling2D(),
+        layers.Dropout(0.3),
+        layers.Dense(16, activation='relu'),
+        layers.BatchNormalization(),
+        layers.Dense(2, activation='softmax'),
+    ]
+
+
+def other_layers(layers):
+    """Layer options the exporter supports that the shipped CNN does not use."""
+    return [
+        layers.Conv2D(4, (2, 1), strides=(2, 1), activation='tanh'),
+        layers.AveragePooling2D((2, 1), padding='same'),
+        layers.MaxPooling2D((2, 1)),
+        layers.Flatten(),
+        layers.Dense(3, use_bias=False),
+        layers.Activation('sigmoid'),
+    ]
+
+
+@pytest.mark.parametrize('stack', [danger_cnn, other_layers])
+def test_numpy_model_matches_keras(tmp_path, stack):
+    keras = pytest.importorskip('tensorflow').keras
+    keras.utils.set_random_seed(0)
+    rng = np.random.default_rng(1)
+    model = keras.Sequential([keras.Input((13, 2, 1))] + stack(keras.layers))
+    randomize_batch_norm(model, rng)
+    model.save(tmp_path / 'model.h5')
+
+    export_h5(str(tmp_path / 'model.h5'), str(tmp_path / 'model.npz'))
+    x = rng.normal(0, 50, size=(64, 13, 2, 1)).astype(np.float32)  # unscaled MFCC statistics
+    expected = model.predict(x, verbose=0)
+    np.testing.assert_allclose(NumpyModel.load(str(tmp_path / 'model.npz')).predict(x), expected, atol=1e-5)
+
+
+def test_batch_norm_is_folded_into_scale_and_shift():
+    layers = [{'type': 'BatchNormalization', 'epsilon': 1e-3}, {'type': 'Dense', 'activation': 'softmax'}]
+    weights = {
+        '0/gamma': np.array([2.0, 0.5], dtype=np.float32), '0/beta': np.array([1.0, -1.0], dtype=np.float32),
+        '0/moving_mean': np.array([3.0, 0.0], dtype=np.float32),
+        '0/moving_variance': np.array([4.0, 1.0], dtype=np.float32),
+        '1/kernel': np.eye(2, dtype=np.float32), '1/bias': np.zeros(2, dtype=np.float32),
+    }
+    x = np.array([[5.0, 2.0]], dtype=np.float32)
+    normalized = np.array([2.0, 0.5]) * (x - [3.0, 0.0]) / np.sqrt(np.array([4.0, 1.0]) + 1e-3) + [1.0, -1.0]
+    expected = np.exp(normalized) / np.exp(normalized).sum()
+    np.testing.assert_allclose(NumpyModel(layers, weights).predict(x), expected, rtol=1e-5)
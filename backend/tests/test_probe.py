@@ -0,0 +1,65 @@
+import os
+import sys
+from fractions import Fraction
+
+import numpy as np
+import pytest
+import scipy.signal
+import soundfile as sf
+
+from probe import probe, estimate_pcm, MIN_CONFIDENCE, DEFAULT_PCM_RATE
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def clip():
+    audio, sr = sf.read(os.path.join(BACKEND, 'audio.wav'), dtype='float32', always_2d=True)
+    return audio.mean(axis=1), sr
+
+
+def s16le(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def resampled(clip, rate):
+    audio, sr = clip
+    ratio = Fraction(rate, sr).limit_denominator(1000)
+    return scipy.signal.resample_poly(audio, ratio.numerator, ratio.denominator)
+
+
+@pytest.mark.parametrize('path', [os.path.join(BACKEND, 'main.py'), sys.executable])
+def test_non_audio_is_not_pcm(path):
+    with open(path, 'rb') as f:
+        info = probe(f.read(1 << 18))
+    assert info.pcm is None or info.confidence < MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize('data', [
+    b'PK\x03\x04' + bytes(range(256)) * 64,
+    b'%PDF-1.7\n' + bytes(range(256)) * 64,
+    ('lorem ipsum dolor sit amet\n' * 2000).encode(),
+])
+def test_magic_and_text_are_not_pcm(data):
+    assert probe(data).confidence < MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize('rate', [16000, 22050, 44100])
+def test_headerless_s16le_rate(clip, rate):
+    info = estimate_pcm(s16le(resampled(clip, rate)))
+    assert info.confidence >= MIN_CONFIDENCE
+    assert (info.codec, info.channels, info.sample_rate) == ('pcm_s16le', 1, rate)
+
+
+def test_headerless_s16le_voice_band_is_8k(clip):
+    sos = scipy.signal.butter(6, [300, 3400], 'bandpass', fs=8000, output='sos')
+    info = estimate_pcm(s16le(scipy.signal.sosfilt(sos, resampled(clip, 8000))))
+    assert info.confidence >= MIN_CONFIDENCE
+    assert (info.codec, info.sample_rate) == ('pcm_s16le', 8000)
+
+
+def test_full_band_8k_falls_back_to_default(clip):
+    # Without the telephone band, 8 kHz looks like 16 kHz; neither is
+    # claimed over the default
+    info = estimate_pcm(s16le(resampled(clip, 8000)))
+    assert info.sample_rate == DEFAULT_PCM_RATE
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import scipy.signal
+
+from mfcc import BatchMFCC
+from streaming import StreamSession
+from wavio import StreamingResampler, get_resampler
+
+
+class RecordingProcessor:
+    """Stands in for AudioProcessor: keeps the features instead of scoring them."""
+
+    duration = 4.0
+
+    def __init__(self):
+        self.batch_mfcc = BatchMFCC()
+        self.features = []
+
+    def predict_features_batch(self, features):
+        self.features.extend(features)
+        return [{'danger_probability': 0.0, 'class_label': 'SAFE'} for _ in features]
+
+
+def s16le_tone(rate, seconds):
+    t = np.arange(int(rate * seconds)) / rate
+    audio = 0.4 * np.sin(2 * np.pi * 440 * t) + 0.2 * scipy.signal.chirp(t, 200, seconds, 3000)
+    return (audio * 32767).astype('<i2').tobytes()
+
+
+@pytest.mark.parametrize('rates', [(16000, 22050), (44100, 22050), (8000, 22050)])
+@pytest.mark.parametrize('chunk', [1, 333, 4096])
+def test_streaming_resampler_matches_one_shot(rates, chunk):
+    audio = np.random.default_rng(0).standard_normal(3 * rates[0]).astype(np.float32)
+    resampler = StreamingResampler(*rates)
+    streamed = np.concatenate([resampler.push(audio[i:i + chunk]) for i in range(0, len(audio), chunk)])
+    whole = get_resampler(*rates)(audio)
+    assert len(whole) - len(streamed) < 64
+    np.testing.assert_allclose(streamed, whole[:len(streamed)], atol=1e-5)
+
+
+@pytest.mark.parametrize('chunk_bytes', [8192, 1001])
+def test_chunked_push_gives_same_features(chunk_bytes):
+    pcm = s16le_tone(16000, 6.0)
+
+    whole = RecordingProcessor()
+    StreamSession(whole, sample_rate=16000).push_pcm(pcm)
+
+    chunked = RecordingProcessor()
+    session = StreamSession(chunked, sample_rate=16000)
+    for i in range(0, len(pcm), chunk_bytes):
+        session.push_pcm(pcm[i:i + chunk_bytes])
+
+    assert len(whole.features) == len(chunked.features) > 0
+    np.testing.assert_allclose(np.array(chunked.features), np.array(whole.features), rtol=1e-4, atol=1e-4)
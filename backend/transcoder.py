@@ -0,0 +1,314 @@
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TranscoderError(Exception):
+    """Raised when ffmpeg fails to transcode an input."""
+
+
+class TranscoderBusy(Exception):
+    """Raised when the transcoder queue is full; the caller should retry later."""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Transcoder queue is full")
+        self.retry_after = retry_after
+
+
+class FFmpegInfo:
+    """A resolved ffmpeg binary and the decoders it was built with."""
+
+    def __init__(self, path, version, decoders):
+        self.path = path
+        self.version = version
+        self.decoders = decoders
+
+    def can_decode(self, codec):
+        return codec in self.decoders
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'version': self.version,
+            'audio_decoders': sorted(self.decoders)
+        }
+
+
+def find_ffmpeg():
+    """Return the first working ffmpeg binary, or None."""
+    candidates = [
+        os.environ.get('FFMPEG_PATH'),
+        shutil.which('ffmpeg'),
+        shutil.which('ffmpeg.exe'),
+        os.path.join(os.path.dirname(__file__), 'ffmpeg', 'bin', 'ffmpeg.exe'),
+        os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
+    ]
+
+    for path in candidates:
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            result = subprocess.run([path, '-version'], capture_output=True, text=True, timeout=2)
+            if result.returncode == 0:
+                return path
+        except Exception:
+            continue
+    return None
+
+
+def probe_ffmpeg(path):
+    """Record the version and audio decoders of an ffmpeg binary."""
+    version = 'unknown'
+    decoders = set()
+
+    try:
+        result = subprocess.run([path, '-version'], capture_output=True, text=True, timeout=2)
+        match = re.search(r'ffmpeg version (\S+)', result.stdout)
+        if match:
+            version = match.group(1)
+
+        result = subprocess.run([path, '-hide_banner', '-decoders'], capture_output=True, text=True, timeout=2)
+        for line in result.stdout.splitlines():
+            # Lines look like " A....D aac    AAC (Advanced Audio Coding)"
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].startswith('A') and len(parts[0]) == 6:
+                decoders.add(parts[1])
+    except Exception as e:
+        logger.warning(f"⚠️  Could not probe ffmpeg capabilities: {e}")
+
+    return FFmpegInfo(path, version, decoders)
+
+
+class TranscoderPool:
+    """
+    Bounded pool of ffmpeg workers decoding to mono s16le PCM over pipes.
+
+    Each worker slot keeps one ffmpeg process already spawned and blocked on
+    stdin, so a request only pays for writing its bytes and reading the PCM
+    back; the replacement process is started after the result is returned.
+    At most ``workers`` transcodes run at once and at most ``max_queue`` more
+    wait for a slot; beyond that transcode() raises TranscoderBusy.
+    """
+
+    def __init__(self, ffmpeg, workers=4, max_queue=16, target_sr=22050, timeout=10, queue_timeout=5):
+        self.ffmpeg = ffmpeg
+        self.workers = workers
+        self.max_queue = max_queue
+        self.target_sr = target_sr
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+
+        self._admission = threading.BoundedSemaphore(workers + max_queue)
+        self._idle = queue.Queue()
+        self._respawn = queue.Queue()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._closed = False
+
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+        self._respawner = threading.Thread(target=self._respawn_loop, name='ffmpeg-respawn', daemon=True)
+        self._respawner.start()
+
+    @property
+    def queue_depth(self):
+        return self._waiting
+
+    def _command(self):
+        return [
+            self.ffmpeg.path,
+            '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-f', 's16le',
+            '-acodec', 'pcm_s16le',
+            '-ac', '1',
+            '-ar', str(self.target_sr),
+            'pipe:1'
+        ]
+
+    def _spawn(self):
+        try:
+            return subprocess.Popen(
+                self._command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except OSError as e:
+            logger.error(f"❌ Failed to start ffmpeg worker: {e}")
+            return None
+
+    def _checkout(self):
+        with self._lock:
+            self._waiting += 1
+        try:
+            proc = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            raise TranscoderBusy()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        # The pre-spawned process may have died while idle
+        if proc is None or proc.poll() is not None:
+            proc = self._spawn()
+        return proc
+
+    def _checkin(self):
+        # Replacement processes are spawned off the request thread
+        self._respawn.put(True)
+
+    def _respawn_loop(self):
+        while True:
+            self._respawn.get()
+            if self._closed:
+                return
+            self._idle.put(self._spawn())
+
+    def _run(self, proc, data, limit=None):
+        """
+        Feed data to a worker and read its PCM output.
+
+        Returns the PCM bytes.  With a limit, reading stops once that
+        many bytes have arrived and the process is killed (workers are single
+        use), so a long upload is not decoded past what will be analysed.
+        """
+        timed_out = threading.Event()
+
+        def kill_on_timeout():
+            timed_out.set()
+            proc.kill()
+
+        def feed():
+            try:
+                proc.stdin.write(data)
+            except (BrokenPipeError, OSError, ValueError):
+                pass  # killed once it had produced enough output
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        stderr = []
+        threads = [
+            threading.Thread(target=feed, name='ffmpeg-stdin', daemon=True),
+            threading.Thread(target=lambda: stderr.append(proc.stderr.read()), name='ffmpeg-stderr', daemon=True)
+        ]
+        timer = threading.Timer(self.timeout, kill_on_timeout)
+        timer.start()
+        for thread in threads:
+            thread.start()
+
+        chunks = []
+        received = 0
+        try:
+            while limit is None or received < limit:
+                chunk = proc.stdout.read(65536 if limit is None else min(65536, limit - received))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                received += len(chunk)
+            complete = limit is None or received < limit
+            if not complete:
+                proc.kill()
+            proc.wait()
+        finally:
+            timer.cancel()
+            for thread in threads:
+                thread.join()
+
+        if timed_out.is_set():
+            raise TranscoderError(f"ffmpeg timed out after {self.timeout}s")
+        if complete and (proc.returncode != 0 or not received):
+            message = b''.join(stderr).decode('utf-8', 'replace').strip().splitlines()
+            raise TranscoderError(f"ffmpeg failed: {message[-1] if message else proc.returncode}")
+        return b''.join(chunks)
+
+    def transcode(self, data, max_duration=None):
+        """
+        Decode an encoded byte string to a float32 array at target_sr.
+
+        With max_duration, only that much PCM is read back; ffmpeg is stopped
+        there instead of decoding the rest of the upload.
+        """
+        if self._closed:
+            raise TranscoderError("Transcoder pool is closed")
+        if not self._admission.acquire(blocking=False):
+            raise TranscoderBusy()
+
+        try:
+            proc = self._checkout()
+            try:
+                if proc is None:
+                    raise TranscoderError("ffmpeg could not be started")
+                limit = int(self.target_sr * max_duration) * 2 if max_duration else None
+                stdout = self._run(proc, memoryview(data), limit)
+            finally:
+                self._checkin()
+
+            return np.frombuffer(stdout, dtype='<i2').astype(np.float32) / 32768.0
+        finally:
+            self._admission.release()
+
+    def close(self):
+        """Terminate idle worker processes."""
+        self._closed = True
+        self._respawn.put(True)
+        while True:
+            try:
+                proc = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if proc is not None and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
+_ffmpeg_info = None
+_pool = None
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def init_transcoder(workers=4, max_queue=16, target_sr=22050, timeout=10):
+    """Resolve ffmpeg once and start the shared transcoder pool."""
+    global _ffmpeg_info, _pool, _initialized
+    with _init_lock:
+        if _initialized:
+            return _pool
+
+        path = find_ffmpeg()
+        if path:
+            _ffmpeg_info = probe_ffmpeg(path)
+            _pool = TranscoderPool(_ffmpeg_info, workers, max_queue, target_sr, timeout)
+            logger.info(f"✅ ffmpeg {_ffmpeg_info.version} at {path} "
+                        f"({len(_ffmpeg_info.decoders)} audio decoders, {workers} workers)")
+        else:
+            logger.warning("⚠️  ffmpeg not found, only soundfile formats can be decoded")
+
+        _initialized = True
+        return _pool
+
+
+def get_ffmpeg_info():
+    """Return the FFmpegInfo resolved at startup, or None."""
+    if not _initialized:
+        init_transcoder()
+    return _ffmpeg_info
+
+
+def get_transcoder():
+    """Return the shared TranscoderPool, or None if ffmpeg is unavailable."""
+    if not _initialized:
+        init_transcoder()
+    return _pool
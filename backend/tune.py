@@ -0,0 +1,148 @@
+"""
+Pick a danger-probability threshold from a labeled feature store.
+
+    python tune.py features/ --labels labels.csv
+    python tune.py features/ --labels labels.csv --model modals/candidate.h5 --min-recall 0.95 -o tuning.json
+
+The stored feature vectors are scored with the model in one pass (no audio
+is decoded), then precision, recall, F1 and false-positive rate are
+reported for every threshold on the danger probability.  The suggested
+threshold maximizes F1, or with --min-recall is the highest threshold that
+still reaches that recall.
+
+Labels come from a CSV with a `label` column (1/0, danger/safe, true/false)
+and a `key` column (feature store key) or a `filename` column matched
+against the filename recorded with each row; rows whose metadata already
+carries a `label` are used as well.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from featurestore import FeatureStore
+from score import MODEL_DIR, default_model_path
+
+logger = logging.getLogger(__name__)
+
+DANGER_LABELS = {'1', 'danger', 'true', 'yes'}
+SAFE_LABELS = {'0', 'safe', 'false', 'no'}
+
+
+def parse_label(value):
+    value = str(value).strip().lower()
+    if value in DANGER_LABELS:
+        return 1
+    if value in SAFE_LABELS:
+        return 0
+    return None
+
+
+def read_labels(path):
+    """Return ({key: label}, {filename: label}) from a labels CSV."""
+    by_key, by_filename = {}, {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            label = parse_label(row.get('label', ''))
+            if label is None:
+                continue
+            if row.get('key'):
+                by_key[row['key']] = label
+            if row.get('filename'):
+                by_filename[row['filename']] = label
+                by_filename.setdefault(os.path.basename(row['filename']), label)
+    return by_key, by_filename
+
+
+def labeled_rows(store, by_key, by_filename):
+    """Feature matrix and labels of the stored rows that have a label."""
+    keys, features, meta = store.load()
+    indices, labels = [], []
+    for i, (key, info) in enumerate(zip(keys, meta)):
+        filename = info.get('filename') or ''
+        label = by_key.get(key)
+        if label is None:
+            label = by_filename.get(filename, by_filename.get(os.path.basename(filename)))
+        if label is None and 'label' in info:
+            label = parse_label(info['label'])
+        if label is not None:
+            indices.append(i)
+            labels.append(label)
+    return np.asarray(features)[indices], np.array(labels, dtype=np.int8)
+
+
+def sweep(danger, labels, thresholds):
+    """Precision/recall/F1/FPR of `danger >= threshold` for each threshold."""
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    table = []
+    for threshold in thresholds:
+        predicted = danger >= threshold
+        tp = int(np.sum(predicted & (labels == 1)))
+        fp = int(np.sum(predicted & (labels == 0)))
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / positives if positives else 0.0
+        table.append({
+            'threshold': round(float(threshold), 4),
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'false_positive_rate': fp / negatives if negatives else 0.0
+        })
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the danger threshold on a labeled feature store")
+    parser.add_argument('store', help="Feature store directory")
+    parser.add_argument('--labels', help="CSV with label and key or filename columns")
+    parser.add_argument('--model', default=default_model_path(), help="Model (.npz, .h5 or .pkl)")
+    parser.add_argument('--scaler', default=os.path.join(MODEL_DIR, 'feature_scaler.pkl'))
+    parser.add_argument('--steps', type=int, default=19, help="Thresholds between 0 and 1 to evaluate")
+    parser.add_argument('--min-recall', type=float, help="Suggest the highest threshold with at least this recall")
+    parser.add_argument('-o', '--output', help="Write the sweep and the suggestion as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    by_key, by_filename = read_labels(args.labels) if args.labels else ({}, {})
+    features, labels = labeled_rows(FeatureStore(args.store), by_key, by_filename)
+    if len(labels) == 0:
+        parser.error("No labeled rows in the feature store")
+    logger.info(f"📊 {len(labels)} labeled rows ({int(labels.sum())} danger, {int(len(labels) - labels.sum())} safe)")
+
+    from audio_processor import AudioProcessor
+    scaler = args.scaler if os.path.exists(args.scaler) else None
+    processor = AudioProcessor(args.model, scaler, max_batch_size=None)
+    proba, _, _ = processor.score_features(features)
+    danger = np.asarray(proba)[:, 0]
+
+    table = sweep(danger, labels, np.linspace(0, 1, args.steps + 2)[1:-1])
+    if args.min_recall is not None:
+        eligible = [row for row in table if row['recall'] >= args.min_recall]
+        best = max(eligible, key=lambda row: row['threshold']) if eligible else None
+    else:
+        best = max(table, key=lambda row: row['f1'])
+
+    print(f"{'threshold':>9}  {'precision':>9}  {'recall':>6}  {'f1':>6}  {'fpr':>6}")
+    for row in table:
+        marker = '  <-' if row is best else ''
+        print(f"{row['threshold']:>9.3f}  {row['precision']:>9.3f}  {row['recall']:>6.3f}  {row['f1']:>6.3f}  "
+              f"{row['false_positive_rate']:>6.3f}{marker}")
+    if best is None:
+        logger.warning(f"⚠️  No threshold reaches recall {args.min_recall}")
+    else:
+        logger.info(f"✅ Suggested threshold: {best['threshold']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'model': args.model, 'rows': len(labels), 'suggested': best, 'sweep': table}, f, indent=2)
+    sys.exit(0 if best is not None else 1)
+
+
+if __name__ == '__main__':
+    main()
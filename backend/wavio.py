@@ -0,0 +1,227 @@
+"""
+Fast path for WAV/PCM audio that skips librosa.load.
+
+parse_wav() walks the RIFF chunks of a buffer, tolerating the layouts
+Android recorders leave behind: a data size of 0 or 0xFFFFFFFF when the
+recorder was killed before finalizing, RIFF sizes that disagree with the
+file, odd-sized chunks without a pad byte, extra chunks (LIST, fact, ...)
+around the data, WAVE_FORMAT_EXTENSIBLE and RF64.  decode_wav() turns the
+data chunk into float32 mono in one vectorized step, read_wav() does the
+same for a file through mmap, and resampling only happens when the rate
+differs, through a cached polyphase filter per (orig_sr, target_sr).
+"""
+import functools
+import math
+import mmap
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+WavInfo = namedtuple('WavInfo', 'format_tag channels sample_rate bits block_align data_offset data_size')
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format tag, bits per sample) -> sample dtype
+SAMPLE_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+
+def parse_wav(buffer):
+    """Return the WavInfo of a RIFF/RF64 WAVE buffer, or None if it is not one this module can read."""
+    view = memoryview(buffer).cast('B')
+    if len(view) < 12 or view[8:12] != b'WAVE' or view[:4] not in (b'RIFF', b'RF64'):
+        return None
+
+    fmt = None
+    data = None
+    rf64_data_size = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id, size = struct.unpack_from('<4sI', view, pos)
+        body = pos + 8
+
+        if chunk_id == b'ds64' and size >= 24:
+            rf64_data_size = struct.unpack_from('<Q', view, body + 8)[0]
+        elif chunk_id == b'fmt ' and size >= 16:
+            tag, channels, sample_rate, _, block_align, bits = struct.unpack_from('<HHIIHH', view, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # The real format tag leads the sub-format GUID
+                tag = struct.unpack_from('<H', view, body + 24)[0]
+            fmt = (tag, channels, sample_rate, bits, block_align)
+        elif chunk_id == b'data':
+            if size == 0xFFFFFFFF and rf64_data_size is not None:
+                size = rf64_data_size
+            if size == 0 or body + size > len(view):
+                # Unfinalized recording: the data runs to the end of the file
+                size = len(view) - body
+            data = (body, size)
+            if fmt is not None:
+                break
+
+        next_pos = body + size + (size & 1)
+        if next_pos > len(view) or (size & 1 and next_pos < len(view) and not _is_chunk_id(view, next_pos)):
+            # Some writers omit the pad byte after odd-sized chunks
+            next_pos = body + size
+        pos = next_pos
+
+    if fmt is None or data is None:
+        return None
+    tag, channels, sample_rate, bits, block_align = fmt
+    if channels < 1 or sample_rate < 1 or block_align != channels * bits // 8:
+        return None
+    return WavInfo(tag, channels, sample_rate, bits, block_align, data[0], data[1])
+
+
+def _is_chunk_id(view, pos):
+    chunk_id = bytes(view[pos:pos + 4])
+    return len(chunk_id) == 4 and all(32 <= c < 127 for c in chunk_id)
+
+
+class PolyphaseResampler:
+    """scipy.signal.resample_poly with its anti-aliasing FIR designed once."""
+
+    def __init__(self, orig_sr, target_sr):
+        import scipy.signal
+        g = math.gcd(int(orig_sr), int(target_sr))
+        self.up = int(target_sr) // g
+        self.down = int(orig_sr) // g
+        # Same filter resample_poly designs on every call by default
+        max_rate = max(self.up, self.down)
+        self.filter = scipy.signal.firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+        self.filter = self.filter.astype(np.float32)
+
+    def __call__(self, audio):
+        import scipy.signal
+        return scipy.signal.resample_poly(audio, self.up, self.down, window=self.filter).astype(np.float32)
+
+
+class StreamingResampler:
+    """
+    PolyphaseResampler for a signal that arrives in chunks.
+
+    Resampling each chunk on its own puts filter edge transients at every
+    chunk boundary and rounds the output length per chunk.  This keeps the
+    input the filter still needs and the output phase across push() calls,
+    so the concatenated output equals resample_poly() of the whole signal,
+    minus the last half filter length, which is emitted once the following
+    samples arrive.
+    """
+
+    def __init__(self, orig_sr, target_sr):
+        self.passthrough = int(orig_sr) == int(target_sr)
+        if self.passthrough:
+            return
+        resampler = get_resampler(int(orig_sr), int(target_sr))
+        self.up, self.down = resampler.up, resampler.down
+
+        # The filter resample_poly() pads to centre its output, and the
+        # number of leading outputs it drops for that
+        half_len = (len(resampler.filter) - 1) // 2
+        pre_pad = self.down - half_len % self.down
+        self.filter = np.concatenate([np.zeros(pre_pad, dtype=np.float32), resampler.filter * self.up])
+        self._next = (half_len + pre_pad) // self.down  # next output, indexed as upfirdn's
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._start = 0  # input index of _buffer[0], a multiple of down
+        self._received = 0
+
+    def push(self, audio):
+        """Add input samples; returns the output samples they complete."""
+        audio = np.asarray(audio, dtype=np.float32)
+        if self.passthrough:
+            return audio
+        import scipy.signal
+        self._buffer = np.concatenate([self._buffer, audio])
+        self._received += len(audio)
+
+        # Outputs whose newest input sample has arrived
+        end = (self._received * self.up - 1) // self.down + 1
+        if end <= self._next:
+            return np.zeros(0, dtype=np.float32)
+        base = self._start * self.up // self.down
+        out = scipy.signal.upfirdn(self.filter, self._buffer, self.up, self.down)
+        out = out[self._next - base:end - base].astype(np.float32)
+        self._next = end
+
+        # Drop the input no later output reaches, keeping the phase aligned
+        oldest = max(0, -(-(self._next * self.down - len(self.filter) + 1) // self.up))
+        start = oldest - oldest % self.down
+        if start > self._start:
+            self._buffer = self._buffer[start - self._start:]
+            self._start = start
+        return out
+
+
+@functools.lru_cache(maxsize=32)
+def get_resampler(orig_sr, target_sr):
+    return PolyphaseResampler(orig_sr, target_sr)
+
+
+def resample(audio, orig_sr, target_sr):
+    """Resample a 1-D signal; returns it unchanged when the rates already match."""
+    if int(orig_sr) == int(target_sr):
+        return audio
+    return get_resampler(int(orig_sr), int(target_sr))(audio)
+
+
+def _to_float_mono(samples, dtype, bits):
+    """(frames, channels) integer/float samples -> float32 mono in [-1, 1]; the only copy made."""
+    if samples.shape[1] > 1:
+        audio = samples.mean(axis=1, dtype=np.float32)
+    else:
+        audio = samples[:, 0].astype(np.float32)
+    if dtype == np.uint8:
+        audio -= 128.0
+        audio *= 1.0 / 128.0
+    elif dtype.kind == 'i':
+        audio *= 1.0 / (1 << (bits - 1))
+    return audio
+
+
+def decode_wav(buffer, target_sr=None, max_duration=None, info=None):
+    """
+    Decode WAV bytes (any bytes-like object or mmap) to float32 mono.
+
+    Returns (audio, sample_rate) at target_sr when given, or None for
+    encodings this fast path does not handle (24-bit, ADPCM, ...).
+    """
+    info = info or parse_wav(buffer)
+    if info is None:
+        return None
+    dtype = SAMPLE_DTYPES.get((info.format_tag, info.bits))
+    if dtype is None:
+        return None
+
+    frames = info.data_size // info.block_align
+    if max_duration:
+        frames = min(frames, int(info.sample_rate * max_duration))
+
+    samples = np.frombuffer(buffer, dtype=dtype, count=frames * info.channels,
+                            offset=info.data_offset).reshape(frames, info.channels)
+    audio = _to_float_mono(samples, dtype, info.bits)
+    del samples
+
+    if target_sr:
+        return resample(audio, info.sample_rate, target_sr), int(target_sr)
+    return audio, info.sample_rate
+
+
+def read_wav(path, target_sr=None, max_duration=None):
+    """decode_wav() for a file, reading the data chunk through mmap instead of into memory."""
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return None
+    try:
+        return decode_wav(mapped, target_sr, max_duration)
+    finally:
+        mapped.close()